@@ -0,0 +1,184 @@
+"""
+async_run
+
+Collects and publishes the tables of the current month from one event loop.
+"""
+import asyncio
+from datetime import datetime
+from functools import partial
+from AtlassianService.ConfluenceService import month_page_title, APPROXIMATE_COUNTS_NOTE
+from ProjectMetrics import issue_values, project_issue_values, split_by_project
+
+
+class AsyncRun:
+    """
+    The async run of MetricsEngine, the asyncio counterpart of `generate_tables`
+    and `post_to_confluence`.
+
+    httpx and the async clients are only loaded by the async run. It uses the
+    engine's query plan, checkpoint and table building, like `generate_tables`.
+    """
+
+    async def generate_tables_async(self, jira_client, resume=False):
+        """
+        Collect the counts of the current month from an event loop and build the tables.
+
+        Every query of the plan is sent at once on the async client, whose session
+        bounds the requests in flight. The results are checkpointed like those of
+        `generate_tables`, but the change probe is not used.
+
+        Args:
+            jira_client (AsyncJiraClient): The async Jira client.
+            resume (bool, optional): Restore the results of the last run's checkpoint.
+
+        Returns:
+            dict: The confluence content, like `generate_tables`.
+
+        Raises:
+            ValueError: In store mode, whose syncs are not async.
+        """
+        if self.collection_mode == 'store':
+            raise ValueError("The async run collects in count, search or portfolio mode, not in store mode")
+        with self.instrumentation.span('generate_tables', mode=self.collection_mode, run='async'):
+            await self.__load_versions_async(jira_client)
+            now = datetime.now(self.time_zone)
+            month = (now.year, now.month)
+            self._start_checkpoint(month, resume)
+            plan = self.plan()
+            tasks = {
+                self._task_key(query): partial(self.__run_query_async, jira_client, query)
+                for query in plan.queries
+            }
+            results = await self.__run_queries_async(tasks, checkpoint=True)
+
+            if self.collection_mode == 'count':
+                self._fill_cells(month, plan, results, {}, {})
+            else:
+                if self.collection_mode == 'portfolio':
+                    project_issues = results[self._task_key(plan.queries[0])] or dict.fromkeys(self.project_keys)
+                else:
+                    project_issues = {query.project: results[query.project] for query in plan.queries}
+                with self.instrumentation.span('count_tables'):
+                    self.final_table = self._count_tables(self._project_dataset(month, project_issues))[month]
+            confluence_content = self._build_tables()
+        self._report_throttling()
+
+        return confluence_content
+
+    async def run_async(self, resume=False):
+        """
+        Collect the current month's tables and publish them from one event loop.
+
+        The Jira and Confluence requests share one pooled non-blocking session,
+        paced by the rate limiter. The monthly page is looked up while the
+        tables are collected, and written as soon as they are built.
+
+        Args:
+            resume (bool, optional): Restore the results of the last run's checkpoint.
+        """
+        import httpx  # loaded only by the async run
+        from AtlassianService.AsyncSession import AsyncSession
+        from AtlassianService.AsyncJiraService import AsyncJiraClient
+        from AtlassianService.AsyncConfluenceService import AsyncConfluenceClient
+
+        session = AsyncSession(
+            self.async_max_connections,
+            self.max_retries,
+            self.backoff_factor,
+            self.backoff_jitter,
+            self.rate_limiter,
+            self.max_throttle_retries,
+            self.instrumentation)
+        try:
+            jira_client = AsyncJiraClient(
+                self.atlassian_url, self.atlassian_username, self.atlassian_token,
+                session, self.instrumentation, self.result_cache, self.approximate_counts)
+            confluence = AsyncConfluenceClient(
+                self.atlassian_url, self.atlassian_username, self.atlassian_token,
+                session, self.instrumentation, self.publish_cache, self.banner_page)
+
+            # The page is of the month the issues are collected in, in the Jira user's time zone
+            now = datetime.now(self.time_zone)
+
+            async def find_page():
+                try:
+                    await confluence.find_page(self.confluence_report_space, month_page_title(now.year, now.month))
+                except httpx.HTTPError as http_error:
+                    print(f"Error looking up the Confluence page: {http_error}")
+
+            confluence_content, _ = await asyncio.gather(self.generate_tables_async(jira_client, resume), find_page())
+            self.approximate_counts = jira_client.approximate_counts
+            page = await confluence.post_confluence_page(
+                self.confluence_report_page_id,
+                self.confluence_report_space,
+                confluence_content,
+                now.year,
+                now.month,
+                headings={report.name: report.heading for report in self.reports},
+                note=APPROXIMATE_COUNTS_NOTE if self.approximate_counts else None)
+            if page is None:
+                self.failed_pages.append(month_page_title(now.year, now.month))
+        finally:
+            await session.aclose()
+
+    async def __load_versions_async(self, jira_client):
+        """
+        Fetch the versions of the projects missing from the version index, or older
+        than its maximum age, with the async Jira client, like `generate_tables` does.
+        """
+        if self.version_index is None:
+            return
+        tasks = {
+            key: partial(jira_client.versions, key) for key in self.version_index.stale(self.project_keys.keys())
+        }
+        self._index_versions(await self.__run_queries_async(tasks))
+
+    async def __run_query_async(self, jira_client, query):
+        """
+        Send a planned query with the async Jira client.
+
+        Returns:
+            Any: The count of a count query, or the projected issues of a search,
+            split by project when it covers several projects.
+        """
+        operation = {'count': 'release_metrics', 'search': 'project_metrics'}[query.kind]
+        if query.project is None:
+            operation = 'portfolio_metrics'
+        with self.instrumentation.span(operation, project=query.project, cells=len(query.consumers)):
+            if query.kind == 'count':
+                return await jira_client.count(query.jql)
+            if query.project is None:
+                issues = await jira_client.search(
+                    query.jql, ['project', *query.fields], self.page_size, project_issue_values)
+                return split_by_project(issues, self.project_keys.keys())
+            return await jira_client.search(query.jql, query.fields, self.page_size, issue_values)
+
+    async def __run_queries_async(self, tasks, checkpoint=False):
+        """
+        Run the async query tasks concurrently and record the errors of the failed ones,
+        like `_run_queries` does for the thread pool.
+
+        Args:
+            tasks (dict): Callables returning the coroutines sending the Jira requests.
+            checkpoint (bool, optional): Restore the results of the tasks from the run's
+                checkpoint, if any, and record the others in it as they complete.
+
+        Returns:
+            dict: The task results in the same key order as `tasks`, with None for failed tasks.
+        """
+        import httpx  # loaded only by the async run
+        results = self._restored(tasks) if checkpoint else {}
+
+        async def run(key, task):
+            try:
+                results[key] = await task()
+            except httpx.HTTPError as http_error:
+                print(f"Failed to collect {key}: {http_error}")
+                self.collection_errors[key] = http_error
+                results[key] = None
+                return
+            if checkpoint and self.checkpoint is not None:
+                self.checkpoint.record(key, results[key])
+
+        await asyncio.gather(*(run(key, task) for key, task in tasks.items() if key not in results))
+        return {key: results[key] for key in tasks}
@@ -0,0 +1,174 @@
+"""
+async_confluence_service
+
+An asyncio Confluence client, publishing the report pages like ConfluenceClient without a thread per request.
+"""
+from datetime import datetime
+import httpx
+from AtlassianService.AsyncSession import AsyncSession
+from AtlassianService.ConfluenceService import DEFAULT_HEADINGS, month_page_title, page_creation, page_update
+from AtlassianService.PublishCache import PublishCache, body_hash
+from AtlassianService.StorageFormat import render_page
+
+
+class AsyncConfluenceClient:
+    """
+    A client publishing the monthly report pages from an event loop.
+
+    It is the asyncio counterpart of `ConfluenceClient`, sharing its publish
+    cache: a page found in the cache is written without being looked up, an
+    unchanged body is not written at all, and a page deleted or edited since
+    its last write (404 or 409) is looked up once and written again.
+
+    Args:
+        url (str): The URL of the Confluence server.
+        username (str): The username for Confluence authentication.
+        password (str): The password for Confluence authentication.
+        session (AsyncSession, optional): The session to send the requests on, e.g.
+            the one shared with the async Jira client.
+        instrumentation (Instrumentation, optional): The recorder timing each page.
+        publish_cache (PublishCache, optional): The index of the report pages.
+        banner_page (str, optional): The title of the page the info banner links to.
+
+    Attributes:
+        url (str): The URL of the Confluence server.
+        auth (tuple): The username and password.
+        session (AsyncSession): The session the requests are sent on.
+        instrumentation (Instrumentation): The recorder timing each page, or None.
+        publish_cache (PublishCache): The index of the report pages.
+        banner_page (str): The title of the page the info banner links to, or None.
+    """
+
+    def __init__(self, url, username, password, session=None, instrumentation=None, publish_cache=None,
+                 banner_page=None):
+        self.url = url.rstrip('/')
+        self.auth = (username, password)
+        self.session = session if session is not None else AsyncSession(instrumentation=instrumentation)
+        self.instrumentation = instrumentation
+        self.publish_cache = publish_cache if publish_cache is not None else PublishCache()
+        self.banner_page = banner_page
+        self._missing_pages = set()
+
+    async def post_confluence_page(self, page_id, page_space, tables, year=None, month=None, headings=None,
+                                   note=None):
+        """
+        Update the monthly Confluence page with the tables, like `ConfluenceClient.post_confluence_page`.
+
+        Args:
+            page_id (str): The id of the report page the monthly pages are under.
+            page_space (str): The key of the space.
+            tables (dict): The DataFrame of each table, keyed by table name, in page order.
+            year (int, optional): The year of the page, instead of the current one.
+            month (int, optional): The month of the page, instead of the current one.
+            headings (dict, optional): The heading of each table, keyed by table name.
+            note (str, optional): A note shown above the tables, e.g. that the counts are approximate.
+
+        Returns:
+            dict: The page 'id', 'version' and body 'hash', or None if it could not be written.
+        """
+        now = datetime.now()
+        year, month = year or now.year, month or now.month
+        html = render_page(tables, DEFAULT_HEADINGS if headings is None else headings, self.banner_page, note)
+        if self.instrumentation is None:
+            return await self.upsert_page(page_space, month_page_title(year, month), html, page_id)
+        with self.instrumentation.span('post_confluence_page', year=year, month=month) as span:
+            page = await self.upsert_page(page_space, month_page_title(year, month), html, page_id)
+            span.result_size = len(tables)
+        return page
+
+    async def upsert_page(self, space, title, html, parent_id):
+        """
+        Create a page under a parent page, or write its next version when its body changed.
+
+        Args:
+            space (str): The key of the space.
+            title (str): The title of the page.
+            html (str): The storage-format body.
+            parent_id (str): The id of the parent page the page is created under.
+
+        Returns:
+            dict: The page 'id', 'version' and body 'hash', or None if it could not be written.
+        """
+        html_hash = body_hash(title, html)
+        try:
+            page = await self.find_page(space, title)
+            if page is None:
+                print(f"Monthly page does not exist: {title}. Creating a new page now...")
+                return await self.__create_page(space, title, html, html_hash, parent_id)
+            if page['hash'] == html_hash:
+                print(f"Monthly page {page['id']} is up to date. Skipping the update.")
+                return page
+            print(f"Monthly page already exists: {page['id']}. Updating the data now...")
+            try:
+                return await self.__update_page(space, title, page, html, html_hash)
+            except httpx.HTTPStatusError as http_error:
+                if http_error.response.status_code not in (404, 409):
+                    raise
+            # The indexed page was deleted or changed since the last write: look it up again
+            print(f"Monthly page {page['id']} changed since the last run. Looking it up again...")
+            self.publish_cache.forget(space, title)
+            self._missing_pages.discard((space, title))
+            page = await self.find_page(space, title)
+            if page is None:
+                return await self.__create_page(space, title, html, html_hash, parent_id)
+            return await self.__update_page(space, title, page, html, html_hash)
+        except httpx.HTTPError as http_error:
+            print(f'Error updating Confluence page: {http_error}')
+            return None
+
+    async def find_page(self, space, title):
+        """
+        Find a page in the publish cache, or else with one lookup by title.
+
+        A title found missing is not looked up again by this client, e.g. when
+        the page is looked up while the tables are collected and then written.
+
+        Args:
+            space (str): The key of the space.
+            title (str): The title of the page.
+
+        Returns:
+            dict: The page 'id', 'version' and body 'hash', or None if it does not exist.
+        """
+        page = self.publish_cache.find(space, title)
+        if page is not None or (space, title) in self._missing_pages:
+            return page
+        response = await self.session.request('GET', f'{self.url}/rest/api/content', auth=self.auth, params={
+            'spaceKey': space,
+            'title': title,
+            'type': 'page',
+            'expand': 'version'
+        })
+        results = response.json().get('results') or []
+        if not results:
+            self._missing_pages.add((space, title))
+            return None
+        self.publish_cache.record(space, title, results[0]['id'], results[0]['version']['number'])
+        return self.publish_cache.find(space, title)
+
+    async def __create_page(self, space, title, html, html_hash, parent_id):
+        """
+        Create the page under the parent page and index it.
+        """
+        response = await self.session.request(
+            'POST', f'{self.url}/rest/api/content', auth=self.auth,
+            json=page_creation(space, title, html, parent_id))
+        page = response.json()
+        print(f"New page created: {title}")
+        self._missing_pages.discard((space, title))
+        self.publish_cache.record(space, title, page['id'], page['version']['number'], html_hash)
+        return self.publish_cache.find(space, title)
+
+    async def __update_page(self, space, title, page, html, html_hash):
+        """
+        Write the next version of an indexed page and index the new version.
+
+        Raises:
+            httpx.HTTPStatusError: If the page is not found (404) or its version is
+                not the indexed one (409), among other errors.
+        """
+        response = await self.session.request(
+            'PUT', f"{self.url}/rest/api/content/{page['id']}", auth=self.auth,
+            json=page_update(page, title, html))
+        self.publish_cache.record(space, title, page['id'], response.json()['version']['number'], html_hash)
+        return self.publish_cache.find(space, title)
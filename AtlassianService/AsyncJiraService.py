@@ -0,0 +1,217 @@
+"""
+async_jira_service
+
+An asyncio Jira client, returning the same results as JiraClient without a thread per request.
+"""
+from contextlib import nullcontext
+import httpx
+from AtlassianService.AsyncSession import AsyncSession
+from AtlassianService.JiraService import APPROXIMATE_COUNT_UNAVAILABLE, COUNT_PAGE_SIZE
+
+
+class AsyncJiraClient:
+    """
+    A client sending Jira searches from an event loop.
+
+    It is the asyncio counterpart of `JiraClient`: `count` and `search` return
+    what `get_jira_issues_count` and `get_jira_issues` return, from the same
+    result cache and under the same instrumentation spans, and `versions` what
+    `get_project_versions` returns. Like the sync client, a search follows the
+    page tokens of the /rest/api/3/search/jql endpoint, and an exact count
+    pages through the keys of the matching issues. Request errors are reported
+    and re-raised, like a JiraClient created with `raise_errors`.
+
+    Args:
+        url (str): The URL of the Jira server.
+        username (str): The username for Jira authentication.
+        password (str): The password for Jira authentication.
+        session (AsyncSession, optional): The session to send the requests on, e.g.
+            the one shared with the async Confluence client.
+        instrumentation (Instrumentation, optional): The recorder timing each query.
+        result_cache (ResultCache, optional): The cache of the query results.
+        approximate_counts (bool, optional): Count the issues with Jira Cloud's approximate
+            count endpoint instead of counting the keys of a search.
+
+    Attributes:
+        url (str): The URL of the Jira server.
+        auth (tuple): The username and password.
+        session (AsyncSession): The session the requests are sent on.
+        instrumentation (Instrumentation): The recorder timing each query, or None.
+        result_cache (ResultCache): The cache of the query results, or None.
+        approximate_counts (bool): Whether the counts are approximate. It is turned off,
+            falling back to exact counts, when Jira has no approximate count endpoint.
+    """
+
+    def __init__(self, url, username, password, session=None, instrumentation=None, result_cache=None,
+                 approximate_counts=False):
+        self.url = url.rstrip('/')
+        self.auth = (username, password)
+        self.session = session if session is not None else AsyncSession(instrumentation=instrumentation)
+        self.instrumentation = instrumentation
+        self.result_cache = result_cache
+        self.approximate_counts = approximate_counts
+
+    async def count(self, jql_query):
+        """
+        Retrieve the count of Jira issues based on the provided JQL query, approximately
+        with `approximate_counts`, like `JiraClient.get_jira_issues_count`.
+
+        Args:
+            jql_query (str): The JQL query to retrieve issues from Jira.
+
+        Returns:
+            int: The count of Jira issues that match the JQL query.
+        """
+        approximate = self.approximate_counts
+        kind = 'approximate_count' if approximate else 'count'
+        with self.__span('jira_count', query=jql_query, approximate=approximate) as span:
+            found, total = self.__cached(span, kind, jql_query, ['key'])
+            if not found:
+                total = await self.__approximate_count(jql_query) if approximate else None
+                if total is None:
+                    kind = 'count'
+                    total = 0
+                    async for page in self.__pages(jql_query, ['key'], COUNT_PAGE_SIZE):
+                        total += len(page)
+                self.__cache(kind, jql_query, ['key'], total)
+            if span:
+                span.result_size = total
+        return total
+
+    async def search(self, jql_query, fields, page_size=100, projection=None):
+        """
+        Retrieve every Jira issue matching the provided JQL query, projecting the
+        issues of each page as it arrives with a `projection`, like `JiraClient.get_jira_issues`.
+
+        Args:
+            jql_query (str): The JQL query to retrieve issues from Jira.
+            fields (list): The issue fields to include in the response.
+            page_size (int, optional): The number of issues requested per page.
+            projection (callable, optional): The function projecting a raw issue on the
+                requested fields, called with the issue and `fields`.
+
+        Returns:
+            list: The raw issues that match the JQL query, or their projections.
+        """
+        kind = 'search' if projection is None else f'projected:{projection.__name__}'
+        with self.__span('jira_search', query=jql_query) as span:
+            found, issues = self.__cached(span, kind, jql_query, fields)
+            if not found:
+                issues = []
+                async for page in self.__pages(jql_query, fields, page_size):
+                    issues.extend(page if projection is None else (projection(issue, fields) for issue in page))
+                self.__cache(kind, jql_query, fields, issues)
+            if span:
+                span.result_size = len(issues)
+        return issues
+
+    async def versions(self, project_key):
+        """
+        Retrieve every fix version of a project, like `JiraClient.get_project_versions`.
+
+        Args:
+            project_key (str): The Jira project key.
+
+        Returns:
+            list: The versions, each with its 'id', 'name', 'released' flag and 'releaseDate'.
+        """
+        with self.__span('jira_versions', project=project_key) as span:
+            try:
+                response = await self.session.request(
+                    'GET', f'{self.url}/rest/api/2/project/{project_key}/versions', auth=self.auth)
+            except httpx.HTTPError as http_error:
+                print(f"Failed to get the versions of {project_key}: {describe_http_error(http_error)}")
+                raise
+            versions = response.json()
+            if span:
+                span.result_size = len(versions)
+        return versions
+
+    async def __approximate_count(self, jql_query):
+        """
+        Count the issues with the approximate-count endpoint.
+
+        Returns:
+            int: The approximate count, or None if Jira has no approximate-count endpoint.
+        """
+        try:
+            response = await self.session.request(
+                'POST', f'{self.url}/rest/api/3/search/approximate-count', auth=self.auth, json={'jql': jql_query})
+            return response.json()['count']
+        except httpx.HTTPStatusError as http_error:
+            if http_error.response.status_code not in APPROXIMATE_COUNT_UNAVAILABLE:
+                print(f"Failed to count Jira issues: {describe_http_error(http_error)}")
+                raise
+        except httpx.HTTPError as http_error:
+            print(f"Failed to count Jira issues: {describe_http_error(http_error)}")
+            raise
+        if self.approximate_counts:
+            print("Jira has no approximate count endpoint: falling back to exact counts")
+            self.approximate_counts = False
+        return None
+
+    async def __pages(self, jql_query, fields, page_size):
+        """
+        Request the pages of a search from the token-paginated /rest/api/3/search/jql endpoint.
+
+        Yields:
+            list: The raw issues of each page.
+        """
+        params = {'jql': jql_query, 'fields': ','.join(fields), 'maxResults': page_size}
+        while True:
+            try:
+                response = await self.session.request(
+                    'GET', f'{self.url}/rest/api/3/search/jql', auth=self.auth, params=params)
+            except httpx.HTTPError as http_error:
+                print(f"Failed to get Jira issues: {describe_http_error(http_error)}")
+                raise
+            page = response.json()
+            yield page['issues']
+            token = page.get('nextPageToken') if page.get('issues') else None
+            if not token:
+                return
+            params = {**params, 'nextPageToken': token}
+
+    def __span(self, name, **labels):
+        """
+        Time a query with the instrumentation, if any.
+        """
+        if self.instrumentation is None:
+            return nullcontext()
+        return self.instrumentation.span(name, **labels)
+
+    def __cached(self, span, kind, jql_query, fields):
+        """
+        Look a query result up in the result cache, if any, marking the span of a cached result.
+
+        Returns:
+            tuple: Whether the result was found, and the result.
+        """
+        if self.result_cache is None:
+            return False, None
+        found, result = self.result_cache.get(kind, jql_query, fields)
+        if found and span:
+            span.labels['cached'] = True
+        return found, result
+
+    def __cache(self, kind, jql_query, fields, result):
+        """
+        Store a query result in the result cache, if any.
+        """
+        if self.result_cache is not None:
+            self.result_cache.put(kind, jql_query, fields, result)
+
+
+def describe_http_error(http_error):
+    """
+    Describe an httpx error, naming the rate limit when Jira kept throttling the request.
+
+    Args:
+        http_error (httpx.HTTPError): The error.
+
+    Returns:
+        str: The description.
+    """
+    if isinstance(http_error, httpx.HTTPStatusError) and http_error.response.status_code == 429:
+        return f"rate limit still exceeded after retries (429 Too Many Requests): {http_error}"
+    return str(http_error)
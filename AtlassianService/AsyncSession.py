@@ -0,0 +1,124 @@
+"""
+async_session
+
+Sends the requests of the async Jira and Confluence clients on one non-blocking connection pool.
+"""
+import asyncio
+import random
+import httpx
+from AtlassianService.Session import RETRY_STATUS_CODES
+from AtlassianService.RateLimiter import parse_retry_after
+
+# Methods retried after a connection error or a transient server error
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS', 'TRACE'})
+
+
+class AsyncSession:
+    """
+    A class for sending HTTP requests from an event loop on a shared httpx connection pool.
+
+    It is the asyncio counterpart of `create_session`: the connections are kept
+    alive and shared by the async Jira and Confluence clients, so hundreds of
+    requests can be in flight from one thread. Connection errors and transient
+    5xx responses of idempotent requests are retried with exponential backoff
+    and random jitter, honouring any Retry-After header. With a rate limiter,
+    every request is paced by it without blocking the event loop, and 429 Too
+    Many Requests responses are retried once the limiter allows it.
+
+    Attributes:
+        client (httpx.AsyncClient): The pooled HTTP client.
+        max_retries (int): The number of retries of a failed request.
+        backoff_factor (float): The base of the exponential backoff, in seconds.
+        backoff_jitter (float): The maximum random delay added to each backoff, in seconds.
+        rate_limiter (RateLimiter): The limiter pacing the requests, or None.
+        max_throttle_retries (int): The number of retries of a 429 response.
+        instrumentation (Instrumentation): The recorder counting the requests, or None.
+    """
+
+    def __init__(self, max_connections=100, max_retries=3, backoff_factor=0.5, backoff_jitter=0.5,
+                 rate_limiter=None, max_throttle_retries=5, instrumentation=None, timeout=60):
+        """
+        Initialize AsyncSession and its connection pool.
+
+        Args:
+            max_connections (int, optional): The maximum number of connections, i.e.
+                of requests in flight at the same time.
+            max_retries (int, optional): The number of retries of a failed request.
+            backoff_factor (float, optional): The base of the exponential backoff, in seconds:
+                the retries wait about factor * 2 ** (retry - 1).
+            backoff_jitter (float, optional): The maximum random delay added to each backoff.
+            rate_limiter (RateLimiter, optional): The limiter pacing the requests.
+            max_throttle_retries (int, optional): The number of retries of a 429 response.
+            instrumentation (Instrumentation, optional): The recorder counting the requests.
+            timeout (float, optional): The timeout of each request, in seconds.
+        """
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_jitter = backoff_jitter
+        self.rate_limiter = rate_limiter
+        self.max_throttle_retries = max_throttle_retries
+        self.instrumentation = instrumentation
+
+    async def request(self, method, url, **kwargs):
+        """
+        Send a request, pacing and retrying it.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The URL.
+            **kwargs: The httpx request arguments, e.g. the params, json body and auth.
+
+        Returns:
+            httpx.Response: The response.
+
+        Raises:
+            httpx.HTTPStatusError: If the final response is an error.
+            httpx.TransportError: If the request could not be sent after its retries.
+        """
+        retries = 0
+        throttle_retries = 0
+        while True:
+            if self.rate_limiter is not None:
+                wait = self.rate_limiter.reserve()
+                if wait:
+                    await asyncio.sleep(wait)
+            try:
+                response = await self.client.request(method, url, **kwargs)
+            except httpx.TransportError:
+                if method not in IDEMPOTENT_METHODS or retries >= self.max_retries:
+                    raise
+                retries += 1
+                await asyncio.sleep(self.__backoff(retries))
+                continue
+
+            if self.rate_limiter is not None:
+                self.rate_limiter.update(response)
+                if response.status_code == 429 and throttle_retries < self.max_throttle_retries:
+                    throttle_retries += 1
+                    continue
+            if (response.status_code in RETRY_STATUS_CODES and method in IDEMPOTENT_METHODS
+                    and retries < self.max_retries):
+                retries += 1
+                await asyncio.sleep(
+                    parse_retry_after(response.headers.get('Retry-After')) or self.__backoff(retries))
+                continue
+
+            if self.instrumentation is not None:
+                self.instrumentation.record_request(len(response.content), retries + throttle_retries)
+            response.raise_for_status()
+            return response
+
+    async def aclose(self):
+        """
+        Close the connection pool.
+        """
+        await self.client.aclose()
+
+    def __backoff(self, retry):
+        """
+        The wait before a retry, in seconds.
+        """
+        return self.backoff_factor * 2 ** (retry - 1) + random.uniform(0, self.backoff_jitter)
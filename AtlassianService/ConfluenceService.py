@@ -1,103 +1,300 @@
 """
+confluence_service
 
-Raises:
-    Exception: _description_
-
-Returns:
-    _type_: _description_
+Publishes the monthly report pages to Confluence, skipping the writes of unchanged pages.
 """
 from datetime import datetime
 import calendar
-from atlassian import Confluence
 import requests
+from AtlassianService.PublishCache import PublishCache, body_hash
+from AtlassianService.StorageFormat import render_page
+
+# Headings of the default report tables
+DEFAULT_HEADINGS = {
+    'Release Type': 'Release Metrics',
+    'Planned/Unplanned': 'Planned/Unplanned Releases',
+    'Story/Bug': 'Story/Bug Breakdown'
+}
+
+# Page properties showing a page in full width
+FULL_WIDTH_PROPERTIES = {
+    'content-appearance-draft': {'value': 'full-width'},
+    'content-appearance-published': {'value': 'full-width'}
+}
+
+# Number of titles resolved by one CQL search
+CQL_BATCH_SIZE = 50
+
+# Note shown above the tables of a page published with approximate counts
+APPROXIMATE_COUNTS_NOTE = ('These counts are approximate, from an interim refresh. '
+                           'The month-end report is published with exact counts.')
 
 
 class ConfluenceClient:
-    def __init__(self, url, username, password):
+    def __init__(self, url, username, password, session=None, instrumentation=None, publish_cache=None,
+                 banner_page=None):
         self._url = url
         self._username = username
         self._password = password
+        self.session = session
+        self.instrumentation = instrumentation
+        self.publish_cache = publish_cache if publish_cache is not None else PublishCache()
+        self.banner_page = banner_page
+        self._missing_pages = set()
         self.current_month = datetime.now().month
         self.current_year = datetime.now().year
         self.confluence = self.__authenticate()
 
     def __authenticate(self):
+        from atlassian import Confluence  # loaded only when a client is created
+
         try:
             self.confluence = Confluence(
                 url=self._url,
                 username=self._username,
-                password=self._password
+                password=self._password,
+                session=self.session
             )
             return self.confluence
         except requests.exceptions.HTTPError as e:
             print(f"Failed to authenticate Jira client: {str(e)}")
             return None
 
-    def post_confluence_page(self, page_id, page_space, tables):
+    def post_confluence_page(self, page_id, page_space, tables, year=None, month=None, headings=None, note=None):
         """
         Update the Confluence page with the tables.
-        """
-        # confluence variables for the target page
-        report_page_id = page_id
-        report_space = page_space
 
-        month_name = calendar.month_name[self.current_month]
-        current_year = self.current_year
+        The tables are posted to the monthly page of the current month, or of the
+        given year and month when backfilling history, each under its heading
+        from `headings` (keyed by table name), in the order of `tables`, below an
+        optional `note`, e.g. that the counts are approximate.
+
+        The page is found in the publish cache when it was written before, so it
+        is written without being looked up first, and it is only updated when the
+        rendered body differs from the one last written to it. Unchanged reruns
+        therefore send no request and create no new page version.
+
+        Returns:
+            dict: The page 'id', 'version' and body 'hash', or None if it could not be written.
+        """
+        if self.instrumentation is None:
+            return self.__post_page(page_id, page_space, tables, year, month, headings, note)
+        with self.instrumentation.span(
+                'post_confluence_page',
+                year=year or self.current_year,
+                month=month or self.current_month) as span:
+            page = self.__post_page(page_id, page_space, tables, year, month, headings, note)
+            span.result_size = len(tables)
+        return page
 
-        month_page_name = f"{current_year} - {month_name} Release Metrics"
+    def resolve_pages(self, page_space, titles):
+        """
+        Index the pages of several titles with a single CQL search, e.g. before a backfill.
 
-        monthly_page_exists = self.confluence.page_exists(title=month_page_name, space=report_space)
+        Titles already in the publish cache are not searched again. The titles
+        that are not found are created by `post_confluence_page` without being
+        looked up again.
 
-        if monthly_page_exists:
-            monthly_page = self.confluence.get_page_by_title(
-                title=month_page_name,
-                space=report_space)
-            monthly_page_id = monthly_page['id']
-            print(f"Monthly page already exists: {monthly_page_id}. Updating the data now...")
+        Args:
+            page_space (str): The key of the space.
+            titles (list): The page titles, e.g. from `month_page_title`.
 
+        Returns:
+            int: The number of titles with an existing page.
+        """
+        found = sum(self.publish_cache.find(page_space, title) is not None for title in titles)
+        titles = [title for title in titles if self.publish_cache.find(page_space, title) is None]
+        for start in range(0, len(titles), CQL_BATCH_SIZE):
+            batch = titles[start:start + CQL_BATCH_SIZE]
+            quoted = ', '.join('"{}"'.format(title.replace('"', '\\"')) for title in batch)
             try:
-                # Create HTML for all tables with headers
-                html = '<h2>Release Metrics</h2>'
-                html += tables['Release Type'].to_html()
-
-                html += '<h2>Planned/Unplanned Releases</h2>'
-                html += tables['Planned/Unplanned'].to_html()
-
-                html += '<h2>Story/Bug Breakdown</h2>'
-                html += tables['Story/Bug'].to_html()
-
-                # Update the Confluence page with the new content
-                self.confluence.update_existing_page(
-                    page_id=monthly_page_id,
-                    title=month_page_name,
-                    body=html,
-                    representation='storage',
-                    full_width= True)
+                response = self.confluence.get('rest/api/content/search', params={
+                    'cql': f'space = "{page_space}" AND type = page AND title in ({quoted})',
+                    'expand': 'version',
+                    'limit': len(batch)
+                })
             except requests.exceptions.HTTPError as http_error:
-                print(f'Error updating Confluence page: {http_error}')
-        else:
+                print(f"Error resolving the Confluence pages: {http_error}")
+                continue
+            pages = {page['title']: page for page in (response or {}).get('results', [])}
+            for title in batch:
+                if title in pages:
+                    self.publish_cache.record(page_space, title, pages[title]['id'], pages[title]['version']['number'])
+                    found += 1
+                else:
+                    self._missing_pages.add((page_space, title))
+        return found
+
+    def __post_page(self, page_id, page_space, tables, year=None, month=None, headings=None, note=None):
+        """
+        Create or update the monthly page with the tables.
+
+        Returns:
+            dict: The indexed page, or None if it could not be written.
+        """
+        # confluence variables for the target page
+        report_page_id = page_id
+        report_space = page_space
+
+        month_page_name = month_page_title(year or self.current_year, month or self.current_month)
+
+        # Create HTML for all tables with headers
+        html = self.__build_html(tables, headings, note)
+        html_hash = body_hash(month_page_name, html)
+
+        monthly_page = self.__find_page(report_space, month_page_name)
+        if monthly_page is None:
             print(f"Monthly page does not exist: {month_page_name}. Creating a new page now...")
+            return self.__create_page(report_space, month_page_name, html, html_hash, report_page_id)
+        if monthly_page['hash'] == html_hash:
+            print(f"Monthly page {monthly_page['id']} is up to date. Skipping the update.")
+            return monthly_page
 
+        print(f"Monthly page already exists: {monthly_page['id']}. Updating the data now...")
+        try:
+            return self.__update_page(report_space, month_page_name, monthly_page, html, html_hash)
+        except requests.exceptions.HTTPError as http_error:
+            status_code = getattr(http_error.response, 'status_code', None)
+            if status_code not in (404, 409):
+                print(f'Error updating Confluence page: {http_error}')
+                return None
+            # The indexed page was deleted or changed since the last write: look it up again
+            print(f"Monthly page {monthly_page['id']} changed since the last run. Looking it up again...")
+            self.publish_cache.forget(report_space, month_page_name)
+            self._missing_pages.discard((report_space, month_page_name))
+            monthly_page = self.__find_page(report_space, month_page_name)
+            if monthly_page is None:
+                return self.__create_page(report_space, month_page_name, html, html_hash, report_page_id)
             try:
-                # Create HTML for all tables with headers
-                html = '<h2>Release Metrics</h2>'
-                html += tables['Release Type'].to_html()
-
-                html += '<h2>Planned/Unplanned Releases</h2>'
-                html += tables['Planned/Unplanned'].to_html()
-
-                html += '<h2>Story/Bug Breakdown</h2>'
-                html += tables['Story/Bug'].to_html()
-
-                # Create the new page
-                self.confluence.create_page(
-                    space=report_space,
-                    title=month_page_name,
-                    body=html,
-                    representation="storage",
-                    full_width=True,
-                    parent_id=report_page_id,
-                    editor="v2")
-                print(f"New page created: {month_page_name}")
-            except requests.exceptions.HTTPError as http_error:
-                print(f"Error creating new page: {http_error}")
+                return self.__update_page(report_space, month_page_name, monthly_page, html, html_hash)
+            except requests.exceptions.HTTPError as retry_error:
+                print(f'Error updating Confluence page: {retry_error}')
+                return None
+
+    def __find_page(self, space, title):
+        """
+        Find a page in the publish cache, or else with one lookup by title.
+
+        Returns:
+            dict: The page 'id', 'version' and body 'hash', or None if it does not exist.
+        """
+        page = self.publish_cache.find(space, title)
+        if page is not None or (space, title) in self._missing_pages:
+            return page
+        response = self.confluence.get('rest/api/content', params={
+            'spaceKey': space,
+            'title': title,
+            'type': 'page',
+            'expand': 'version'
+        })
+        results = (response or {}).get('results') or []
+        if not results:
+            return None
+        self.publish_cache.record(space, title, results[0]['id'], results[0]['version']['number'])
+        return self.publish_cache.find(space, title)
+
+    def __create_page(self, space, title, html, html_hash, parent_id):
+        """
+        Create the page under the report page and index it.
+
+        Returns:
+            dict: The indexed page, or None if it could not be created.
+        """
+        try:
+            page = self.confluence.post('rest/api/content', data=page_creation(space, title, html, parent_id))
+        except requests.exceptions.HTTPError as http_error:
+            print(f"Error creating new page: {http_error}")
+            return None
+        print(f"New page created: {title}")
+        self.publish_cache.record(space, title, page['id'], page['version']['number'], html_hash)
+        return self.publish_cache.find(space, title)
+
+    def __update_page(self, space, title, page, html, html_hash):
+        """
+        Write the next version of an indexed page and index the new version.
+
+        Returns:
+            dict: The indexed page.
+
+        Raises:
+            requests.exceptions.HTTPError: If the page is not found (404) or its
+                version is not the indexed one (409), among other errors.
+        """
+        updated = self.confluence.put(f"rest/api/content/{page['id']}", data=page_update(page, title, html))
+        self.publish_cache.record(space, title, page['id'], updated['version']['number'], html_hash)
+        return self.publish_cache.find(space, title)
+
+    def __build_html(self, tables, headings=None, note=None):
+        """
+        Build the storage-format body of the page from the tables, under the info
+        banner linking to `banner_page`, if any.
+
+        Args:
+            tables (dict): The DataFrame of each table, keyed by table name.
+            headings (dict, optional): The heading of each table, keyed by table name.
+                Tables without a heading are shown under their name.
+            note (str, optional): A note shown above the tables.
+
+        Returns:
+            str: The storage-format XHTML of the page.
+        """
+        return render_page(tables, DEFAULT_HEADINGS if headings is None else headings, self.banner_page, note)
+
+
+def month_page_title(year, month):
+    """
+    The title of the monthly report page.
+
+    Args:
+        year (int): The year of the report.
+        month (int): The month of the report.
+
+    Returns:
+        str: The title, e.g. '2024 - March Release Metrics'.
+    """
+    return f"{year} - {calendar.month_name[month]} Release Metrics"
+
+
+def page_creation(space, title, html, parent_id):
+    """
+    The body of the request creating a full-width page under a parent page.
+
+    Args:
+        space (str): The key of the space.
+        title (str): The title of the page.
+        html (str): The storage-format body.
+        parent_id (str): The id of the parent page.
+
+    Returns:
+        dict: The JSON body of the POST request.
+    """
+    return {
+        'type': 'page',
+        'title': title,
+        'space': {'key': space},
+        'ancestors': [{'type': 'page', 'id': parent_id}],
+        'body': {'storage': {'value': html, 'representation': 'storage'}},
+        'metadata': {'properties': {**FULL_WIDTH_PROPERTIES, 'editor': {'value': 'v2'}}}
+    }
+
+
+def page_update(page, title, html):
+    """
+    The body of the request writing the next version of an indexed page.
+
+    Args:
+        page (dict): The indexed page, with its 'id' and 'version'.
+        title (str): The title of the page.
+        html (str): The storage-format body.
+
+    Returns:
+        dict: The JSON body of the PUT request.
+    """
+    return {
+        'id': page['id'],
+        'type': 'page',
+        'title': title,
+        'version': {'number': page['version'] + 1},
+        'body': {'storage': {'value': html, 'representation': 'storage'}},
+        'metadata': {'properties': FULL_WIDTH_PROPERTIES}
+    }
@@ -1,42 +1,67 @@
+# Maximum number of released versions named by id in a query; beyond it the query
+# calls releasedVersions() instead, keeping the JQL within the URL length limits
+MAX_VERSION_IDS = 500
+
+
 class JQLQuery:
     """
     A class to generate a Jira Query Language (JQL) query for retrieving issues based on specified criteria.
     
     Attributes:
-        project_key (str): The Jira project key.
+        project_key (str or list): The Jira project key, or a list of keys to query
+            all of those projects at once.
         issue_type (str): The type of issue(s) to filter on.
-        issue_fields (list): A list of fields associated with the issue (currently not used in query construction).
+        issue_fields (dict): The Jira field names of the issue metrics (currently not used in query construction).
         release_type (str, optional): A dropdown filter value for the "Release Type[Dropdown]" field.
         release_window (str, optional): A dropdown filter value for the "Release Window[Dropdown]" field.
+        released_versions (list, optional): The ids of the released fix versions of the project(s),
+            named in the query instead of releasedVersions().
+        resolved_start (str, optional): The first resolution date, as 'YYYY-MM-DD', instead of the
+            start of the current month.
+        resolved_end (str, optional): The resolution date the range ends before, as 'YYYY-MM-DD',
+            instead of the end of the current month.
         jql_query (str): The constructed JQL query string.
+        sync_query (str): The JQL query string for incremental syncs.
     """
 
-    def __init__(self, project_key, issue_type, issue_fields, release_type=None, release_window=None):
+    def __init__(self, project_key, issue_type, issue_fields, release_type=None, release_window=None,
+                 resolved_start=None, resolved_end=None, released_versions=None):
         """
         Initialize a JQLQuery instance and build the corresponding JQL query.
         
         Args:
-            project_key (str): The Jira project key.
+            project_key (str or list): The Jira project key, or a list of project keys.
             issue_type (str): The issue type identifier(s) for filtering.
-            issue_fields (list): List of issue fields; provided for potential future use.
+            issue_fields (dict): The Jira field names of the issue metrics; provided for potential future use.
             release_type (str, optional): Value for filtering the "Release Type[Dropdown]" field.
             release_window (str, optional): Value for filtering the "Release Window[Dropdown]" field.
+            resolved_start (str, optional): The first resolution date of the range, as 'YYYY-MM-DD'.
+            resolved_end (str, optional): The resolution date the range ends before, as 'YYYY-MM-DD'.
+            released_versions (list, optional): The ids of the released fix versions of the
+                project(s), e.g. from a `VersionIndex`, instead of releasedVersions().
         """
         self.project_key = project_key
         self.issue_type = issue_type
         self.issue_fields = issue_fields
         self.release_type = release_type
         self.release_window = release_window
+        self.resolved_start = resolved_start
+        self.resolved_end = resolved_end
+        self.released_versions = released_versions
         self.jql_query = self.__build_query()
+        self.sync_query = self.__build_sync_query()
 
     def __build_query(self):
         """
         Construct the JQL query using the provided parameters.
         
         The base query filters for:
-            - Fix versions that have been released for the specified project.
+            - Fix versions that have been released for the specified project. For a
+              list of projects, the issues of those projects with any released fix version.
+              The released versions are named by id when 'released_versions' is provided.
             - Specified issue types.
-            - Issues resolved within the current month (from the start to the end of the month).
+            - Issues resolved within the current month (from the start to the end of the month),
+              or within the resolution date range when 'resolved_start' and 'resolved_end' are provided.
         
         If 'release_type' is provided, it adds a filter on "Release Type[Dropdown]".
         If 'release_window' is provided (and 'release_type' is not), it adds a filter on "Release Window[Dropdown]".
@@ -44,10 +69,15 @@ class JQLQuery:
         Returns:
             str: The constructed JQL query string.
         """
+        project_clause = fixversion_clause(self.project_key, self.released_versions)
+        if self.resolved_start and self.resolved_end:
+            resolved_clause = f'(resolved >= "{self.resolved_start}" AND resolved < "{self.resolved_end}")'
+        else:
+            resolved_clause = '(resolved > startOfMonth() AND resolved < endOfMonth())'
         base_query = (
-            f'fixversion in releasedVersions("{self.project_key}") AND '
+            f'{project_clause} AND '
             f'issuetype in ({self.issue_type}) AND '
-            f'(resolved > startOfMonth() AND resolved < endOfMonth())'
+            f'{resolved_clause}'
         )
         if self.release_type:
             return f'{base_query} AND "Release Type[Dropdown]" = {self.release_type}'
@@ -55,6 +85,22 @@ class JQLQuery:
             return f'{base_query} AND "Release Window[Dropdown]" = "{self.release_window}"'
         return base_query
 
+    def __build_sync_query(self):
+        """
+        Construct the JQL query used to sync a local issue store incrementally.
+
+        It selects every issue of the project(s) and issue types, whatever its fix
+        versions and resolution, so that issues which stop matching the base query
+        (e.g. when they are reopened) are synced too.
+
+        Returns:
+            str: The constructed JQL query string.
+        """
+        if isinstance(self.project_key, (list, tuple)):
+            projects = ', '.join(f'"{key}"' for key in self.project_key)
+            return f'project in ({projects}) AND issuetype in ({self.issue_type})'
+        return f'project = "{self.project_key}" AND issuetype in ({self.issue_type})'
+
     def get_jql_query(self):
         """
         Retrieve the constructed JQL query.
@@ -62,4 +108,38 @@ class JQLQuery:
         Returns:
             str: The JQL query string.
         """
-        return self.jql_query
\ No newline at end of file
+        return self.jql_query
+
+    def get_sync_query(self):
+        """
+        Retrieve the JQL query used for incremental syncs.
+        
+        Returns:
+            str: The JQL query string.
+        """
+        return self.sync_query
+
+
+def fixversion_clause(project_key, released_versions=None):
+    """
+    Build the JQL clause selecting the issues with a released fix version.
+
+    The released versions are named by id when they are known, so that Jira does
+    not evaluate releasedVersions() for the query. Without them, or when there are
+    none or more than MAX_VERSION_IDS of them, releasedVersions() is called.
+
+    Args:
+        project_key (str or list): The Jira project key, or a list of project keys.
+        released_versions (list, optional): The ids of the released fix versions of the project(s).
+
+    Returns:
+        str: The JQL clause.
+    """
+    if isinstance(project_key, (list, tuple)):
+        projects = ', '.join(f'"{key}"' for key in project_key)
+        if released_versions and len(released_versions) <= MAX_VERSION_IDS:
+            return f'project in ({projects}) AND fixversion in ({", ".join(released_versions)})'
+        return f'project in ({projects}) AND fixversion in releasedVersions()'
+    if released_versions and len(released_versions) <= MAX_VERSION_IDS:
+        return f'project = "{project_key}" AND fixversion in ({", ".join(released_versions)})'
+    return f'fixversion in releasedVersions("{project_key}")'
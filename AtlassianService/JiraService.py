@@ -1,6 +1,21 @@
-from atlassian import Jira
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from contextvars import copy_context
+from datetime import datetime, timedelta, timezone
+from functools import partial
 import requests
 
+# Status codes of a Jira without the approximate-count endpoint, e.g. Jira Data Center
+APPROXIMATE_COUNT_UNAVAILABLE = (404, 405, 501)
+
+# Issues per page when counting the keys of a search: the token-paginated search
+# endpoint has no total, and returns up to 5000 issues per page of keys only
+COUNT_PAGE_SIZE = 5000
+
+# Overlap between incremental syncs, covering clock skew and the minute
+# precision of JQL dates. Re-fetched issues are simply upserted again.
+SYNC_OVERLAP = timedelta(minutes=5)
+
 class JiraClient:
     """
     A client for connecting to a Jira server using provided credentials.
@@ -12,45 +27,387 @@ class JiraClient:
         url (str): The URL of the Jira server.
         username (str): The username for Jira authentication.
         password (str): The password for Jira authentication.
+        raise_errors (bool, optional): Re-raise request errors after reporting them
+            instead of returning None, so that callers can collect them.
+        session (requests.Session, optional): The HTTP session to send the requests on,
+            e.g. the connection-pooled session shared with the Confluence client.
+        instrumentation (Instrumentation, optional): The recorder timing each query.
+        result_cache (ResultCache, optional): The cache the query results are served from
+            when they are cached, and stored in otherwise.
+        approximate_counts (bool, optional): Count the issues with Jira Cloud's approximate
+            count endpoint instead of counting the keys of a search.
 
     Attributes:
         _url (str): The URL of the Jira server.
         _username (str): The Jira username.
         _password (str): The Jira password.
+        raise_errors (bool): Whether request errors are re-raised.
+        session (requests.Session): The HTTP session of the requests, or None for
+            a session of its own.
+        instrumentation (Instrumentation): The recorder timing each query, or None.
+        result_cache (ResultCache): The cache of the query results, or None.
+        approximate_counts (bool): Whether the counts are approximate. It is turned off,
+            falling back to exact counts, when Jira has no approximate count endpoint.
         jira (Jira): The authenticated Jira client instance.
     """
 
-    def __init__(self, url, username, password):
+    def __init__(self, url, username, password, raise_errors=False, session=None, instrumentation=None,
+                 result_cache=None, approximate_counts=False):
         self._url = url
         self._username = username
         self._password = password
+        self.raise_errors = raise_errors
+        self.session = session
+        self.instrumentation = instrumentation
+        self.result_cache = result_cache
+        self.approximate_counts = approximate_counts
         self.jira = self.__authenticate()
 
     def __authenticate(self):
+        from atlassian import Jira  # loaded only when a client is created
+
         try:
             self.jira = Jira(
                 url=self._url,
                 username=self._username,
-                password=self._password
+                password=self._password,
+                session=self.session
             )
             return self.jira
         except requests.exceptions.HTTPError as e:
             print(f"Failed to authenticate Jira client: {str(e)}")
             return None
 
-    def get_jira_issues_count(self, jql_query):
+    def __span(self, name, **labels):
+        """
+        Time a query with the instrumentation, if any.
+
+        Returns:
+            contextmanager: The span of the query, yielding None without instrumentation.
+        """
+        if self.instrumentation is None:
+            return nullcontext()
+        return self.instrumentation.span(name, **labels)
+
+    def __cached(self, span, kind, jql_query, fields):
+        """
+        Look a query result up in the result cache, if any, marking the span of a cached result.
+
+        Returns:
+            tuple: Whether the result was found, and the result.
+        """
+        if self.result_cache is None:
+            return False, None
+        found, result = self.result_cache.get(kind, jql_query, fields)
+        if found and span:
+            span.labels['cached'] = True
+        return found, result
+
+    def __cache(self, kind, jql_query, fields, result):
+        """
+        Store a query result in the result cache, if any.
+        """
+        if self.result_cache is not None:
+            self.result_cache.put(kind, jql_query, fields, result)
+
+    def get_jira_issues_count(self, jql_query, approximate=None):
         """
         Retrieve the count of Jira issues based on the provided JQL query.
 
+        Exact counts page through the keys of the matching issues on the
+        token-paginated search endpoint, one request per COUNT_PAGE_SIZE issues,
+        as it returns no total. Approximate counts use
+        the lighter approximate-count endpoint of Jira Cloud, meant for dashboards
+        refreshed during the day; they fall back to exact counts for the rest of
+        the client's life when Jira does not have that endpoint.
+
         Args:
             jql_query (str): The JQL query to retrieve issues from Jira.
+            approximate (bool, optional): Count approximately, instead of following
+                the client's `approximate_counts`.
 
         Returns:
-            int: The count of Jira issues that match the JQL query.
+            int: The count of Jira issues that match the JQL query, or None if the
+            request failed and errors are not re-raised.
         """
+        approximate = self.approximate_counts if approximate is None else approximate
         try:
-            issues = self.jira.jql(jql_query, fields=['key'], limit=1)
-            return issues['total']
+            kind = 'approximate_count' if approximate else 'count'
+            with self.__span('jira_count', query=jql_query, approximate=approximate) as span:
+                found, total = self.__cached(span, kind, jql_query, ['key'])
+                if not found:
+                    total = self.__approximate_count(jql_query) if approximate else None
+                    if total is None:
+                        kind = 'count'
+                        total = self.__count_issues(jql_query)
+                    self.__cache(kind, jql_query, ['key'], total)
+                if span:
+                    span.result_size = total
+            return total
         except requests.exceptions.HTTPError as http_error:
-            print(f"Failed to get Jira issues: {http_error}")
+            print(f"Failed to get Jira issues: {describe_http_error(http_error)}")
+            if self.raise_errors:
+                raise
             return None
+
+    def __approximate_count(self, jql_query):
+        """
+        Count the issues with the approximate-count endpoint.
+
+        Returns:
+            int: The approximate count, or None if Jira has no approximate-count endpoint.
+        """
+        try:
+            return self.jira.post(
+                self.jira.resource_url('search/approximate-count', api_version=3), data={'jql': jql_query})['count']
+        except requests.exceptions.HTTPError as http_error:
+            response = http_error.response
+            if response is None or response.status_code not in APPROXIMATE_COUNT_UNAVAILABLE:
+                raise
+        if self.approximate_counts:
+            print("Jira has no approximate count endpoint: falling back to exact counts")
+            self.approximate_counts = False
+        return None
+
+    def __count_issues(self, jql_query):
+        """
+        Count the issues of a search by paging through their keys.
+
+        Returns:
+            int: The number of matching issues.
+        """
+        return sum(len(page) for page in self.__pages(jql_query, ['key'], COUNT_PAGE_SIZE))
+
+    def __first_issue(self, jql_query, fields):
+        """
+        Request the first issue of a search with one single-issue page.
+
+        Returns:
+            dict: The raw issue with the requested fields, or None if no issue matches.
+        """
+        return next((page[0] for page in self.__pages(jql_query, fields, 1) if page), None)
+
+    def get_jira_fingerprint(self, jql_query):
+        """
+        Retrieve a cheap fingerprint of the Jira issues matching the provided JQL query.
+
+        The keys of the matching issues are counted like an exact count, and a
+        one-issue search ordered by update time returns the most recently updated
+        one, which is enough to tell whether the results of the query may have
+        changed since a previous run. Fingerprints are never served from the
+        result cache, which could not see the changes they are meant to detect.
+
+        Args:
+            jql_query (str): The JQL query to retrieve issues from Jira, without ORDER BY.
+
+        Returns:
+            list: The number of matching issues and the newest update time, or None
+            if the request failed and errors are not re-raised.
+        """
+        try:
+            with self.__span('jira_probe', query=jql_query) as span:
+                total = self.__count_issues(jql_query)
+                newest = None
+                if total:
+                    issue = self.__first_issue(f'{jql_query} ORDER BY updated DESC', ['updated'])
+                    newest = issue['fields'].get('updated') if issue else None
+                fingerprint = [total, newest]
+                if span:
+                    span.result_size = fingerprint[0]
+            return fingerprint
+        except requests.exceptions.HTTPError as http_error:
+            print(f"Failed to probe Jira issues: {describe_http_error(http_error)}")
+            if self.raise_errors:
+                raise
+            return None
+
+    def get_project_versions(self, project_key):
+        """
+        Retrieve every fix version of a project with one request.
+
+        Args:
+            project_key (str): The Jira project key.
+
+        Returns:
+            list: The versions, each with its 'id', 'name', 'released' flag and
+            'releaseDate', or None if the request failed and errors are not re-raised.
+        """
+        try:
+            with self.__span('jira_versions', project=project_key) as span:
+                versions = self.jira.get_project_versions(project_key)
+                if span:
+                    span.result_size = len(versions)
+            return versions
+        except requests.exceptions.HTTPError as http_error:
+            print(f"Failed to get the versions of {project_key}: {describe_http_error(http_error)}")
+            if self.raise_errors:
+                raise
+            return None
+
+    def get_jira_issues(self, jql_query, fields, page_size=100, use_cache=True, projection=None):
+        """
+        Retrieve every Jira issue matching the provided JQL query.
+
+        The search is paginated with `page_size` issues per request, following the
+        page tokens of the search endpoint, and only the requested fields are
+        returned for each issue. With a `projection`, the issues of each page are
+        projected as the page arrives, while the next one is requested, so only
+        the projected issues are held and cached instead of the raw pages. Use
+        `iter_issues` to process large results without holding them.
+
+        Args:
+            jql_query (str): The JQL query to retrieve issues from Jira.
+            fields (list): The issue fields to include in the response.
+            page_size (int, optional): The number of issues requested per page.
+            use_cache (bool, optional): Serve and store the issues with the result cache, if any.
+            projection (callable, optional): The function projecting a raw issue on the
+                requested fields, called with the issue and `fields`, e.g.
+                `ProjectMetrics.issue_values`. Its results are cached under its name.
+
+        Returns:
+            list: The raw issues that match the JQL query, or their projections, or
+            None if a request failed and errors are not re-raised.
+        """
+        kind = 'search' if projection is None else f'projected:{projection.__name__}'
+        try:
+            with self.__span('jira_search', query=jql_query) as span:
+                found, issues = self.__cached(span, kind, jql_query, fields) if use_cache else (False, None)
+                if not found:
+                    if projection is None:
+                        issues = [issue for page in self.__pages(jql_query, fields, page_size) for issue in page]
+                    else:
+                        issues = [
+                            projection(issue, fields)
+                            for page in self.__pages(jql_query, fields, page_size, prefetch=True) for issue in page
+                        ]
+                    if use_cache:
+                        self.__cache(kind, jql_query, fields, issues)
+                if span:
+                    span.result_size = len(issues)
+            return issues
+        except requests.exceptions.HTTPError as http_error:
+            print(f"Failed to get Jira issues: {describe_http_error(http_error)}")
+            if self.raise_errors:
+                raise
+            return None
+
+    def iter_issues(self, jql_query, fields, page_size=100, prefetch=True):
+        """
+        Stream the Jira issues matching the provided JQL query, keeping at most two pages in memory.
+
+        The pages come from the token-paginated search endpoint with only the
+        requested fields, and the next page is requested while the issues of the
+        current one are consumed. Results are not cached, so memory stays flat
+        whatever the number of issues. As the issues already yielded cannot be
+        taken back, a failed request is reported and re-raised even without
+        `raise_errors`.
+
+        Args:
+            jql_query (str): The JQL query to retrieve issues from Jira.
+            fields (list): The issue fields to include in the response.
+            page_size (int, optional): The number of issues requested per page.
+            prefetch (bool, optional): Request the next page while the current one is consumed.
+
+        Yields:
+            dict: The raw issues that match the JQL query, with the requested fields only.
+
+        Raises:
+            requests.exceptions.HTTPError: If a request failed.
+        """
+        try:
+            with self.__span('jira_search', query=jql_query, streamed=True) as span:
+                streamed = 0
+                for page in self.__pages(jql_query, fields, page_size, prefetch):
+                    for issue in page:
+                        streamed += 1
+                        yield issue
+                if span:
+                    span.result_size = streamed
+        except requests.exceptions.HTTPError as http_error:
+            print(f"Failed to get Jira issues: {describe_http_error(http_error)}")
+            raise
+
+    def __pages(self, jql_query, fields, page_size, prefetch=False):
+        """
+        Request the pages of a search from the token-paginated /rest/api/3/search/jql endpoint.
+
+        Yields:
+            list: The raw issues of each page.
+        """
+        # The enhanced_jql wrapper of the atlassian client only allows it on clients created for Cloud
+        url = self.jira.resource_url('search/jql', api_version=3)
+        params = {'jql': jql_query, 'fields': ','.join(fields), 'maxResults': page_size}
+        with ThreadPoolExecutor(1) if prefetch else nullcontext() as prefetcher:
+            page = self.jira.get(url, params=params)
+            while True:
+                token = page.get('nextPageToken') if page.get('issues') else None
+                following = None
+                if token:
+                    following_params = {**params, 'nextPageToken': token}
+                    if prefetcher:
+                        # The copied context keeps the requests under the caller's instrumentation span
+                        following = prefetcher.submit(copy_context().run, self.jira.get, url, params=following_params)
+                    else:
+                        following = partial(self.jira.get, url, params=following_params)
+                yield page['issues']
+                if following is None:
+                    return
+                page = following.result() if prefetcher else following()
+
+    def sync_issues(self, issue_store, project_keys, sync_query, month_query, time_zone, page_size=100):
+        """
+        Bring a local issue store up to date with Jira.
+
+        The first sync, and any sync after the store's full sync age, fetches every
+        issue of `month_query` and replaces the projects' stored issues. Later syncs
+        only fetch the issues of `sync_query` updated since the last sync and upsert
+        them.
+
+        Args:
+            issue_store (IssueStore): The local issue store.
+            project_keys (list): The keys of the synced projects.
+            sync_query (str): The JQL query of every issue that may be counted.
+            month_query (str): The JQL query of the issues counted this month.
+            time_zone (tzinfo): The time zone of the Jira user, used for JQL dates.
+            page_size (int, optional): The number of issues requested per page.
+
+        Returns:
+            int: The number of issues fetched, or None if a request failed and errors
+            are not re-raised.
+        """
+        last_sync = issue_store.get_last_sync(sync_query)
+        synced_at = datetime.now(timezone.utc)
+        if last_sync is None:
+            jql_query = month_query
+        else:
+            since = (last_sync - SYNC_OVERLAP).astimezone(time_zone).strftime('%Y/%m/%d %H:%M')
+            jql_query = f'{sync_query} AND updated >= "{since}"'
+
+        # The store is the cache of the synced issues, so its syncs always query Jira, streaming the issues
+        # into the store's compact rows instead of holding the raw pages
+        try:
+            synced = issue_store.upsert_issues(
+                self.iter_issues(jql_query, issue_store.fields, page_size),
+                replace_projects=project_keys if last_sync is None else None)
+        except requests.exceptions.HTTPError:
+            if self.raise_errors:
+                raise
+            return None
+        issue_store.set_last_sync(sync_query, synced_at, full_sync=last_sync is None)
+        return synced
+
+
+def describe_http_error(http_error):
+    """
+    Describe an HTTP error, naming the rate limit when Jira kept throttling the request.
+
+    Args:
+        http_error (requests.exceptions.HTTPError): The error.
+
+    Returns:
+        str: The description.
+    """
+    response = http_error.response
+    if response is not None and response.status_code == 429:
+        return f"rate limit still exceeded after retries (429 Too Many Requests): {http_error}"
+    return str(http_error)
@@ -0,0 +1,111 @@
+"""
+publish_cache
+
+Remembers the Confluence pages the reports are written to, so they are not looked up or written again needlessly.
+"""
+import os
+import json
+import hashlib
+
+
+class PublishCache:
+    """
+    A class for keeping the id, version and body hash of the report pages.
+
+    Each page is indexed by its space and title, with the version its last
+    write produced and the hash of the storage-format body written to it. The
+    client trusts the index instead of looking the page up before writing:
+    the write sends the next version, so a page deleted or edited since fails
+    with a not-found or version conflict error, and only then is it looked up
+    again. An unchanged body is not written at all, so a page edited by hand
+    keeps its edits until the report changes.
+
+    Attributes:
+        path (str): The path of the JSON file the index is kept in, or None to keep
+            it for the current run only.
+        pages (dict): The id, version and body hash of each page, keyed by space
+            and then by title.
+    """
+
+    def __init__(self, path=None):
+        """
+        Initialize PublishCache and load the index of the previous runs.
+
+        Args:
+            path (str, optional): The path of the JSON file the index is kept in.
+        """
+        self.path = path
+        self.pages = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.pages = json.load(f).get('pages') or {}
+            except (OSError, ValueError, AttributeError) as error:
+                print(f"Ignoring the unreadable publish cache {path}: {error}")
+
+    def find(self, space, title):
+        """
+        Return the indexed page of a title.
+
+        Args:
+            space (str): The key of the space.
+            title (str): The title of the page.
+
+        Returns:
+            dict: The page 'id', 'version' and body 'hash' (None if unknown), or None
+            if the page is not indexed.
+        """
+        return self.pages.get(space, {}).get(title)
+
+    def record(self, space, title, page_id, version, body_hash=None):
+        """
+        Index a page and write the cache file.
+
+        Args:
+            space (str): The key of the space.
+            title (str): The title of the page.
+            page_id (str): The id of the page.
+            version (int): The current version of the page.
+            body_hash (str, optional): The hash of the body written in that version,
+                or None if the body was not written by this client.
+        """
+        self.pages.setdefault(space, {})[title] = {'id': str(page_id), 'version': version, 'hash': body_hash}
+        self.__save()
+
+    def forget(self, space, title):
+        """
+        Remove a page from the index, e.g. after a write found it stale.
+
+        Args:
+            space (str): The key of the space.
+            title (str): The title of the page.
+        """
+        self.pages.get(space, {}).pop(title, None)
+        self.__save()
+
+    def __save(self):
+        """
+        Write the index to the JSON file, if any.
+        """
+        if not self.path:
+            return
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temporary_path = f'{self.path}.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            json.dump({'pages': self.pages}, f, indent=2)
+        os.replace(temporary_path, self.path)
+
+
+def body_hash(title, body):
+    """
+    Hash the title and storage-format body of a page.
+
+    Args:
+        title (str): The title of the page.
+        body (str): The storage-format body.
+
+    Returns:
+        str: The SHA-256 hex digest.
+    """
+    return hashlib.sha256(f'{title}\n{body}'.encode('utf-8')).hexdigest()
@@ -0,0 +1,222 @@
+"""
+rate_limiter
+
+Paces the requests sent to Atlassian Cloud to the rate the tenant allows.
+"""
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+
+# Share of the rate limit left below which the request rate is lowered
+NEAR_LIMIT_RATIO = 0.1
+
+
+class RateLimiter:
+    """
+    A class for an adaptive token bucket shared by every caller of a session.
+
+    Each request takes a token before it is sent; tokens are added at `rate`
+    per second, up to `burst`. The rate adapts to the responses (additive
+    increase, multiplicative decrease): it grows by `increase` after every
+    successful response, and is multiplied by `decrease` when the server
+    reports being near its limit through the `X-RateLimit-*` headers or answers
+    429 Too Many Requests. A 429, or a `X-RateLimit-Remaining` of 0, also blocks
+    every caller until its `Retry-After` or `X-RateLimit-Reset` time.
+
+    Attributes:
+        rate (float): The current number of requests per second.
+        min_rate (float): The lowest rate the limiter decreases to.
+        max_rate (float): The highest rate the limiter increases to.
+        burst (int): The number of requests that can be sent at once after an idle period.
+        increase (float): The rate added after each successful response.
+        decrease (float): The factor the rate is multiplied by when throttled.
+        throttled_seconds (float): The total time callers waited for a token, summed
+            over the callers.
+        throttled_responses (int): The number of 429 responses received.
+    """
+
+    def __init__(self, rate=10, min_rate=0.5, max_rate=50, burst=10, increase=0.5, decrease=0.5):
+        """
+        Initialize RateLimiter.
+
+        Args:
+            rate (float, optional): The initial number of requests per second.
+            min_rate (float, optional): The lowest rate the limiter decreases to.
+            max_rate (float, optional): The highest rate the limiter increases to.
+            burst (int, optional): The number of requests that can be sent at once.
+            increase (float, optional): The rate added after each successful response.
+            decrease (float, optional): The factor the rate is multiplied by when throttled.
+        """
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase = increase
+        self.decrease = decrease
+        self.throttled_seconds = 0.0
+        self.throttled_responses = 0
+        self._lock = threading.Lock()
+        self._next_free = time.monotonic()
+        self._blocked_until = 0.0
+
+    def acquire(self):
+        """
+        Wait until a request may be sent.
+
+        Returns:
+            float: The time waited, in seconds.
+        """
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def reserve(self):
+        """
+        Reserve the next slot to send a request in, without waiting for it, e.g.
+        for an asyncio caller that sleeps without blocking its event loop.
+
+        Returns:
+            float: The time to wait before sending the request, in seconds.
+        """
+        with self._lock:
+            now = time.monotonic()
+            interval = 1 / self.rate
+            # The bucket is full once the next free slot is `burst` intervals in the past
+            start = max(self._next_free, now - (self.burst - 1) * interval, self._blocked_until)
+            self._next_free = start + interval
+            wait = max(0.0, start - now)
+            self.throttled_seconds += wait
+        return wait
+
+    def update(self, response):
+        """
+        Adapt the rate to a response.
+
+        Args:
+            response (requests.Response or httpx.Response): The response of a paced request.
+        """
+        headers = response.headers
+        with self._lock:
+            if response.status_code == 429:
+                self.throttled_responses += 1
+                self.__slow_down(parse_retry_after(headers.get('Retry-After')) or 1 / self.rate)
+                return
+
+            limit = _to_float(headers.get('X-RateLimit-Limit'))
+            remaining = _to_float(headers.get('X-RateLimit-Remaining'))
+            if remaining == 0:
+                self.__slow_down(parse_reset(headers.get('X-RateLimit-Reset')) or 1 / self.rate)
+            elif (headers.get('X-RateLimit-NearLimit', '').lower() == 'true'
+                    or (limit and remaining is not None and remaining < limit * NEAR_LIMIT_RATIO)):
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+            elif response.status_code < 400:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def __slow_down(self, delay):
+        """
+        Lower the rate and block every caller for a while.
+
+        Args:
+            delay (float): The number of seconds to block the callers for.
+        """
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+    A transport adapter pacing its requests with a RateLimiter.
+
+    A 429 response is retried, after the wait the limiter derives from it, up to
+    `max_throttle_retries` times. If it is still throttled, the 429 response is
+    returned, so the client raises it as an HTTP error instead of returning an
+    empty count.
+
+    Attributes:
+        rate_limiter (RateLimiter): The limiter shared by the session's requests.
+        max_throttle_retries (int): The number of retries of a throttled request.
+    """
+
+    def __init__(self, rate_limiter, max_throttle_retries=5, **kwargs):
+        """
+        Initialize RateLimitedAdapter.
+
+        Args:
+            rate_limiter (RateLimiter): The limiter shared by the session's requests.
+            max_throttle_retries (int, optional): The number of retries of a throttled request.
+            **kwargs: The HTTPAdapter arguments, e.g. the pool size and retries.
+        """
+        super().__init__(**kwargs)
+        self.rate_limiter = rate_limiter
+        self.max_throttle_retries = max_throttle_retries
+
+    def send(self, request, **kwargs):
+        for attempt in range(self.max_throttle_retries + 1):
+            self.rate_limiter.acquire()
+            response = super().send(request, **kwargs)
+            self.rate_limiter.update(response)
+            if response.status_code != 429 or attempt == self.max_throttle_retries:
+                # Reported by the run instrumentation with the urllib3 retries
+                response.throttle_retries = attempt
+                return response
+            response.close()
+        return response
+
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header, given in seconds or as an HTTP date.
+
+    Args:
+        value (str): The header value.
+
+    Returns:
+        float: The number of seconds to wait, or None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+    seconds = _to_float(value)
+    if seconds is not None:
+        return max(0.0, seconds)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def parse_reset(value):
+    """
+    Parse a X-RateLimit-Reset header, given as an ISO 8601 timestamp or in epoch seconds.
+
+    Args:
+        value (str): The header value.
+
+    Returns:
+        float: The number of seconds until the reset, or None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+    epoch = _to_float(value)
+    if epoch is not None:
+        return max(0.0, epoch - time.time())
+    try:
+        reset_at = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if reset_at.tzinfo is None:
+        reset_at = reset_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (reset_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def _to_float(value):
+    """
+    Convert a header value to a number, or None if it is not one.
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
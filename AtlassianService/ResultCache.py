@@ -0,0 +1,219 @@
+"""
+result_cache
+
+Remembers the results of the Jira queries, within a run and across runs.
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+# Version of the SQLite schema; files with an older version are rebuilt
+SCHEMA_VERSION = 1
+
+# Quoted strings, kept as they are, or runs of whitespace, collapsed when normalizing JQL
+JQL_TOKEN = re.compile(r'("(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\')|\s+')
+
+
+class ResultCache:
+    """
+    A class for caching the results of the Jira queries in front of the Jira client.
+
+    Results are keyed by the kind of query, the normalized JQL, the requested
+    fields and the current month in the Jira user's time zone, as the queries
+    use relative dates such as startOfMonth(). A bounded in-memory LRU layer
+    serves the queries repeated within a run, e.g. when the tables are generated
+    for several audiences. An optional SQLite layer keeps the results for
+    `max_age` across runs, e.g. to rerun only a publish that failed, and evicts
+    the least recently used results beyond `max_size` bytes. Failed queries are
+    never cached.
+
+    Attributes:
+        time_zone (tzinfo): The time zone of the Jira user, used for the month.
+        memory_entries (int): The number of results kept in memory, 0 for none.
+        path (str): The path of the SQLite file, or None to cache within the run only.
+        max_age (float): How many seconds the SQLite results are reused for.
+        max_size (int): The maximum size of the SQLite results, in bytes.
+        hits (int): The results served from memory.
+        disk_hits (int): The results served from the SQLite file.
+        misses (int): The results that had to be queried.
+        evictions (int): The results evicted from the SQLite file for its size.
+    """
+
+    def __init__(self, time_zone, memory_entries=1024, path=None, max_age_minutes=60, max_size_mb=100):
+        """
+        Initialize ResultCache. The SQLite file is opened when it is first used.
+
+        Args:
+            time_zone (tzinfo): The time zone of the Jira user.
+            memory_entries (int, optional): The number of results kept in memory.
+            path (str, optional): The path of the SQLite file.
+            max_age_minutes (float, optional): How many minutes the SQLite results are reused for.
+            max_size_mb (float, optional): The maximum size of the SQLite results, in MB.
+        """
+        self.time_zone = time_zone
+        self.memory_entries = memory_entries
+        self.path = path
+        self.max_age = max_age_minutes * 60
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def get(self, kind, jql_query, fields):
+        """
+        Look a query result up, in memory and then in the SQLite file.
+
+        Args:
+            kind (str): The kind of query, e.g. 'count' or 'search'.
+            jql_query (str): The JQL query.
+            fields (list): The requested fields.
+
+        Returns:
+            tuple: Whether the result was found, and the result.
+        """
+        key = self.__key(kind, jql_query, fields)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return True, self._memory[key]
+            connection = self.__connect()
+            if connection is not None:
+                row = connection.execute(
+                    'SELECT result FROM results WHERE key = ? AND stored >= ?',
+                    (key, time.time() - self.max_age)).fetchone()
+                if row is not None:
+                    with connection:
+                        connection.execute('UPDATE results SET used = ? WHERE key = ?', (time.time(), key))
+                    result = json.loads(row[0])
+                    self.__remember(key, result)
+                    self.disk_hits += 1
+                    return True, result
+            self.misses += 1
+            return False, None
+
+    def put(self, kind, jql_query, fields, result):
+        """
+        Cache a query result, evicting the oldest results beyond the cache limits.
+
+        Args:
+            kind (str): The kind of query.
+            jql_query (str): The JQL query.
+            fields (list): The requested fields.
+            result (Any): The JSON-serializable result.
+        """
+        key = self.__key(kind, jql_query, fields)
+        with self._lock:
+            self.__remember(key, result)
+            connection = self.__connect()
+            if connection is None:
+                return
+            value = json.dumps(result, separators=(',', ':'))
+            now = time.time()
+            with connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO results (key, result, size, stored, used) VALUES (?, ?, ?, ?, ?)',
+                    (key, value, len(value), now, now))
+                self.__evict(connection)
+
+    def stats(self):
+        """
+        The hit and miss counters of the run.
+
+        Returns:
+            dict: The memory hits, disk hits, misses and evictions.
+        """
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses, 'evictions': self.evictions}
+
+    def close(self):
+        """
+        Close the SQLite file, if it was opened.
+        """
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def __key(self, kind, jql_query, fields):
+        """
+        The cache key of a query in the current month.
+
+        Returns:
+            str: A digest of the kind, normalized JQL, fields and month. The fields are
+            sorted, except for projected results, whose values follow their order.
+        """
+        month = datetime.now(self.time_zone).strftime('%Y-%m')
+        fields = list(fields or []) if kind.startswith('projected') else sorted(fields or [])
+        key = json.dumps([kind, normalize_jql(jql_query), fields, month])
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def __remember(self, key, result):
+        """
+        Keep a result in memory, dropping the least recently used beyond `memory_entries`.
+        """
+        if self.memory_entries <= 0:
+            return
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def __connect(self):
+        """
+        Open the SQLite file on first use, creating its table and dropping the expired results.
+
+        Returns:
+            sqlite3.Connection: The connection, or None without a SQLite file.
+        """
+        if not self.path:
+            return None
+        if self._connection is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            with self._connection:
+                if self._connection.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+                    self._connection.execute('DROP TABLE IF EXISTS results')
+                    self._connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+                self._connection.execute(
+                    'CREATE TABLE IF NOT EXISTS results ('
+                    'key TEXT PRIMARY KEY, result TEXT, size INTEGER, stored REAL, used REAL)')
+                self._connection.execute('DELETE FROM results WHERE stored < ?', (time.time() - self.max_age,))
+        return self._connection
+
+    def __evict(self, connection):
+        """
+        Delete the least recently used results until the file's results fit in `max_size`.
+        """
+        total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+        if total <= self.max_size:
+            return
+        for key, size in connection.execute('SELECT key, size FROM results ORDER BY used').fetchall():
+            connection.execute('DELETE FROM results WHERE key = ?', (key,))
+            self.evictions += 1
+            total -= size
+            if total <= self.max_size:
+                break
+
+
+def normalize_jql(jql_query):
+    """
+    Normalize a JQL query for the cache key, collapsing the whitespace outside quoted strings.
+
+    Args:
+        jql_query (str): The JQL query.
+
+    Returns:
+        str: The normalized query.
+    """
+    return JQL_TOKEN.sub(lambda match: match.group(1) or ' ', jql_query).strip()
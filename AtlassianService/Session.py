@@ -0,0 +1,75 @@
+"""
+session
+
+Creates the HTTP session shared by the Jira and Confluence clients.
+"""
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from AtlassianService.RateLimiter import RateLimitedAdapter
+
+# Transient server errors worth retrying
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+
+class RateLimitedRetry(Retry):
+    """
+    Retry settings leaving 429 Too Many Requests responses to the rate limiter, so
+    that a throttled request slows down every caller instead of only its own thread.
+    """
+    RETRY_AFTER_STATUS_CODES = frozenset({413, 503})
+
+
+def create_session(pool_size=10, max_retries=3, backoff_factor=0.5, backoff_jitter=0.5,
+                   rate_limiter=None, max_throttle_retries=5):
+    """
+    Create a connection-pooled HTTP session with retries for idempotent requests.
+
+    The session keeps its connections alive, so the Jira and Confluence clients
+    built on it reuse the same TCP/TLS connections instead of opening their own.
+    Connection errors, read timeouts and transient 5xx responses of idempotent
+    requests (GET, HEAD, PUT, DELETE, ...) are retried with exponential backoff
+    and random jitter, honouring any Retry-After header. Searches are sent as
+    GET requests, so they are retried too; page creation (POST) is not.
+
+    With a rate limiter, every request of the session is paced by it, and 429
+    Too Many Requests responses are retried once the limiter allows it.
+
+    Args:
+        pool_size (int, optional): The number of connections kept per host. It should
+            be at least the number of concurrent requests.
+        max_retries (int, optional): The number of retries of a failed request.
+        backoff_factor (float, optional): The base of the exponential backoff, in seconds:
+            the retries wait about factor * 2 ** (retry - 1).
+        backoff_jitter (float, optional): The maximum random delay added to each backoff,
+            in seconds, so that concurrent retries do not hit the server together.
+        rate_limiter (RateLimiter, optional): The limiter pacing the requests.
+        max_throttle_retries (int, optional): The number of retries of a 429 response.
+
+    Returns:
+        requests.Session: The session.
+    """
+    retry_class = Retry if rate_limiter is None else RateLimitedRetry
+    retry = retry_class(
+        total=max_retries,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        backoff_factor=backoff_factor,
+        backoff_jitter=backoff_jitter,
+        respect_retry_after_header=True,
+        raise_on_status=False)
+    if rate_limiter is None:
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    else:
+        adapter = RateLimitedAdapter(
+            rate_limiter,
+            max_throttle_retries,
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=retry)
+
+    session = requests.Session()
+    session.headers['Connection'] = 'keep-alive'
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
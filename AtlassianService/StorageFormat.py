@@ -0,0 +1,132 @@
+"""
+storage_format
+
+Renders the report tables as Confluence storage-format XHTML.
+"""
+import io
+import math
+from html import escape
+
+# Text of the info banner, around the link to the page describing the data gathering
+BANNER_TEXT = ('If you wanted to learn more about the data gathering process for each table, '
+               'you could check this page {link}.')
+
+
+class StorageRenderer:
+    """
+    A class for streaming the storage-format body of a report page into one buffer.
+
+    The tables are written cell by cell from their labels and counts, as native
+    Confluence tables with header cells, instead of concatenating the output of
+    `DataFrame.to_html`. Cells that could not be collected (NaN) are left empty.
+
+    Attributes:
+        buffer (io.StringIO): The body written so far.
+    """
+
+    def __init__(self):
+        """
+        Initialize StorageRenderer with an empty body.
+        """
+        self.buffer = io.StringIO()
+
+    def info_banner(self, page_title):
+        """
+        Write an info macro linking to a Confluence page.
+
+        Args:
+            page_title (str): The title of the linked page, in the same space.
+        """
+        title = escape(page_title)
+        link = (f'<ac:link ac:card-appearance="inline"><ri:page ri:content-title="{title}" />'
+                f'<ac:link-body>{title}</ac:link-body></ac:link>')
+        write = self.buffer.write
+        write('<ac:structured-macro ac:name="info" ac:schema-version="1"><ac:rich-text-body><p>')
+        write(BANNER_TEXT.format(link=link))
+        write('</p></ac:rich-text-body></ac:structured-macro>')
+
+    def note(self, text):
+        """
+        Write a note macro.
+
+        Args:
+            text (str): The text of the note.
+        """
+        self.buffer.write('<ac:structured-macro ac:name="note" ac:schema-version="1"><ac:rich-text-body><p>')
+        self.buffer.write(escape(text))
+        self.buffer.write('</p></ac:rich-text-body></ac:structured-macro>')
+
+    def heading(self, text, level=2):
+        """
+        Write a heading.
+
+        Args:
+            text (str): The heading.
+            level (int, optional): The heading level.
+        """
+        self.buffer.write(f'<h{level}>{escape(str(text))}</h{level}>')
+
+    def table(self, table):
+        """
+        Write a table with a header row of column labels and a header cell of row labels.
+
+        Args:
+            table (pandas.DataFrame): The counts, e.g. from `CountTable.to_frame`.
+        """
+        write = self.buffer.write
+        write('<table data-layout="default"><tbody><tr><th></th>')
+        for column in table.columns:
+            write(f'<th><p>{escape(str(column))}</p></th>')
+        write('</tr>')
+        for row, values in zip(table.index, table.to_numpy().tolist()):
+            write(f'<tr><th><p>{escape(str(row))}</p></th>')
+            write(''.join(f'<td><p>{_format_count(value)}</p></td>' for value in values))
+            write('</tr>')
+        write('</tbody></table>')
+
+    def getvalue(self):
+        """
+        Return the body written so far.
+
+        Returns:
+            str: The storage-format XHTML.
+        """
+        return self.buffer.getvalue()
+
+
+def render_page(tables, headings, banner_page=None, note=None):
+    """
+    Render the body of a report page: an optional info banner and note, then each table under its heading.
+
+    Args:
+        tables (dict): The DataFrame of each table, keyed by table name, in page order.
+        headings (dict): The heading of each table, keyed by table name. Tables
+            without a heading are shown under their name.
+        banner_page (str, optional): The title of the page the info banner links to,
+            or None for no banner.
+        note (str, optional): The text of a note shown above the tables, or None for no note.
+
+    Returns:
+        str: The storage-format XHTML of the page.
+    """
+    renderer = StorageRenderer()
+    if banner_page:
+        renderer.info_banner(banner_page)
+    if note:
+        renderer.note(note)
+    for name, table in tables.items():
+        renderer.heading(headings.get(name, name))
+        renderer.table(table)
+    return renderer.getvalue()
+
+
+def _format_count(value):
+    """
+    Format a count for a table cell, leaving the counts that could not be collected empty.
+    """
+    if isinstance(value, float):
+        if math.isnan(value):
+            return ''
+        if value.is_integer():
+            return str(int(value))
+    return escape(str(value))
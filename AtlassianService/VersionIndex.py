@@ -0,0 +1,134 @@
+"""
+version_index
+
+Keeps the released fix versions of each project, so the queries name them instead of calling releasedVersions().
+"""
+import os
+import json
+from datetime import datetime, timedelta, timezone
+
+
+class VersionIndex:
+    """
+    A class for indexing the released fix versions of each project with their release dates.
+
+    The versions of a project are fetched with one request (see
+    `JiraClient.get_project_versions`) and kept for `max_age`, in memory and in
+    an optional JSON file, so a run fetches them at most once per project. The
+    queries then name the released versions by id, e.g. `fixversion in (10100,
+    10101)`, which Jira matches without evaluating releasedVersions() for every
+    query, and the release dates order the per-version breakdowns.
+
+    Attributes:
+        path (str): The path of the JSON file the index is kept in, or None to keep
+            it for the current run only.
+        max_age (timedelta): How long the versions of a project are trusted.
+        projects (dict): The 'fetched' time and released 'versions' of each project,
+            keyed by project key. Each version is a dict of its 'id', 'name' and
+            'releaseDate', None if unknown, in release date order.
+    """
+
+    def __init__(self, path=None, max_age_minutes=60):
+        """
+        Initialize VersionIndex and load the index of the previous runs.
+
+        Args:
+            path (str, optional): The path of the JSON file the index is kept in.
+            max_age_minutes (int, optional): How many minutes the versions of a project are trusted.
+        """
+        self.path = path
+        self.max_age = timedelta(minutes=max_age_minutes)
+        self.projects = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.projects = json.load(f).get('projects') or {}
+            except (OSError, ValueError, AttributeError) as error:
+                print(f"Ignoring the unreadable version index {path}: {error}")
+
+    def stale(self, project_keys):
+        """
+        The projects whose versions are not indexed or older than the maximum age.
+
+        Args:
+            project_keys (iterable): The project keys.
+
+        Returns:
+            list: The keys of the projects whose versions must be fetched.
+        """
+        return [key for key in project_keys if key not in self.projects or self.__expired(self.projects[key])]
+
+    def update(self, project_key, versions):
+        """
+        Index the released versions of a project.
+
+        Args:
+            project_key (str): The project key.
+            versions (list): Every version of the project, as returned by Jira, or None
+                to forget the project's versions when they could not be fetched.
+        """
+        if versions is None:
+            self.projects.pop(project_key, None)
+            return
+        released = [
+            {'id': str(version['id']), 'name': version['name'], 'releaseDate': version.get('releaseDate')}
+            for version in versions if version.get('released')
+        ]
+        released.sort(key=lambda version: version['releaseDate'] or '')
+        self.projects[project_key] = {'fetched': datetime.now(timezone.utc).isoformat(), 'versions': released}
+
+    def released_ids(self, project_keys):
+        """
+        The ids of the released versions of one or several projects.
+
+        Args:
+            project_keys (str or list): A project key, or a list of project keys.
+
+        Returns:
+            list: The version ids, or None if the versions of a project are not indexed.
+        """
+        if isinstance(project_keys, str):
+            project_keys = [project_keys]
+        if any(key not in self.projects for key in project_keys):
+            return None
+        return [version['id'] for key in project_keys for version in self.projects[key]['versions']]
+
+    def released_names(self, project_keys, since=None):
+        """
+        The names of the released versions of the projects, in release date order.
+
+        Versions of the same name in several projects are named once.
+
+        Args:
+            project_keys (iterable): The project keys.
+            since (str, optional): The first release date, as 'YYYY-MM-DD'; the versions
+                released before it, or without a release date, are left out.
+
+        Returns:
+            list: The version names.
+        """
+        versions = [
+            version for key in project_keys for version in self.projects.get(key, {}).get('versions', [])
+            if since is None or (version['releaseDate'] or '') >= since
+        ]
+        versions.sort(key=lambda version: version['releaseDate'] or '')
+        return list(dict.fromkeys(version['name'] for version in versions))
+
+    def save(self):
+        """
+        Write the index to the JSON file, if any.
+        """
+        if not self.path:
+            return
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temporary_path = f'{self.path}.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            json.dump({'projects': self.projects}, f)
+        os.replace(temporary_path, self.path)
+
+    def __expired(self, entry):
+        """
+        Whether the versions of a project are older than the maximum age.
+        """
+        return datetime.now(timezone.utc) - datetime.fromisoformat(entry['fetched']) > self.max_age
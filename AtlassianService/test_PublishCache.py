@@ -0,0 +1,85 @@
+"""
+test_publish_cache
+
+Unit tests of the page index of the publish cache, and of the writes it lets the client skip.
+"""
+import pandas as pd
+from AtlassianService.PublishCache import PublishCache, body_hash
+from AtlassianService.ConfluenceService import ConfluenceClient, month_page_title
+
+
+class RecordingConfluence:
+    """
+    A stand-in for the atlassian Confluence client, recording the requests and serving one space.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.versions = {}
+
+    def get(self, path, params=None):
+        self.requests.append(('GET', path))
+        return {'results': []}
+
+    def post(self, path, data=None):
+        self.requests.append(('POST', path))
+        self.versions['1000'] = 1
+        return {'id': '1000', 'version': {'number': 1}}
+
+    def put(self, path, data=None):
+        self.requests.append(('PUT', path))
+        page_id = path.rsplit('/', 1)[-1]
+        self.versions[page_id] = data['version']['number']
+        return {'id': page_id, 'version': {'number': self.versions[page_id]}}
+
+
+def client(publish_cache):
+    """
+    A ConfluenceClient sending its requests to a RecordingConfluence.
+    """
+    confluence_client = ConfluenceClient('http://confluence.invalid', 'user', 'token', publish_cache=publish_cache)
+    confluence_client.confluence = RecordingConfluence()
+    return confluence_client
+
+
+def test_body_hash_covers_the_title_and_the_body():
+    assert body_hash('2024 - May', '<p>1</p>') == body_hash('2024 - May', '<p>1</p>')
+    assert body_hash('2024 - May', '<p>1</p>') != body_hash('2024 - June', '<p>1</p>')
+    assert body_hash('2024 - May', '<p>1</p>') != body_hash('2024 - May', '<p>2</p>')
+
+
+def test_the_index_is_kept_across_runs(tmp_path):
+    path = str(tmp_path / 'pages.json')
+    PublishCache(path).record('ART', 'Title', 1000, 3, 'abc')
+    cache = PublishCache(path)
+    assert cache.find('ART', 'Title') == {'id': '1000', 'version': 3, 'hash': 'abc'}
+    cache.forget('ART', 'Title')
+    assert PublishCache(path).find('ART', 'Title') is None
+
+
+def test_an_unreadable_index_is_ignored(tmp_path):
+    path = tmp_path / 'pages.json'
+    path.write_text('{not json')
+    assert PublishCache(str(path)).pages == {}
+
+
+def test_an_unchanged_body_is_not_written_again(tmp_path):
+    cache = PublishCache(str(tmp_path / 'pages.json'))
+    tables = {'Release Type': pd.DataFrame([[1]], index=['AAA'], columns=['Major'])}
+
+    first = client(cache)
+    assert first.post_confluence_page('1', 'ART', tables, 2024, 5) is not None
+    assert first.confluence.requests == [('GET', 'rest/api/content'), ('POST', 'rest/api/content')]
+
+    unchanged = client(PublishCache(str(tmp_path / 'pages.json')))
+    page = unchanged.post_confluence_page('1', 'ART', tables, 2024, 5)
+    assert page['id'] == '1000' and page['version'] == 1
+    assert unchanged.confluence.requests == []
+
+    changed = client(PublishCache(str(tmp_path / 'pages.json')))
+    changed.confluence.versions['1000'] = 1
+    tables = {'Release Type': pd.DataFrame([[2]], index=['AAA'], columns=['Major'])}
+    page = changed.post_confluence_page('1', 'ART', tables, 2024, 5)
+    assert changed.confluence.requests == [('PUT', 'rest/api/content/1000')]
+    assert page['version'] == 2
+    assert PublishCache(str(tmp_path / 'pages.json')).find('ART', month_page_title(2024, 5))['version'] == 2
@@ -0,0 +1,87 @@
+"""
+test_rate_limiter
+
+Unit tests of the pacing and adaptation of the rate limiter.
+"""
+import time
+from types import SimpleNamespace
+import pytest
+from AtlassianService.RateLimiter import RateLimiter, parse_retry_after, parse_reset
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    A monotonic clock that only moves when the test advances it.
+    """
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(time, 'monotonic', lambda: now.value)
+    return now
+
+
+def response(status_code=200, **headers):
+    """
+    A response stub with the given status and headers, named with underscores for dashes.
+    """
+    headers = {name.replace('_', '-'): value for name, value in headers.items()}
+    return SimpleNamespace(status_code=status_code, headers=headers)
+
+
+def test_a_burst_is_sent_at_once_then_requests_are_paced(clock):
+    limiter = RateLimiter(rate=10, burst=3)
+    clock.value += 10
+    waits = [limiter.reserve() for _ in range(5)]
+    assert waits == pytest.approx([0, 0, 0, 0.1, 0.2])
+    assert limiter.throttled_seconds == pytest.approx(0.3)
+
+
+def test_the_bucket_refills_while_idle(clock):
+    limiter = RateLimiter(rate=10, burst=2)
+    clock.value += 10
+    assert [limiter.reserve() for _ in range(3)] == pytest.approx([0, 0, 0.1])
+    clock.value += 1
+    assert [limiter.reserve() for _ in range(3)] == pytest.approx([0, 0, 0.1])
+
+
+def test_successful_responses_increase_the_rate_up_to_the_maximum():
+    limiter = RateLimiter(rate=10, max_rate=11, increase=0.5)
+    limiter.update(response())
+    assert limiter.rate == 10.5
+    limiter.update(response())
+    limiter.update(response())
+    assert limiter.rate == 11
+
+
+def test_near_limit_responses_decrease_the_rate_down_to_the_minimum():
+    limiter = RateLimiter(rate=4, min_rate=1.5, decrease=0.5)
+    limiter.update(response(X_RateLimit_Limit='100', X_RateLimit_Remaining='5'))
+    assert limiter.rate == 2
+    limiter.update(response(X_RateLimit_NearLimit='true'))
+    assert limiter.rate == 1.5
+
+
+def test_a_429_blocks_every_caller_until_retry_after(clock):
+    limiter = RateLimiter(rate=10, burst=5, decrease=0.5)
+    clock.value += 10
+    limiter.update(response(429, Retry_After='2'))
+    assert limiter.throttled_responses == 1
+    assert limiter.rate == 5
+    assert limiter.reserve() == pytest.approx(2)
+
+
+def test_an_exhausted_limit_blocks_until_the_reset(clock, monkeypatch):
+    monkeypatch.setattr(time, 'time', lambda: 5000.0)
+    limiter = RateLimiter(rate=10, burst=5)
+    clock.value += 10
+    limiter.update(response(X_RateLimit_Remaining='0', X_RateLimit_Reset='5003'))
+    assert limiter.reserve() == pytest.approx(3)
+
+
+def test_parse_retry_after_and_reset():
+    assert parse_retry_after('1.5') == 1.5
+    assert parse_retry_after('-3') == 0
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after(None) is None
+    assert parse_reset('2015-10-21T07:28:00Z') == 0
+    assert parse_reset('later') is None
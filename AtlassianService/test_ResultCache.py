@@ -0,0 +1,72 @@
+"""
+test_result_cache
+
+Unit tests of the Jira query result cache, in memory and in its SQLite file.
+"""
+import time
+import pytz
+from AtlassianService.ResultCache import ResultCache, normalize_jql
+
+TIME_ZONE = pytz.timezone('Pacific/Auckland')
+
+
+def test_memory_layer_evicts_the_least_recently_used():
+    cache = ResultCache(TIME_ZONE, memory_entries=2)
+    cache.put('count', 'a', ['key'], 1)
+    cache.put('count', 'b', ['key'], 2)
+    assert cache.get('count', 'a', ['key']) == (True, 1)
+    cache.put('count', 'c', ['key'], 3)
+    assert cache.get('count', 'b', ['key']) == (False, None)
+    assert cache.get('count', 'a', ['key']) == (True, 1)
+    assert cache.get('count', 'c', ['key']) == (True, 3)
+    assert cache.stats() == {'hits': 3, 'disk_hits': 0, 'misses': 1, 'evictions': 0}
+
+
+def test_keys_ignore_whitespace_and_field_order_but_not_the_kind():
+    cache = ResultCache(TIME_ZONE)
+    cache.put('search', 'project = A  AND  status = "In  Progress"', ['b', 'a'], [1])
+    assert cache.get('search', ' project = A AND status = "In  Progress" ', ['a', 'b']) == (True, [1])
+    assert cache.get('search', 'project = A AND status = "In Progress"', ['a', 'b']) == (False, None)
+    assert cache.get('count', 'project = A  AND  status = "In  Progress"', ['b', 'a']) == (False, None)
+
+
+def test_projected_results_keep_their_field_order():
+    cache = ResultCache(TIME_ZONE)
+    cache.put('projected:issue_values', 'project = A', ['a', 'b'], [('x', 'y')])
+    assert cache.get('projected:issue_values', 'project = A', ['b', 'a']) == (False, None)
+    assert cache.get('projected:issue_values', 'project = A', ['a', 'b']) == (True, [('x', 'y')])
+
+
+def test_sqlite_layer_serves_other_runs_until_max_age(tmp_path, monkeypatch):
+    path = str(tmp_path / 'results.sqlite')
+    writer = ResultCache(TIME_ZONE, path=path, max_age_minutes=60)
+    writer.put('search', 'project = A', ['key'], [('A-1',)])
+    writer.close()
+
+    reader = ResultCache(TIME_ZONE, path=path, max_age_minutes=60)
+    assert reader.get('search', 'project = A', ['key']) == (True, [['A-1']])
+    assert reader.stats()['disk_hits'] == 1
+    reader.close()
+
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 61 * 60)
+    expired = ResultCache(TIME_ZONE, path=path, max_age_minutes=60)
+    assert expired.get('search', 'project = A', ['key']) == (False, None)
+    expired.close()
+
+
+def test_sqlite_layer_evicts_the_least_recently_used_beyond_max_size(tmp_path):
+    cache = ResultCache(TIME_ZONE, memory_entries=0, path=str(tmp_path / 'results.sqlite'), max_size_mb=0.001)
+    cache.put('search', 'a', ['key'], 'x' * 400)
+    cache.put('search', 'b', ['key'], 'y' * 400)
+    assert cache.get('search', 'a', ['key'])[0]
+    cache.put('search', 'c', ['key'], 'z' * 400)
+    assert cache.stats()['evictions'] == 1
+    assert cache.get('search', 'b', ['key']) == (False, None)
+    assert cache.get('search', 'a', ['key'])[0]
+    assert cache.get('search', 'c', ['key'])[0]
+    cache.close()
+
+
+def test_normalize_jql_keeps_quoted_strings():
+    assert normalize_jql('  a =  "x   y"\n AND b = \'p  q\' ') == 'a = "x   y" AND b = \'p  q\''
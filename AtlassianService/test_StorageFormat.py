@@ -0,0 +1,41 @@
+"""
+test_storage_format
+
+Unit tests of the storage-format rendering of the report pages.
+"""
+import numpy as np
+import pandas as pd
+from AtlassianService.StorageFormat import StorageRenderer, render_page
+
+
+def test_table_labels_are_escaped():
+    renderer = StorageRenderer()
+    renderer.table(pd.DataFrame([[1]], index=['R&D <core>'], columns=['"Major" & more']))
+    body = renderer.getvalue()
+    assert '<th><p>R&amp;D &lt;core&gt;</p></th>' in body
+    assert '<th><p>&quot;Major&quot; &amp; more</p></th>' in body
+    assert '<core>' not in body
+
+
+def test_counts_are_written_as_integers_and_missing_counts_left_empty():
+    renderer = StorageRenderer()
+    renderer.table(pd.DataFrame([[3.0, np.nan, 7]], index=['AAA'], columns=['Major', 'Minor', 'Total']))
+    assert '<td><p>3</p></td><td><p></p></td><td><p>7</p></td>' in renderer.getvalue()
+
+
+def test_headings_notes_and_banner_titles_are_escaped():
+    body = render_page(
+        {'Release Type': pd.DataFrame([[1]], index=['AAA'], columns=['Major'])},
+        {'Release Type': 'Releases <by type>'},
+        banner_page='Data & "Gathering"',
+        note='Counts < 5 are approximate')
+    assert '<h2>Releases &lt;by type&gt;</h2>' in body
+    assert 'Counts &lt; 5 are approximate' in body
+    assert 'ri:content-title="Data &amp; &quot;Gathering&quot;"' in body
+
+
+def test_page_order_and_default_headings():
+    table = pd.DataFrame([[1]], index=['AAA'], columns=['Major'])
+    body = render_page({'Second': table, 'First': table}, {'First': 'First table'})
+    assert body.index('<h2>Second</h2>') < body.index('<h2>First table</h2>')
+    assert 'ac:name="info"' not in body and 'ac:name="note"' not in body
@@ -0,0 +1,201 @@
+"""
+benchmark
+
+Times the report generation and the Confluence post end to end against a local fake server.
+
+Run from the repository root, e.g.:
+    python -m Benchmark.Benchmark --projects 5 20 --issues 100 1000 --latency 0.02
+"""
+import argparse
+import contextlib
+import copy
+import io
+import json
+import os
+import statistics
+import tempfile
+import time
+import yaml
+import pytz
+from MetricsEngine import MetricsEngine
+from Benchmark.FakeAtlassianServer import FakeAtlassianServer, generate_issues
+
+# Environment variables holding the fake credentials
+USERNAME_VARIABLE = 'BENCHMARK_ATLASSIAN_USER'
+PASSWORD_VARIABLE = 'BENCHMARK_ATLASSIAN_TOKEN'
+
+
+def benchmark_config(base_config, server, project_count, mode, store_path, probe_path=None,
+                     publish_cache_path=None, checkpoint_path=None):
+    """
+    Derive the config of a benchmark run from the project config.
+
+    Every file of the run is kept under the given paths, and the run report and
+    the Prometheus textfile are not written, so a benchmark neither overwrites
+    the files of the project's runs nor plans from them.
+
+    Args:
+        base_config (dict): The project config.
+        server (FakeAtlassianServer): The fake server of the run.
+        project_count (int): The number of synthetic projects.
+        mode (str): The collection mode.
+        store_path (str): The path of the issue store of the run.
+        probe_path (str, optional): The path of the change probe file, or None to
+            query every project on every run.
+        publish_cache_path (str, optional): The path of the publish cache, or None to
+            update the page on every run.
+        checkpoint_path (str, optional): The path of the checkpoint, or None to run
+            without one.
+
+    Returns:
+        dict: The config.
+    """
+    config = copy.deepcopy(base_config)
+    config['ProjectKeys'] = {project_key(index): f'Project {index}' for index in range(project_count)}
+    config['Collection']['Mode'] = mode
+    config['Store']['Path'] = store_path
+    config['ChangeProbe']['Path'] = probe_path
+    config['Publish']['Cache_Path'] = publish_cache_path
+    config['Checkpoint']['Path'] = checkpoint_path
+    config['Instrumentation']['Report_Path'] = None
+    config['Instrumentation']['Prometheus_Path'] = None
+    config['ResultCache']['Path'] = None
+    config['Versions']['Path'] = None
+    config['AtlassianVariables'].update({
+        'Url': server.url,
+        'Username': USERNAME_VARIABLE,
+        'Password': PASSWORD_VARIABLE
+    })
+    return config
+
+
+def project_key(index):
+    """
+    The key of a synthetic project.
+
+    Args:
+        index (int): The index of the project.
+
+    Returns:
+        str: The project key.
+    """
+    return f'BENCH{index:03d}'
+
+
+def run_scenario(base_config, mode, project_count, issues_per_project, latency, repeat, verbose=False,
+                 probe=False):
+    """
+    Time the table generation and the Confluence post of one scenario.
+
+    Each repetition runs a fresh MetricsEngine on the same fake server, so the first post
+    creates the monthly page and the next ones update it. With the change probe
+    and the publish cache, the repetitions after the first find the data and the
+    page unchanged.
+
+    Args:
+        base_config (dict): The project config.
+        mode (str): The collection mode.
+        project_count (int): The number of synthetic projects.
+        issues_per_project (int): The number of synthetic issues of each project.
+        latency (float): The number of seconds every request is delayed by.
+        repeat (int): The number of repetitions.
+        verbose (bool, optional): Show the output of the runs.
+        probe (bool, optional): Enable the change probe and the publish cache.
+
+    Returns:
+        dict: The median timings, in seconds, and the requests of one repetition.
+    """
+    time_zone = pytz.timezone(base_config['Collection']['Time_Zone'])
+    issues = generate_issues(
+        [project_key(index) for index in range(project_count)],
+        issues_per_project,
+        base_config['IssueFields'],
+        time_zone)
+    generate_times, post_times, errors = [], [], []
+    with FakeAtlassianServer(issues, base_config['IssueFields'], time_zone, latency) as server, \
+            tempfile.TemporaryDirectory() as directory:
+        config = benchmark_config(
+            base_config, server, project_count, mode, os.path.join(directory, 'issues.sqlite'),
+            os.path.join(directory, 'change_probe.json') if probe else None,
+            os.path.join(directory, 'published_pages.json') if probe else None,
+            os.path.join(directory, 'checkpoint.jsonl'))
+        for _ in range(repeat):
+            server.requests.clear()
+            output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+            with output:
+                engine = MetricsEngine(config)
+                start = time.perf_counter()
+                content = engine.generate_tables()
+                generate_times.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                try:
+                    engine.post_to_confluence(content)
+                except Exception as error:  # report the failure and keep benchmarking
+                    errors.append(f'{type(error).__name__}: {error}')
+                post_times.append(time.perf_counter() - start)
+
+    return {
+        'mode': mode,
+        'projects': project_count,
+        'issues_per_project': issues_per_project,
+        'issues': len(issues),
+        'generate_seconds': statistics.median(generate_times),
+        'post_seconds': statistics.median(post_times),
+        'jira_requests': sum(
+            count for (_, endpoint), count in server.requests.items() if endpoint in ('search', 'search/jql', 'project/versions')),
+        'confluence_requests': sum(
+            count for (_, endpoint), count in server.requests.items() if endpoint.startswith('content')),
+        'errors': sorted(set(errors))
+    }
+
+
+def print_results(results):
+    """
+    Print the benchmark results as a table.
+
+    Args:
+        results (list): The result of each scenario.
+    """
+    print(f"{'mode':<10}{'projects':>9}{'issues':>9}{'generate s':>12}{'post s':>9}"
+          f"{'jira req':>10}{'conf req':>10}")
+    for result in results:
+        print(f"{result['mode']:<10}{result['projects']:>9}{result['issues']:>9}"
+              f"{result['generate_seconds']:>12.3f}{result['post_seconds']:>9.3f}"
+              f"{result['jira_requests']:>10}{result['confluence_requests']:>10}")
+        for error in result['errors']:
+            print(f"  error: {error}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the release metrics against a local fake Atlassian server.')
+    parser.add_argument('--config', default='config.yaml', help='the project config the runs are derived from')
+    parser.add_argument('--modes', nargs='+', default=['count', 'search', 'portfolio', 'store'],
+                        help='the collection modes to benchmark')
+    parser.add_argument('--projects', nargs='+', type=int, default=[5, 20], help='the numbers of projects')
+    parser.add_argument('--issues', nargs='+', type=int, default=[100, 1000],
+                        help='the numbers of issues per project')
+    parser.add_argument('--latency', type=float, default=0.02, help='the delay of every request, in seconds')
+    parser.add_argument('--repeat', type=int, default=3, help='the number of repetitions of each scenario')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--verbose', action='store_true', help='show the output of the runs')
+    parser.add_argument('--probe', action='store_true',
+                        help='enable the change probe and the publish cache, so the repetitions after the first '
+                             'reuse the results and skip the page update')
+    args = parser.parse_args()
+
+    with open(args.config, 'r', encoding='utf-8') as f:
+        project_config = yaml.safe_load(f)
+    os.environ.setdefault(USERNAME_VARIABLE, 'benchmark')
+    os.environ.setdefault(PASSWORD_VARIABLE, 'benchmark')
+
+    benchmark_results = [
+        run_scenario(project_config, mode, project_count, issues_per_project, args.latency, args.repeat, args.verbose,
+                     args.probe)
+        for project_count in args.projects
+        for issues_per_project in args.issues
+        for mode in args.modes
+    ]
+    print_results(benchmark_results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(benchmark_results, f, indent=2)
@@ -0,0 +1,538 @@
+"""
+fake_atlassian_server
+
+A local stand-in for the Jira and Confluence REST endpoints the release metrics use.
+"""
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Maximum number of issues Jira returns per search page
+MAX_RESULTS = 100
+
+# Maximum number of issues Jira returns per search page of keys or ids only
+MAX_KEY_RESULTS = 5000
+
+# Jira timestamp format of the synthetic issues
+JIRA_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.000%z'
+
+
+class FakeAtlassianServer:
+    """
+    A class for a local HTTP server answering like Jira and Confluence.
+
+    It serves the token-paginated Jira search endpoint, answering the retired
+    /rest/api/2/search with 410 Gone, and the approximate count endpoint, over
+    the subset of JQL the metrics queries use (project, releasedVersions() or
+    fix version ids, issuetype, resolved, updated and the Release Type and
+    Release Window dropdowns, optionally ordered by one field), the project
+    versions endpoint, and the Confluence content endpoints to look up (by
+    title or CQL), create and update pages. Every request can be delayed to
+    simulate the latency of the real site, and the requests are counted per
+    endpoint.
+
+    Attributes:
+        issues (list): The synthetic issues, as returned by a search with every field.
+        issue_fields (dict): The Jira field names keyed by 'Issue_Type', 'Release_Type'
+            and 'Release_Window'.
+        time_zone (pytz.BaseTzInfo): The time zone of the Jira user, used for the JQL dates.
+        latency (float): The number of seconds every request is delayed by.
+        pages (dict): The Confluence pages, keyed by page id.
+        requests (collections.Counter): The number of requests, keyed by (method, endpoint).
+    """
+
+    def __init__(self, issues, issue_fields, time_zone, latency=0.0):
+        """
+        Initialize FakeAtlassianServer.
+
+        Args:
+            issues (list): The synthetic issues.
+            issue_fields (dict): The Jira field names for the issue type, release type
+                and release window.
+            time_zone (pytz.BaseTzInfo): The time zone of the Jira user.
+            latency (float, optional): The number of seconds every request is delayed by.
+        """
+        self.issues = issues
+        self.issue_fields = issue_fields
+        self.time_zone = time_zone
+        self.latency = latency
+        self.pages = {}
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _handler(self))
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        """
+        The base URL of the server.
+
+        Returns:
+            str: The URL.
+        """
+        return f'http://127.0.0.1:{self._server.server_port}'
+
+    def start(self):
+        """
+        Start serving requests in a background thread.
+
+        Returns:
+            FakeAtlassianServer: The server.
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop serving requests.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def search(self, params):
+        """
+        Match a Jira search and select one page of it, for the token-paginated
+        search and the approximate count.
+
+        Args:
+            params (dict): The query parameters: 'jql', 'fields', 'startAt' and 'maxResults'.
+
+        Returns:
+            dict: The page, with the 'total' of the matching issues.
+        """
+        jql, _, order_by = params.get('jql', '').partition(' ORDER BY ')
+        matches = match_jql(jql, self.issue_fields, self.time_zone)
+        hits = [issue for issue in self.issues if matches(issue)]
+        if order_by:
+            field, _, direction = order_by.strip().partition(' ')
+            hits.sort(key=lambda issue: issue['fields'].get(field) or '', reverse=direction.upper() == 'DESC')
+        start = int(params.get('startAt', 0))
+        fields = params.get('fields', '*all')
+        limit = min(int(params.get('maxResults', 50)), MAX_KEY_RESULTS if fields in ('key', 'id') else MAX_RESULTS)
+        return {
+            'startAt': start,
+            'maxResults': limit,
+            'total': len(hits),
+            'issues': [_select_fields(issue, fields) for issue in hits[start:start + limit]]
+        }
+
+    def search_tokens(self, params):
+        """
+        Answer a token-paginated Jira search, like the /rest/api/3/search/jql endpoint.
+
+        Args:
+            params (dict): The query parameters: 'jql', 'fields', 'maxResults' and 'nextPageToken'.
+
+        Returns:
+            dict: The search response, with the 'nextPageToken' of the next page unless it is the last one.
+        """
+        page = self.search({**params, 'startAt': params.get('nextPageToken', 0)})
+        end = page['startAt'] + len(page['issues'])
+        response = {'issues': page['issues'], 'isLast': end >= page['total']}
+        if not response['isLast']:
+            response['nextPageToken'] = str(end)
+        return response
+
+    def approximate_count(self, data):
+        """
+        Answer a Jira approximate count, like the /rest/api/3/search/approximate-count endpoint.
+
+        Args:
+            data (dict): The request body, with the 'jql'.
+
+        Returns:
+            dict: The 'count' of the matching issues.
+        """
+        return {'count': self.search({'jql': data.get('jql', ''), 'maxResults': 0})['total']}
+
+    def project_versions(self, project_key):
+        """
+        Answer a Jira project versions lookup, like the /rest/api/2/project/{key}/versions endpoint.
+
+        Args:
+            project_key (str): The project key.
+
+        Returns:
+            list: The fix versions of the project's issues, or None if the project has no issue.
+        """
+        versions = {}
+        for issue in self.issues:
+            if issue['fields']['project']['key'] == project_key:
+                for version in issue['fields']['fixVersions']:
+                    versions[version['id']] = {**version, 'archived': False, 'projectId': project_key}
+        return list(versions.values()) or None
+
+    def find_pages(self, params):
+        """
+        Answer a Confluence content lookup by space and title.
+
+        Args:
+            params (dict): The query parameters: 'spaceKey' and 'title'.
+
+        Returns:
+            dict: The matching pages.
+        """
+        with self._lock:
+            results = [
+                page for page in self.pages.values()
+                if page['space']['key'] == params.get('spaceKey', page['space']['key'])
+                and page['title'] == params.get('title', page['title'])
+            ]
+        return {'results': results, 'start': 0, 'limit': 25, 'size': len(results)}
+
+    def search_pages(self, params):
+        """
+        Answer a Confluence CQL content search by space and titles.
+
+        Args:
+            params (dict): The query parameters: 'cql', e.g.
+                'space = "ART" AND type = page AND title in ("A", "B")', and 'limit'.
+
+        Returns:
+            dict: The matching pages.
+
+        Raises:
+            ValueError: If the query is not a search by space and titles.
+        """
+        match = re.fullmatch(
+            r'space = "([^"]+)" AND type = page AND title in \((.*)\)', params.get('cql', ''))
+        if not match:
+            raise ValueError(f"Unsupported CQL: {params.get('cql')}")
+        space = match.group(1)
+        titles = {
+            title.replace('\\"', '"') for title in re.findall(r'"((?:[^"\\]|\\.)*)"', match.group(2))
+        }
+        with self._lock:
+            results = [
+                page for page in self.pages.values()
+                if page['space']['key'] == space and page['title'] in titles
+            ][:int(params.get('limit', 25))]
+        return {'results': results, 'start': 0, 'limit': len(results), 'size': len(results)}
+
+    def create_page(self, data):
+        """
+        Create a Confluence page.
+
+        Args:
+            data (dict): The page: 'title', 'space', 'body' and optional 'ancestors'.
+
+        Returns:
+            dict: The created page.
+        """
+        with self._lock:
+            page_id = str(max(map(int, self.pages), default=999) + 1)
+            self.pages[page_id] = {
+                'id': page_id,
+                'type': 'page',
+                'title': data['title'],
+                'space': {'key': data['space']['key']},
+                'version': {'number': 1},
+                'ancestors': data.get('ancestors', []),
+                'body': data.get('body', {})
+            }
+            return self.pages[page_id]
+
+    def update_page(self, page_id, data):
+        """
+        Update a Confluence page, bumping its version.
+
+        Args:
+            page_id (str): The id of the page.
+            data (dict): The new 'title', 'body' and 'version' of the page.
+
+        Returns:
+            dict: The updated page, or None if it does not exist.
+
+        Raises:
+            ValueError: If the new version is not the next version of the page.
+        """
+        with self._lock:
+            page = self.pages.get(page_id)
+            if page is None:
+                return None
+            version = data.get('version', {}).get('number')
+            if version is not None and version != page['version']['number'] + 1:
+                raise ValueError(f"Version {version} does not follow version {page['version']['number']}")
+            page['title'] = data.get('title', page['title'])
+            page['body'] = data.get('body', page['body'])
+            page['version'] = {'number': page['version']['number'] + 1}
+            return page
+
+
+def _handler(server):
+    """
+    Build the request handler class of a FakeAtlassianServer.
+
+    Args:
+        server (FakeAtlassianServer): The server answering the requests.
+
+    Returns:
+        type: The BaseHTTPRequestHandler subclass.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            self.__route('GET')
+
+        def do_POST(self):
+            self.__route('POST')
+
+        def do_PUT(self):
+            self.__route('PUT')
+
+        def log_message(self, format, *args):
+            pass
+
+        def __route(self, method):
+            url = urlparse(self.path)
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            length = int(self.headers.get('Content-Length') or 0)
+            data = json.loads(self.rfile.read(length) or b'{}') if length else {}
+            path = url.path.rstrip('/')
+            if server.latency:
+                time.sleep(server.latency)
+
+            page_match = re.fullmatch(r'/rest/api/content/(\d+)', path)
+            versions_match = re.fullmatch(r'/rest/api/(?:2|latest)/project/(\w+)/versions', path)
+            if re.fullmatch(r'/rest/api/(2|3|latest)/search', path):
+                # Retired on Cloud: requests still using it fail the benchmark instead of passing unnoticed
+                endpoint, status, body = 'search', 410, {
+                    'errorMessages': ['The requested API has been removed. Please use /rest/api/3/search/jql']}
+            elif path == '/rest/api/3/search/jql' and method == 'GET':
+                try:
+                    endpoint, status, body = 'search/jql', 200, server.search_tokens(params)
+                except ValueError as error:
+                    endpoint, status, body = 'search/jql', 400, {'errorMessages': [str(error)]}
+            elif path == '/rest/api/3/search/approximate-count' and method == 'POST':
+                try:
+                    endpoint, status, body = 'search/approximate-count', 200, server.approximate_count(data)
+                except ValueError as error:
+                    endpoint, status, body = 'search/approximate-count', 400, {'errorMessages': [str(error)]}
+            elif versions_match and method == 'GET':
+                endpoint, body = 'project/versions', server.project_versions(versions_match.group(1))
+                status = 200 if body else 404
+            elif path == '/rest/api/content' and method == 'GET':
+                endpoint, status, body = 'content', 200, server.find_pages(params)
+            elif path == '/rest/api/content/search' and method == 'GET':
+                try:
+                    endpoint, status, body = 'content/search', 200, server.search_pages(params)
+                except ValueError as error:
+                    endpoint, status, body = 'content/search', 400, {'message': str(error)}
+            elif path == '/rest/api/content' and method == 'POST':
+                endpoint, status, body = 'content', 200, server.create_page(data)
+            elif page_match and method == 'GET':
+                endpoint, body = 'content/{id}', server.pages.get(page_match.group(1))
+                status = 200 if body else 404
+            elif page_match and method == 'PUT':
+                try:
+                    endpoint, body = 'content/{id}', server.update_page(page_match.group(1), data)
+                    status = 200 if body else 404
+                except ValueError as error:
+                    endpoint, status, body = 'content/{id}', 409, {'message': str(error)}
+            else:
+                endpoint, status, body = path, 404, None
+
+            with server._lock:
+                server.requests[(method, endpoint)] += 1
+            if body is None:
+                body = {'errorMessages': [f'Not found: {method} {path}']}
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return Handler
+
+
+def match_jql(jql, issue_fields, time_zone):
+    """
+    Compile the subset of JQL used by the metrics queries into an issue filter.
+
+    The supported clauses, joined with AND, are `project = "KEY"`,
+    `project in ("A", "B")`, `fixversion in releasedVersions(...)`, `fixversion in (id, ...)`,
+    `issuetype in (...)`, `resolved` against startOfMonth()/endOfMonth() or a
+    date, `updated >= "YYYY/MM/DD HH:MM"` and the `"Release Type[Dropdown]"`
+    and `"Release Window[Dropdown]"` dropdowns.
+
+    Args:
+        jql (str): The JQL query.
+        issue_fields (dict): The Jira field names keyed by 'Release_Type' and 'Release_Window'.
+        time_zone (pytz.BaseTzInfo): The time zone of the JQL dates.
+
+    Returns:
+        callable: A function telling whether an issue matches the query.
+
+    Raises:
+        ValueError: If the query uses an unsupported clause.
+    """
+    now = datetime.now(time_zone)
+    month_start = time_zone.localize(datetime(now.year, now.month, 1))
+    month_end = time_zone.localize(
+        datetime(now.year + now.month // 12, now.month % 12 + 1, 1)) - timedelta(microseconds=1)
+    tests = []
+    for clause in _split_clauses(jql):
+        match = re.fullmatch(r'fixversion in releasedVersions\((?:"(\w+)")?\)', clause, re.IGNORECASE)
+        if match:
+            project = match.group(1)
+            tests.append(lambda issue, project=project: any(
+                version['released'] for version in issue['fields']['fixVersions']
+            ) and (project is None or issue['fields']['project']['key'] == project))
+            continue
+        match = re.fullmatch(r'fixversion in \(([\d, ]+)\)', clause, re.IGNORECASE)
+        if match:
+            ids = {value.strip() for value in match.group(1).split(',')}
+            tests.append(lambda issue, ids=ids: any(
+                version['id'] in ids for version in issue['fields']['fixVersions']))
+            continue
+        match = re.fullmatch(r'project (?:= "(\w+)"|in \(([^)]*)\))', clause)
+        if match:
+            keys = {match.group(1)} if match.group(1) else set(re.findall(r'"(\w+)"', match.group(2)))
+            tests.append(lambda issue, keys=keys: issue['fields']['project']['key'] in keys)
+            continue
+        match = re.fullmatch(r'issuetype in \(([^)]*)\)', clause)
+        if match:
+            types = {value.strip().strip('"') for value in match.group(1).split(',')}
+            tests.append(lambda issue, types=types: issue['fields']['issuetype']['name'] in types)
+            continue
+        match = re.fullmatch(r'(resolved|updated) (>=|>|<=|<) (startOfMonth\(\)|endOfMonth\(\)|"([^"]+)")', clause)
+        if match:
+            field, operator, value, date = match.groups()
+            if date:
+                date_format = '%Y/%m/%d %H:%M' if ':' in date else '%Y-%m-%d'
+                bound = time_zone.localize(datetime.strptime(date, date_format))
+            else:
+                bound = month_start if value.startswith('start') else month_end
+            jira_field = 'resolutiondate' if field == 'resolved' else 'updated'
+            tests.append(lambda issue, jira_field=jira_field, operator=operator, bound=bound:
+                         _compare(issue['fields'].get(jira_field), operator, bound))
+            continue
+        match = re.fullmatch(r'"(Release Type|Release Window)\[Dropdown\]" = "?([^"]+)"?', clause)
+        if match:
+            field = issue_fields['Release_Type' if match.group(1) == 'Release Type' else 'Release_Window']
+            value = match.group(2)
+            tests.append(lambda issue, field=field, value=value:
+                         (issue['fields'].get(field) or {}).get('value') == value)
+            continue
+        raise ValueError(f'Unsupported JQL clause: {clause}')
+    return lambda issue: all(test(issue) for test in tests)
+
+
+def _split_clauses(jql):
+    """
+    Split a JQL query into its AND clauses, dropping grouping parentheses.
+    """
+    clauses = []
+    for clause in re.split(r'\s+AND\s+', jql.strip()):
+        clause = clause.strip()
+        while clause.startswith('(') and clause.count('(') > clause.count(')'):
+            clause = clause[1:].strip()
+        while clause.endswith(')') and clause.count(')') > clause.count('('):
+            clause = clause[:-1].strip()
+        if clause:
+            clauses.append(clause)
+    return clauses
+
+
+def _compare(value, operator, bound):
+    """
+    Compare a Jira timestamp with a bound.
+    """
+    if value is None:
+        return False
+    moment = datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%f%z')
+    return {
+        '>=': moment >= bound,
+        '>': moment > bound,
+        '<=': moment <= bound,
+        '<': moment < bound
+    }[operator]
+
+
+def _select_fields(issue, fields):
+    """
+    Keep the requested fields of an issue.
+    """
+    if fields in ('*all', '*navigable'):
+        return issue
+    names = fields.split(',')
+    return {
+        'id': issue['id'],
+        'key': issue['key'],
+        'fields': {name: issue['fields'].get(name) for name in names}
+    }
+
+
+def generate_issues(project_keys, issues_per_project, issue_fields, time_zone, months=3, seed=0):
+    """
+    Generate synthetic issues resolved over the last months.
+
+    Args:
+        project_keys (list): The keys of the projects.
+        issues_per_project (int): The number of issues of each project.
+        issue_fields (dict): The Jira field names keyed by 'Issue_Type', 'Release_Type'
+            and 'Release_Window'.
+        time_zone (pytz.BaseTzInfo): The time zone of the Jira user.
+        months (int, optional): The number of months, up to now, the issues are resolved in.
+        seed (int, optional): The seed of the random values.
+
+    Returns:
+        list: The issues, as returned by a search with every field.
+    """
+    generator = random.Random(seed)
+    now = datetime.now(time_zone)
+    issues = []
+    versions = {}
+    for key in project_keys:
+        for number in range(1, issues_per_project + 1):
+            issue_type = generator.choices(['Release', 'Story', 'Bug', 'Task'], [4, 3, 2, 1])[0]
+            resolved = now - timedelta(days=generator.uniform(0, 30 * months))
+            is_release = issue_type == 'Release'
+            release_type = generator.choice(['Major', 'Minor', 'Patch', 'Other', None])
+            release_window = generator.choice(['Planned', 'Unplanned', None])
+            # One fix version per project and month, released at the end of the month
+            name = f'{key} {resolved:%Y.%m}'
+            if name not in versions:
+                versions[name] = {
+                    'id': str(len(versions) + 10000),
+                    'name': name,
+                    'released': generator.random() < 0.9,
+                    'releaseDate': f'{resolved:%Y-%m}-28'
+                }
+            issues.append({
+                'id': str(len(issues) + 10000),
+                'key': f'{key}-{number}',
+                'fields': {
+                    'project': {'key': key, 'name': f'{key} Delivery'},
+                    issue_fields['Issue_Type']: {'name': issue_type},
+                    issue_fields['Release_Type']: {'value': release_type} if is_release and release_type else None,
+                    issue_fields['Release_Window']: (
+                        {'value': release_window} if is_release and release_window else None),
+                    'priority': {'name': generator.choice(['Highest', 'High', 'Medium', 'Low'])},
+                    'components': [
+                        {'name': name} for name in generator.sample(['UI', 'API', 'Data', 'Infra'], generator.randint(0, 2))
+                    ],
+                    'labels': generator.sample(['hotfix', 'security', 'customer'], generator.randint(0, 1)),
+                    'fixVersions': [versions[name]],
+                    'resolutiondate': resolved.strftime(JIRA_DATETIME_FORMAT),
+                    'updated': resolved.strftime(JIRA_DATETIME_FORMAT)
+                }
+            })
+    return issues
@@ -0,0 +1,36 @@
+from ChainOfResponsibility.BuildHandleBase import BuildHandler
+
+class BuildCrossTabHandler(BuildHandler):
+    """
+    Handler for building the segment of one configured report table.
+
+    This class extends the BuildHandler base class as part of a Chain of
+    Responsibility. One handler is chained per report of the Reports section of
+    config.yaml. It formats the report's counts into a DataFrame with a 'Total'
+    row and column and stores it in the confluence_content dictionary under the
+    report's name. The counts themselves are aggregated beforehand by the
+    cross-tab engine, so this handler only formats them.
+
+    If the counts of the report are missing, e.g. because the collection mode
+    cannot count it, an error message is printed and the report is skipped.
+
+    Args:
+        name (str): The name of the report.
+
+    Returns:
+        dict: The confluence_content updated with the report's DataFrame. If a
+              successor exists in the chain, the processing is delegated to the
+              next handler.
+    """
+
+    def __init__(self, name, successor=None):
+        super().__init__(successor)
+        self.name = name
+
+    def handle(self, project_keys, table):
+        try:
+            # Create DataFrame for the report
+            self.confluence_content[self.name] = table[self.name].to_frame()
+        except KeyError as key_error:
+            print(f"BuildCrossTabHandler error: no counts for report {key_error}")
+        return super().handle(project_keys, table)
@@ -43,7 +43,7 @@ class BuildHandler:
 
         This method performs the processing related to the current handler's
         responsibility and, if there is a successor set, it forwards the process
-        to the next handler.
+        to the next handler together with the content built so far.
 
         Args:
             project_keys (Any): The project keys that may be needed for processing.
@@ -54,5 +54,6 @@ class BuildHandler:
             the processing steps along the chain.
         """
         if self._successor:
+            self._successor.confluence_content.update(self.confluence_content)
             return self._successor.handle(project_keys, table)
         return self.confluence_content
@@ -0,0 +1,136 @@
+"""
+change_detection
+
+Probes which projects changed since the last run, to reuse the results of the others.
+"""
+from functools import partial
+from AtlassianService.JQLQuery import JQLQuery
+from ProjectMetrics import RELEASE_ISSUE_TYPE
+
+
+class ChangeDetection:
+    """
+    The change probing of MetricsEngine, around its `change_probe`.
+
+    It fingerprints the issues of the collected queries before collecting them,
+    and saves the collected results with their fingerprints. It uses the engine's
+    `_run_queries`, `_result_scope` and `_released_versions`.
+    """
+
+    def _probe_changes(self, jira_client, month, definition, per_project=True):
+        """
+        Fingerprint the month's issues and load the saved results of the unchanged projects.
+
+        One request fingerprints the issues of every project. When it matches the
+        last run, every project reuses the result saved with it. Otherwise, with
+        `per_project`, one request per project tells which of them changed.
+
+        Args:
+            jira_client (JiraClient): The authenticated Jira client.
+            month (tuple): The (year, month) of the collected issues.
+            definition (Any): What the results depend on besides Jira's data, e.g.
+                the dimension fields of the collected issues.
+            per_project (bool, optional): Fingerprint each project when something changed.
+
+        Returns:
+            tuple: The fingerprints keyed by project, and '*' for all the projects,
+            and the reused results keyed by project. Both are empty when the change
+            probe is disabled.
+        """
+        if self.change_probe is None:
+            return {}, {}
+        project_keys = list(self.project_keys.keys())
+        issue_type = ', '.join([RELEASE_ISSUE_TYPE, *self.issue_type])
+        queries = {
+            '*': JQLQuery(
+                project_keys, issue_type, self.issue_fields,
+                released_versions=self._released_versions(project_keys)).get_jql_query()
+        }
+        fingerprints = self.__fingerprint(jira_client, queries)
+        found, saved = self.change_probe.get(self._result_scope(month, definition, '*'), fingerprints['*'])
+
+        reused = {}
+        if found:
+            reused = self.__load_probe(month, definition, {key: saved.get(key) for key in project_keys})
+            fingerprints.update({key: saved[key] for key in reused})
+
+        changed = [key for key in project_keys if key not in reused]
+        if not per_project:
+            fingerprints.update(dict.fromkeys(changed, fingerprints['*']))
+        elif changed:
+            project_fingerprints = self.__fingerprint(jira_client, {
+                key: JQLQuery(
+                    key, issue_type, self.issue_fields, released_versions=self._released_versions(key)
+                ).get_jql_query()
+                for key in changed
+            })
+            fingerprints.update(project_fingerprints)
+            reused.update(self.__load_probe(month, definition, project_fingerprints))
+        print(f"Change probe: {len(reused)} of {len(project_keys)} projects unchanged since the last run")
+        return fingerprints, reused
+
+    def __load_probe(self, month, definition, fingerprints):
+        """
+        Load the saved results of the projects whose fingerprint has not changed.
+
+        Args:
+            month (tuple): The (year, month) of the collected issues.
+            definition (Any): What the results depend on besides Jira's data.
+            fingerprints (dict): The fingerprints keyed by project.
+
+        Returns:
+            dict: The reusable results keyed by project.
+        """
+        reused = {}
+        for key, fingerprint in fingerprints.items():
+            found, result = self.change_probe.get(self._result_scope(month, definition, key), fingerprint)
+            if found:
+                reused[key] = result
+        return reused
+
+    def __fingerprint(self, jira_client, queries):
+        """
+        Fingerprint the issues of JQL queries concurrently.
+
+        Args:
+            jira_client (JiraClient): The authenticated Jira client.
+            queries (dict): The JQL queries keyed by project, or '*' for all the projects.
+
+        Returns:
+            dict: The fingerprints keyed like `queries`, with None for failed probes.
+        """
+        tasks = {
+            key: self.instrumentation.timed(
+                partial(jira_client.get_jira_fingerprint, query), 'change_probe', project=key)
+            for key, query in queries.items()
+        }
+        return self._run_queries(tasks)
+
+    def _save_probe(self, month, definition, fingerprints, collected):
+        """
+        Save the collected results with the fingerprints probed before collecting them.
+
+        The fingerprint of all the projects is only saved when every project has a
+        saved result, so that the next run collects the failed projects again.
+
+        Args:
+            month (tuple): The (year, month) of the collected issues.
+            definition (Any): What the results depend on besides Jira's data.
+            fingerprints (dict): The fingerprints returned by `_probe_changes`.
+            collected (dict): The collected results keyed by project, with None for
+                the projects that failed.
+        """
+        if self.change_probe is None:
+            return
+        for key, result in collected.items():
+            self.change_probe.put(
+                self._result_scope(month, definition, key),
+                None if result is None else fingerprints.get(key),
+                result)
+        complete = all(result is not None for result in collected.values()) and all(
+            fingerprints.get(key) is not None for key in self.project_keys.keys())
+        self.change_probe.put(
+            self._result_scope(month, definition, '*'),
+            fingerprints.get('*') if complete else None,
+            {key: fingerprints.get(key) for key in self.project_keys.keys()})
+        self.change_probe.save()
@@ -0,0 +1,99 @@
+"""
+change_probe
+
+Remembers the results of the last run, so unchanged projects are not queried again.
+"""
+import os
+import json
+from datetime import datetime, timedelta, timezone
+
+
+class ChangeProbe:
+    """
+    A class for reusing the collected results of projects whose Jira issues have not changed.
+
+    Before collecting, the caller asks Jira for a fingerprint of each query
+    (the number of matching issues and the newest update time, see
+    `JiraClient.get_jira_fingerprint`). A result saved with the same fingerprint
+    by a previous run is reused instead of sending the query's requests again.
+
+    Results are keyed by scope, a string naming everything the result depends on
+    besides Jira's data, e.g. the collection mode, the month, the report fields
+    and the project. Releasing a fix version does not update its issues, so a
+    result is only trusted for `max_age` after it was collected.
+
+    Attributes:
+        path (str): The path of the JSON file the results are kept in.
+        max_age (timedelta): How long a result is reused for while its fingerprint matches.
+        entries (dict): The saved fingerprint, collection time and result of each scope.
+    """
+
+    def __init__(self, path, max_age_hours=24):
+        """
+        Initialize ChangeProbe and load the results of the previous runs.
+
+        Args:
+            path (str): The path of the JSON file the results are kept in.
+            max_age_hours (int, optional): How many hours a result is reused for.
+        """
+        self.path = path
+        self.max_age = timedelta(hours=max_age_hours)
+        self.entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as error:
+                print(f"Ignoring the unreadable change probe file {path}: {error}")
+
+    def get(self, scope, fingerprint):
+        """
+        Return the saved result of a scope if its fingerprint has not changed.
+
+        Args:
+            scope (str): The scope of the result.
+            fingerprint (list): The current fingerprint of the scope's query.
+
+        Returns:
+            tuple: (True, result) if the result can be reused, else (False, None).
+        """
+        entry = self.entries.get(scope)
+        if fingerprint is None or entry is None or entry['fingerprint'] != fingerprint or self.__expired(entry):
+            return False, None
+        return True, entry['result']
+
+    def put(self, scope, fingerprint, result):
+        """
+        Save the result of a scope with the fingerprint probed before it was collected.
+
+        Args:
+            scope (str): The scope of the result.
+            fingerprint (list): The fingerprint of the scope's query, or None to forget the scope.
+            result (Any): The JSON-serializable result.
+        """
+        if fingerprint is None:
+            self.entries.pop(scope, None)
+            return
+        self.entries[scope] = {
+            'fingerprint': fingerprint,
+            'collected': datetime.now(timezone.utc).isoformat(),
+            'result': result
+        }
+
+    def save(self):
+        """
+        Write the results to the JSON file, dropping the expired ones.
+        """
+        self.entries = {scope: entry for scope, entry in self.entries.items() if not self.__expired(entry)}
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temporary_path = f'{self.path}.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f)
+        os.replace(temporary_path, self.path)
+
+    def __expired(self, entry):
+        """
+        Whether a saved result is older than the maximum age.
+        """
+        return datetime.now(timezone.utc) - datetime.fromisoformat(entry['collected']) > self.max_age
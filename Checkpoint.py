@@ -0,0 +1,111 @@
+"""
+checkpoint
+
+Records the results of a collection as they complete, so a failed run can be resumed.
+"""
+import os
+import json
+from datetime import datetime, timezone
+
+
+class Checkpoint:
+    """
+    A class for writing the completed query results of a run to a checkpoint file.
+
+    The file is a JSON line naming the scope of the run, e.g. the collection
+    mode and month, followed by one JSON line per completed query result,
+    appended as soon as the query completes. Resuming a run of the same scope
+    restores those results, so only the queries that failed or never ran are
+    sent again; a line cut short by a crash is ignored. Failed queries are never
+    recorded.
+
+    Attributes:
+        path (str): The path of the checkpoint file.
+        scope (str): The scope of the current run, or None before it started.
+    """
+
+    def __init__(self, path):
+        """
+        Initialize Checkpoint. The file is written when a run starts.
+
+        Args:
+            path (str): The path of the checkpoint file.
+        """
+        self.path = path
+        self.scope = None
+
+    def start(self, scope, resume=False):
+        """
+        Start recording a run, continuing the checkpoint of the same scope when resuming.
+
+        Args:
+            scope (str): The scope of the run.
+            resume (bool, optional): Restore the results recorded for the same scope
+                instead of starting a new checkpoint.
+
+        Returns:
+            dict: The restored results, keyed by the string of their task key.
+        """
+        restored = self.__load(scope) if resume else None
+        if resume and restored is None:
+            print(f"No checkpoint of this collection to resume in {self.path}; collecting everything")
+        self.scope = scope
+
+        # The restored results are written again, so a line cut short is not followed by new ones
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'scope': scope, 'started': datetime.now(timezone.utc).isoformat()}) + '\n')
+            for key, result in (restored or {}).items():
+                f.write(json.dumps({'key': key, 'result': result}) + '\n')
+        if restored is None:
+            return {}
+        print(f"Resuming the checkpoint {self.path}: {len(restored)} results restored")
+        return restored
+
+    def record(self, key, result):
+        """
+        Append a completed result to the checkpoint file.
+
+        Args:
+            key (Any): The task key of the result.
+            result (Any): The JSON-serializable result.
+        """
+        if self.scope is None or result is None:
+            return
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'key': str(key), 'result': result}) + '\n')
+
+    def clear(self):
+        """
+        Remove the checkpoint file, once the run no longer needs to be resumed.
+        """
+        self.scope = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __load(self, scope):
+        """
+        Read the results recorded for a scope.
+
+        Returns:
+            dict: The results keyed by the string of their task key, or None if the
+            file is missing, unreadable or of another scope.
+        """
+        if not os.path.exists(self.path):
+            return None
+        results = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                if json.loads(f.readline() or '{}').get('scope') != scope:
+                    return None
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    results[entry['key']] = entry['result']
+        except (OSError, ValueError, AttributeError, KeyError) as error:
+            print(f"Ignoring the unreadable checkpoint {self.path}: {error}")
+            return None
+        return results
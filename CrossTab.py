@@ -0,0 +1,181 @@
+"""
+cross_tab
+
+Counts the configured report tables over any dimensions of an issue dataset.
+"""
+import numpy as np
+from IssueDataset import CountTable
+
+
+class CrossTab:
+    """
+    A class for a report table counting issues over row and column dimensions.
+
+    A cross-tab is defined in the Reports section of config.yaml, e.g. Release Type
+    by Project for the Release issues, or Release Type by Release Window. Any
+    dimension of the issue dataset can be used for the rows, the columns or the
+    filter, and a filtered dimension used for the rows or columns only shows its
+    filtered values.
+
+    Attributes:
+        name (str): The name of the table in the report content.
+        heading (str): The heading shown above the table.
+        rows (list): The dimensions of the rows.
+        columns (list): The dimensions of the columns.
+        filters (dict): The values the counted issues must have, keyed by dimension.
+    """
+
+    def __init__(self, name, heading, rows, columns, filters=None):
+        """
+        Initialize CrossTab.
+
+        Args:
+            name (str): The name of the table in the report content.
+            heading (str): The heading shown above the table.
+            rows (list): The dimensions of the rows.
+            columns (list): The dimensions of the columns.
+            filters (dict, optional): The value, or list of values, the counted issues
+                must have, keyed by dimension.
+        """
+        self.name = name
+        self.heading = heading
+        self.rows = list(rows)
+        self.columns = list(columns)
+        self.filters = {
+            dimension: values if isinstance(values, list) else [values]
+            for dimension, values in (filters or {}).items()
+        }
+
+    @classmethod
+    def from_config(cls, name, report):
+        """
+        Build a CrossTab from its entry in the Reports section of config.yaml.
+
+        Args:
+            name (str): The name of the report.
+            report (dict): The 'Heading', 'Rows', 'Columns' and optional 'Filter' of the report.
+
+        Returns:
+            CrossTab: The cross-tab.
+        """
+        return cls(name, report.get('Heading', name), report['Rows'], report['Columns'], report.get('Filter'))
+
+    @property
+    def dimensions(self):
+        """
+        The dimensions used by the cross-tab, rows and columns first.
+
+        Returns:
+            list: The dimensions.
+        """
+        return list(dict.fromkeys([*self.rows, *self.columns, *self.filters]))
+
+
+def count_crosstabs(dataset, crosstabs, split, labels=None, missing=None):
+    """
+    Count every cross-tab for each value of a split dimension.
+
+    The cross-tabs that only use single-valued dimensions are all taken from one
+    joint count over the union of their dimensions, so the dataset is only passed
+    over once for all of them. The ones using a multi-valued dimension, whose
+    issues may be counted more than once, are counted on their own.
+
+    Args:
+        dataset (IssueDataset): The collected issues.
+        crosstabs (list): The cross-tabs to count.
+        split (str): The dimension the results are split by, e.g. 'Month'.
+        labels (dict, optional): Display names of values, keyed by dimension and then value.
+        missing (dict, optional): The values whose counts could not be collected, keyed
+            by dimension. Their rows or columns are left empty.
+
+    Returns:
+        dict: The CountTable of each cross-tab, keyed by split value and then by name.
+    """
+    labels = labels or {}
+    missing = missing or {}
+    single_valued = [
+        crosstab for crosstab in crosstabs
+        if not set(crosstab.dimensions) & dataset.multi_valued
+    ]
+    joint_dimensions = list(dict.fromkeys(
+        [split, *(dimension for crosstab in single_valued for dimension in crosstab.dimensions)]))
+    joint = dataset.count(joint_dimensions, others=True) if single_valued else None
+
+    results = {value: {} for value in dataset.vocabularies[split]}
+    for crosstab in crosstabs:
+        if crosstab in single_valued:
+            counts, dimensions = joint, joint_dimensions
+        else:
+            dimensions = list(dict.fromkeys([split, *crosstab.rows, *crosstab.columns]))
+            counts = dataset.count(dimensions, where=crosstab.filters, others=True)
+
+        axes = [*crosstab.rows, *crosstab.columns]
+        axis_labels = {}
+        for position, dimension in enumerate(dimensions):
+            if dimension == split:
+                continue
+            if dimension in crosstab.filters:
+                axis_labels[dimension] = crosstab.filters[dimension]
+            elif dimension in axes:
+                axis_labels[dimension] = _ordered_labels(dataset, dimension)
+            else:
+                continue
+            counts = _select(dataset, counts, position, dimension, axis_labels[dimension])
+
+        summed = tuple(
+            position for position, dimension in enumerate(dimensions)
+            if dimension != split and dimension not in axes)
+        counts = counts.sum(axis=summed).astype(float)
+        kept = [dimension for dimension in dimensions if dimension == split or dimension in axes]
+        counts = np.transpose(counts, [kept.index(dimension) for dimension in [split, *axes]])
+
+        for position, dimension in enumerate(axes, start=1):
+            for index, label in enumerate(axis_labels[dimension]):
+                if label in missing.get(dimension, ()):
+                    counts[(slice(None),) * position + (index,)] = np.nan
+
+        row_labels = _combine_labels(crosstab.rows, axis_labels, labels)
+        column_labels = _combine_labels(crosstab.columns, axis_labels, labels)
+        for index, value in enumerate(dataset.vocabularies[split]):
+            results[value][crosstab.name] = CountTable(row_labels, column_labels, counts[index])
+    return results
+
+
+def _ordered_labels(dataset, dimension):
+    """
+    The labels of a dimension in display order: configured order for fixed
+    vocabularies, and sorted by name for open ones.
+    """
+    vocabulary = dataset.vocabularies[dimension]
+    if dimension in dataset.open_dimensions:
+        return sorted(vocabulary, key=str)
+    return vocabulary
+
+
+def _select(dataset, counts, position, dimension, axis_labels):
+    """
+    Reorder and restrict an axis of the counts to the given labels, with zero
+    counts for labels that are not in the vocabulary. The slot counting the
+    values outside the vocabulary is dropped.
+    """
+    codes = [dataset.lookup(dimension, label) for label in axis_labels]
+    padding = list(counts.shape)
+    padding[position] = 1
+    counts = np.concatenate([counts, np.zeros(padding, dtype=counts.dtype)], axis=position)
+    return np.take(counts, codes, axis=position)
+
+
+def _combine_labels(dimensions, axis_labels, labels):
+    """
+    The display labels of the combinations of the values of some dimensions,
+    joined with ' / ' when there is more than one dimension.
+    """
+    combined = [()]
+    for dimension in dimensions:
+        names = labels.get(dimension, {})
+        combined = [
+            (*prefix, str(names.get(label, label)))
+            for prefix in combined
+            for label in axis_labels[dimension]
+        ]
+    return [' / '.join(combination) if combination else 'Count' for combination in combined]
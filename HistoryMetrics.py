@@ -0,0 +1,125 @@
+"""
+history_metrics
+
+Collects the release metrics of a project for a range of months from a single Jira search.
+"""
+from datetime import datetime
+import requests
+from AtlassianService.JQLQuery import JQLQuery
+from ProjectMetrics import RELEASE_ISSUE_TYPE, issue_values
+from IssueStore import parse_jira_datetime, month_bounds
+
+
+class HistoryMetrics:
+    """
+    A class for collecting the release metrics of a project for several months at once.
+
+    The project's issues resolved anywhere in the range are streamed from one
+    paginated search, together with their resolution date, and bucketed locally
+    by the month they were resolved in as each page arrives, so a range of a
+    year only keeps the projected tuples instead of every raw page. Every
+    month's counts then come from that single result set instead of one run per
+    month.
+
+    Attributes:
+        jira_client (object): Instance to interact with Jira.
+        project_key (str): The key of the Jira project.
+        issue_types (list): The issue types fetched besides the Release issues.
+        issue_fields (dict): The Jira field of each report dimension, keyed by dimension.
+        months (list): The (year, month) tuples of the range, in order.
+        time_zone (pytz.BaseTzInfo): The time zone the months are measured in.
+        page_size (int): The number of issues requested per page.
+        released_versions (list): The ids of the project's released fix versions, or None
+            to select them with releasedVersions().
+        issues (dict): The projected issues of each month as tuples of their dimension
+            values, in `issue_fields` order, or None if the search failed.
+    """
+
+    def __init__(self,
+                jira_client,
+                project_key,
+                issue_types,
+                issue_fields,
+                months,
+                time_zone,
+                page_size=100,
+                released_versions=None):
+        """
+        Initialize HistoryMetrics and collect the issues of every month of the range.
+
+        Args:
+            jira_client (object): Instance to interact with Jira.
+            project_key (str): The key of the Jira project.
+            issue_types (list): The issue types fetched besides the Release issues.
+            issue_fields (dict): The Jira field of each report dimension, keyed by dimension.
+            months (list): The (year, month) tuples of the range, in order.
+            time_zone (pytz.BaseTzInfo): The time zone the months are measured in.
+            page_size (int, optional): The number of issues requested per page.
+            released_versions (list, optional): The ids of the project's released fix versions.
+        """
+        self.jira_client = jira_client
+        self.project_key = project_key
+        self.issue_types = issue_types
+        self.issue_fields = issue_fields
+        self.months = months
+        self.time_zone = time_zone
+        self.page_size = page_size
+        self.released_versions = released_versions
+        self.issues = self.__get_jira_issues()
+
+    def __get_jira_issues(self):
+        """
+        Fetch the project's issues resolved in the range and bucket them by month.
+
+        Returns:
+            dict: Tuples of the dimension values of each issue keyed by
+            (year, month), or None if the search failed.
+        """
+        start, _ = month_bounds(*self.months[0], self.time_zone)
+        _, end = month_bounds(*self.months[-1], self.time_zone)
+        query = JQLQuery(
+            self.project_key,
+            ', '.join([RELEASE_ISSUE_TYPE, *self.issue_types]),
+            self.issue_fields,
+            resolved_start=start.strftime('%Y-%m-%d'),
+            resolved_end=end.strftime('%Y-%m-%d'),
+            released_versions=self.released_versions
+        ).get_jql_query()
+        fields = list(self.issue_fields.values())
+        months = {month: [] for month in self.months}
+        try:
+            for issue in self.jira_client.iter_issues(query, [*fields, 'resolutiondate'], self.page_size):
+                resolved = parse_jira_datetime(issue['fields']['resolutiondate']).astimezone(self.time_zone)
+                if (resolved.year, resolved.month) in months:
+                    months[(resolved.year, resolved.month)].append(issue_values(issue, fields))
+        except requests.exceptions.HTTPError:
+            if self.jira_client.raise_errors:
+                raise
+            return None
+        return months
+
+
+def month_range(start_month, end_month):
+    """
+    List the months between two months, inclusive.
+
+    Args:
+        start_month (str): The first month, as 'YYYY-MM'.
+        end_month (str): The last month, as 'YYYY-MM'.
+
+    Returns:
+        list: The (year, month) tuples of the range, in order.
+
+    Raises:
+        ValueError: If a month is not a valid 'YYYY-MM' month, or the range ends before it starts.
+    """
+    start = datetime.strptime(start_month, '%Y-%m')
+    end = datetime.strptime(end_month, '%Y-%m')
+    if start > end:
+        raise ValueError(f"The month range ends ({end_month}) before it starts ({start_month})")
+    year, month = start.year, start.month
+    months = []
+    while (year, month) <= (end.year, end.month):
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
@@ -0,0 +1,300 @@
+"""
+instrumentation
+
+Records what a run spends its time and requests on, and writes the run report.
+"""
+import json
+import os
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Prefix of the Prometheus metric names
+METRIC_PREFIX = 'release_metrics'
+
+
+class Span:
+    """
+    A class for one timed operation of a run, e.g. one Jira query.
+
+    The HTTP requests sent by the thread while the span is open are added to
+    it, and to every span it is nested in.
+
+    Attributes:
+        name (str): The operation, e.g. 'jira_count' or 'post_confluence_page'.
+        labels (dict): What the operation worked on, e.g. the project and dimension.
+            Nested spans inherit the labels of their parent.
+        started (float): The epoch time the span started at.
+        seconds (float): The wall time of the span.
+        requests (int): The number of HTTP requests sent.
+        retries (int): The number of retries of those requests.
+        response_bytes (int): The size of the response bodies.
+        result_size (int): The size of the result, e.g. the number of issues, if known.
+        error (str): The error the operation failed with, if any.
+    """
+
+    def __init__(self, name, labels):
+        """
+        Initialize Span.
+
+        Args:
+            name (str): The operation.
+            labels (dict): What the operation worked on.
+        """
+        self.name = name
+        self.labels = labels
+        self.started = time.time()
+        self.seconds = None
+        self.requests = 0
+        self.retries = 0
+        self.response_bytes = 0
+        self.result_size = None
+        self.error = None
+
+    def to_dict(self):
+        """
+        The span as a JSON-serializable dictionary.
+
+        Returns:
+            dict: The span.
+        """
+        return {
+            'name': self.name,
+            'labels': self.labels,
+            'started': self.started,
+            'seconds': self.seconds,
+            'requests': self.requests,
+            'retries': self.retries,
+            'response_bytes': self.response_bytes,
+            'result_size': self.result_size,
+            'error': self.error
+        }
+
+
+class Instrumentation:
+    """
+    A class for recording the spans and HTTP traffic of a run.
+
+    Spans are opened with `span`, from any thread or asyncio task. The HTTP
+    requests are observed through a response hook on the shared session, or
+    reported with `record_request` by the async session, so every request of
+    the Jira and Confluence clients is counted, and attributed to the spans
+    open on the thread or task that sent it.
+
+    Attributes:
+        started (float): The epoch time the run started at.
+        spans (list): The finished spans, in the order they finished.
+        totals (dict): The requests, retries and response bytes of the whole run.
+    """
+
+    def __init__(self):
+        """
+        Initialize Instrumentation.
+        """
+        self.started = time.time()
+        self.spans = []
+        self.totals = {'requests': 0, 'retries': 0, 'response_bytes': 0}
+        self._lock = threading.Lock()
+        self._stack = ContextVar(f'instrumentation_spans_{id(self)}', default=())
+
+    def attach(self, session):
+        """
+        Observe the HTTP requests of a session.
+
+        Args:
+            session (requests.Session): The session shared by the clients.
+        """
+        session.hooks['response'].append(self.__record_response)
+
+    @contextmanager
+    def span(self, name, **labels):
+        """
+        Time an operation.
+
+        Args:
+            name (str): The operation.
+            **labels: What the operation worked on, e.g. project='SER'.
+
+        Yields:
+            Span: The open span, e.g. to set its `result_size`.
+        """
+        stack = self._stack.get()
+        span = Span(name, {**(stack[-1].labels if stack else {}), **labels})
+        token = self._stack.set(stack + (span,))
+        start = time.perf_counter()
+        try:
+            yield span
+        except Exception as error:
+            span.error = f'{type(error).__name__}: {error}'
+            raise
+        finally:
+            span.seconds = time.perf_counter() - start
+            self._stack.reset(token)
+            with self._lock:
+                self.spans.append(span)
+
+    def timed(self, task, name, **labels):
+        """
+        Wrap a callable so that every call is timed in a span.
+
+        Args:
+            task (callable): The callable, e.g. a query task of the QueryExecutor.
+            name (str): The operation.
+            **labels: What the operation worked on.
+
+        Returns:
+            callable: The wrapped callable.
+        """
+        def timed_task(*args, **kwargs):
+            with self.span(name, **labels):
+                return task(*args, **kwargs)
+        return timed_task
+
+    def report(self, **run_labels):
+        """
+        Build the run report.
+
+        Args:
+            **run_labels: Details of the run, e.g. the collection mode.
+
+        Returns:
+            dict: The run totals, a summary of the spans by operation, and every span.
+        """
+        finished = time.time()
+        with self._lock:
+            spans = list(self.spans)
+            totals = dict(self.totals)
+        summary = {}
+        for name in dict.fromkeys(span.name for span in spans):
+            seconds = sorted(span.seconds for span in spans if span.name == name)
+            summary[name] = {
+                'count': len(seconds),
+                'seconds': sum(seconds),
+                'median_seconds': statistics.median(seconds),
+                'p95_seconds': seconds[min(len(seconds) - 1, int(len(seconds) * 0.95))],
+                'max_seconds': seconds[-1],
+                'errors': sum(span.error is not None for span in spans if span.name == name)
+            }
+        return {
+            'run': {
+                **run_labels,
+                'started': self.started,
+                'finished': finished,
+                'seconds': finished - self.started,
+                **totals
+            },
+            'summary': summary,
+            'spans': [span.to_dict() for span in spans]
+        }
+
+    def write_json(self, path, **run_labels):
+        """
+        Write the run report as JSON.
+
+        Args:
+            path (str): The path of the report.
+            **run_labels: Details of the run, e.g. the collection mode.
+        """
+        _write_atomically(path, json.dumps(self.report(**run_labels), indent=2, default=str))
+
+    def write_prometheus(self, path, **run_labels):
+        """
+        Write the run metrics for the Prometheus node exporter's textfile collector.
+
+        The spans are aggregated by operation and project, so the number of
+        series does not grow with the number of queries.
+
+        Args:
+            path (str): The path of the .prom file, in the collector's directory.
+            **run_labels: Details of the run, added as labels to every metric.
+        """
+        report = self.report()
+        run = report['run']
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f'# HELP {METRIC_PREFIX}_{name} {help_text}')
+            lines.append(f'# TYPE {METRIC_PREFIX}_{name} {kind}')
+            for labels, value in samples:
+                lines.append(f'{METRIC_PREFIX}_{name}{_format_labels({**run_labels, **labels})} {value}')
+
+        metric('run_duration_seconds', 'gauge', 'Wall time of the last run.', [({}, run['seconds'])])
+        metric('run_finished_timestamp_seconds', 'gauge', 'Epoch time the last run finished.',
+               [({}, run['finished'])])
+        metric('http_requests', 'gauge', 'HTTP requests sent by the last run.', [({}, run['requests'])])
+        metric('http_retries', 'gauge', 'HTTP retries of the last run.', [({}, run['retries'])])
+        metric('http_response_bytes', 'gauge', 'Response bytes received by the last run.',
+               [({}, run['response_bytes'])])
+
+        groups = {}
+        for span in report['spans']:
+            key = (span['name'], span['labels'].get('project', ''))
+            group = groups.setdefault(key, {'count': 0, 'seconds': 0.0, 'requests': 0, 'errors': 0})
+            group['count'] += 1
+            group['seconds'] += span['seconds']
+            group['requests'] += span['requests']
+            group['errors'] += span['error'] is not None
+        for field, help_text in (
+                ('seconds', 'Total wall time of the operation in the last run.'),
+                ('count', 'Number of times the operation ran in the last run.'),
+                ('requests', 'HTTP requests sent by the operation in the last run.'),
+                ('errors', 'Failures of the operation in the last run.')):
+            metric(f'operation_{field}', 'gauge', help_text, [
+                ({'operation': name, 'project': project}, group[field])
+                for (name, project), group in groups.items()
+            ])
+        _write_atomically(path, '\n'.join(lines) + '\n')
+
+    def record_request(self, response_bytes, retries=0):
+        """
+        Count a request in the run totals and in the spans open on the current thread or task.
+
+        Args:
+            response_bytes (int): The size of the response body.
+            retries (int, optional): The number of retries of the request.
+        """
+        with self._lock:
+            self.totals['requests'] += 1
+            self.totals['retries'] += retries
+            self.totals['response_bytes'] += response_bytes
+        for span in self._stack.get():
+            span.requests += 1
+            span.retries += retries
+            span.response_bytes += response_bytes
+
+    def __record_response(self, response, *args, **kwargs):
+        """
+        Count a response of the session in the run totals and the open spans.
+        """
+        raw_retries = getattr(getattr(response, 'raw', None), 'retries', None)
+        retries = len(raw_retries.history) if raw_retries is not None else 0
+        retries += getattr(response, 'throttle_retries', 0)
+        self.record_request(len(response.content or b''), retries)
+        return response
+
+
+def _format_labels(labels):
+    """
+    Format Prometheus labels, e.g. {project="SER"}.
+    """
+    if not labels:
+        return ''
+    formatted = []
+    for name, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        formatted.append(f'{name}="{value}"')
+    return '{' + ','.join(formatted) + '}'
+
+
+def _write_atomically(path, content):
+    """
+    Write a file through a temporary file, so readers never see it half written.
+    """
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(temporary_path, path)
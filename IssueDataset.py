@@ -0,0 +1,345 @@
+"""
+issue_dataset
+
+A compact, columnar dataset of the issues the release metrics are counted from.
+"""
+from array import array
+import numpy as np
+
+# Array type code and numpy dtype of the label codes: C ints, so an open dimension
+# (e.g. the labels of every project in portfolio or store mode) never outgrows them
+CODE_TYPECODE = 'i'
+CODE_DTYPE = np.intc
+
+
+class IssueDataset:
+    """
+    A class for holding issues as small integer codes, one column per dimension.
+
+    Every dimension (e.g. 'Project', 'Issue Type', 'Release Type', 'Release Window'
+    and 'Month') has a vocabulary of labels. An issue is stored as the code of its
+    label in each column, or -1 when its value is not in the vocabulary, so counts
+    over any combination of dimensions come from one vectorized `bincount` instead
+    of nested Python dictionaries.
+
+    Open dimensions add every new value they see to their vocabulary. Multi-valued
+    dimensions (e.g. components or labels) hold a list of codes per issue, stored
+    as offsets into one array of codes, and an issue is counted once per value.
+
+    Attributes:
+        vocabularies (dict): The labels of each dimension, in code order.
+        open_dimensions (set): The dimensions whose vocabularies grow with new values.
+        multi_valued (set): The dimensions holding a list of values per issue.
+    """
+
+    def __init__(self, vocabularies, open_dimensions=(), multi_valued=()):
+        """
+        Initialize an empty IssueDataset.
+
+        Args:
+            vocabularies (dict): The initial labels of each dimension, in code order.
+            open_dimensions (iterable, optional): The dimensions whose vocabularies grow
+                with new values.
+            multi_valued (iterable, optional): The dimensions holding a list of values per issue.
+        """
+        self.vocabularies = {dimension: list(labels) for dimension, labels in vocabularies.items()}
+        self.open_dimensions = set(open_dimensions)
+        self.multi_valued = set(multi_valued)
+        self._codes = {
+            dimension: {label: code for code, label in enumerate(labels)}
+            for dimension, labels in self.vocabularies.items()
+        }
+        self._columns = {
+            dimension: (array('q', [0]), array(CODE_TYPECODE)) if dimension in self.multi_valued else array(CODE_TYPECODE)
+            for dimension in self.vocabularies
+        }
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def encode(self, dimension, label):
+        """
+        Retrieve the code of a label, adding it to the vocabulary of an open dimension.
+
+        Args:
+            dimension (str): The dimension.
+            label (Any): The label.
+
+        Returns:
+            int: The code of the label, or -1 if it is not in the vocabulary.
+        """
+        codes = self._codes[dimension]
+        code = codes.get(label)
+        if code is None:
+            if dimension not in self.open_dimensions or label is None:
+                return -1
+            code = codes[label] = len(self.vocabularies[dimension])
+            self.vocabularies[dimension].append(label)
+        return code
+
+    def lookup(self, dimension, label):
+        """
+        Retrieve the code of a label without changing the vocabulary.
+
+        Args:
+            dimension (str): The dimension.
+            label (Any): The label.
+
+        Returns:
+            int: The code of the label, or -1 if it is not in the vocabulary.
+        """
+        return self._codes[dimension].get(label, -1)
+
+    def add_issues(self, dimensions, issues, **labels):
+        """
+        Encode and append projected issues.
+
+        Args:
+            dimensions (list): The dimensions of the values in each issue tuple.
+            issues (list): Issue tuples with one value per dimension, or a list of
+                values for the multi-valued dimensions.
+            **labels: Labels shared by all the issues, keyed by dimension, e.g. the
+                project the issues belong to.
+        """
+        dimensions = list(dimensions)
+        for dimension, column in self._columns.items():
+            if dimension not in dimensions:
+                code = self.encode(dimension, labels.get(dimension))
+                if dimension in self.multi_valued:
+                    offsets, _ = column
+                    offsets.extend([offsets[-1]] * len(issues))
+                else:
+                    column.extend([code] * len(issues))
+                continue
+
+            position = dimensions.index(dimension)
+            if dimension in self.multi_valued:
+                offsets, values = column
+                for issue in issues:
+                    codes = [self.encode(dimension, label) for label in issue[position] or ()]
+                    values.extend(code for code in codes if code >= 0)
+                    offsets.append(len(values))
+            else:
+                column.extend(self.encode(dimension, issue[position]) for issue in issues)
+        self._length += len(issues)
+
+    def extend(self, dataset):
+        """
+        Append every issue of another dataset with the same dimensions.
+
+        The codes of the other dataset are translated into this dataset's vocabularies.
+
+        Args:
+            dataset (IssueDataset): The dataset to append.
+        """
+        for dimension, column in self._columns.items():
+            translation = np.array(
+                [self.encode(dimension, label) for label in dataset.vocabularies[dimension]] + [-1],
+                dtype=CODE_DTYPE)
+            if dimension in self.multi_valued:
+                offsets, values = column
+                other_offsets, other_values = dataset._columns[dimension]
+                codes = translation[np.frombuffer(other_values, dtype=CODE_DTYPE)]
+                kept = np.concatenate([[0], np.cumsum(codes >= 0)])
+                start = len(values)
+                values.extend(codes[codes >= 0].tolist())
+                offsets.extend((start + kept[np.frombuffer(other_offsets, dtype=np.int64)[1:]]).tolist())
+            else:
+                column.extend(translation[np.frombuffer(dataset._columns[dimension], dtype=CODE_DTYPE)].tolist())
+        self._length += len(dataset)
+
+    def column(self, dimension):
+        """
+        Retrieve the codes of a single-valued dimension.
+
+        Args:
+            dimension (str): The dimension.
+
+        Returns:
+            numpy.ndarray: The code of every issue, -1 for values outside the vocabulary.
+        """
+        return np.frombuffer(self._columns[dimension], dtype=CODE_DTYPE).copy()
+
+    def count(self, dimensions, where=None, others=False):
+        """
+        Count the issues over a combination of dimensions in one pass.
+
+        Issues with a value outside the vocabulary of any of the dimensions are not
+        counted, unless `others` is set. An issue is counted once per combination
+        of the values of its multi-valued dimensions.
+
+        Args:
+            dimensions (list): The dimensions of the result axes, in order.
+            where (dict, optional): The label, or list of labels, the counted issues
+                must have, keyed by dimension, e.g. {'Issue Type': 'Release'}.
+            others (bool, optional): Count the values outside the vocabulary in one
+                extra slot at the end of each axis, so that summing an axis out
+                keeps every issue.
+
+        Returns:
+            numpy.ndarray: The counts, with one axis per dimension sized by its vocabulary,
+            plus one when `others` is set.
+        """
+        rows = np.flatnonzero(self.__match(where or {}))
+
+        exploded = {}
+        for dimension in dimensions:
+            if dimension not in self.multi_valued or dimension in exploded:
+                continue
+            offsets, values = self.__multi_valued_column(dimension)
+            repeats = offsets[rows + 1] - offsets[rows]
+            starts = np.repeat(offsets[rows], repeats)
+            within = np.arange(repeats.sum()) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+            exploded = {key: np.repeat(codes, repeats) for key, codes in exploded.items()}
+            exploded[dimension] = values[starts + within]
+            rows = np.repeat(rows, repeats)
+
+        codes = [
+            exploded[dimension] if dimension in exploded else self.column(dimension)[rows]
+            for dimension in dimensions
+        ]
+        shape = tuple(len(self.vocabularies[dimension]) + others for dimension in dimensions)
+        if others:
+            codes = [np.where(column < 0, size - 1, column) for column, size in zip(codes, shape)]
+        valid = np.ones(len(rows), dtype=bool)
+        for column in codes:
+            valid &= column >= 0
+
+        flat = np.ravel_multi_index([column[valid] for column in codes], shape)
+        return np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape)
+
+    def __match(self, where):
+        """
+        Find the issues with the given labels.
+
+        Args:
+            where (dict): The label, or list of labels, keyed by dimension.
+
+        Returns:
+            numpy.ndarray: A boolean mask of the matching issues.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for dimension, labels in where.items():
+            labels = labels if isinstance(labels, (list, tuple)) else [labels]
+            codes = [self._codes[dimension][label] for label in labels if label in self._codes[dimension]]
+            if dimension in self.multi_valued:
+                offsets, values = self.__multi_valued_column(dimension)
+                owners = np.repeat(np.arange(len(self)), np.diff(offsets))
+                matched = np.zeros(len(self), dtype=bool)
+                matched[owners[np.isin(values, codes)]] = True
+                mask &= matched
+            else:
+                mask &= np.isin(self.column(dimension), codes)
+        return mask
+
+    def __multi_valued_column(self, dimension):
+        """
+        Retrieve the offsets and codes of a multi-valued dimension.
+
+        Args:
+            dimension (str): The dimension.
+
+        Returns:
+            tuple: The offsets of each issue's codes, with one extra end offset, and the codes.
+        """
+        offsets, values = self._columns[dimension]
+        return np.frombuffer(offsets, dtype=np.int64).copy(), np.frombuffer(values, dtype=CODE_DTYPE).copy()
+
+
+class CountTable:
+    """
+    A class for the counts of a report table.
+
+    Attributes:
+        rows (list): The labels of the rows.
+        columns (list): The labels of the columns.
+        values (numpy.ndarray): The counts, with NaN in the cells that could not be collected.
+    """
+
+    def __init__(self, rows, columns, values):
+        """
+        Initialize CountTable.
+
+        Args:
+            rows (list): The labels of the rows.
+            columns (list): The labels of the columns.
+            values (array-like): The counts, one row per row label.
+        """
+        self.rows = list(rows)
+        self.columns = list(columns)
+        self.values = np.asarray(values, dtype=float).reshape(len(self.rows), len(self.columns))
+
+    def to_frame(self):
+        """
+        Format the counts as a DataFrame with a 'Total' row and column.
+
+        The totals are added in one NumPy pass instead of growing the DataFrame.
+        Cells that could not be collected are left out of the totals.
+
+        Returns:
+            pandas.DataFrame: The formatted table.
+        """
+        import pandas as pd  # loaded only when the tables are formatted
+
+        row_count, column_count = self.values.shape
+        totals = np.zeros((row_count + 1, column_count + 1))
+        totals[:row_count, :column_count] = self.values
+        totals[row_count, :column_count] = np.nansum(self.values, axis=0)
+        totals[:, column_count] = np.nansum(totals[:, :column_count], axis=1)
+        if not np.isnan(totals).any():
+            totals = totals.astype(np.int64)
+        return pd.DataFrame(totals, index=[*self.rows, 'Total'], columns=[*self.columns, 'Total'])
+
+    def to_dict(self):
+        """
+        The counts as JSON-serializable data, with None in the cells that could not be collected.
+
+        Returns:
+            dict: The 'rows', 'columns' and 'values' of the table.
+        """
+        return {
+            'rows': self.rows,
+            'columns': self.columns,
+            'values': [[None if np.isnan(value) else value for value in row] for row in self.values.tolist()]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Create a CountTable from the data returned by `to_dict`.
+
+        Args:
+            data (dict): The 'rows', 'columns' and 'values' of the table.
+
+        Returns:
+            CountTable: The table.
+        """
+        values = [[np.nan if value is None else value for value in row] for row in data['values']]
+        return cls(data['rows'], data['columns'], values)
+
+
+def merge_count_tables(tables):
+    """
+    Merge the count tables of disjoint sets of issues, e.g. of the shards of a run.
+
+    The labels of the merged table are those of every table, in the order they
+    first appear in. The counts of a cell are summed over the tables having it,
+    and a cell that could not be collected in one of them is left empty.
+
+    Args:
+        tables (list): The CountTable of each set of issues.
+
+    Returns:
+        CountTable: The merged table.
+    """
+    rows = list(dict.fromkeys(row for table in tables for row in table.rows))
+    columns = list(dict.fromkeys(column for table in tables for column in table.columns))
+    row_positions = {row: position for position, row in enumerate(rows)}
+    column_positions = {column: position for position, column in enumerate(columns)}
+    values = np.zeros((len(rows), len(columns)))
+    for table in tables:
+        values[np.ix_(
+            [row_positions[row] for row in table.rows],
+            [column_positions[column] for column in table.columns])] += table.values
+    return CountTable(rows, columns, values)
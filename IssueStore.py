@@ -0,0 +1,246 @@
+"""
+issue_store
+
+A local SQLite store of the projected Jira issue fields used by the release metrics.
+"""
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from ProjectMetrics import field_value
+
+# Version of the SQLite schema; files with an older version are rebuilt
+SCHEMA_VERSION = 1
+
+
+class IssueStore:
+    """
+    A class for keeping the issues the metrics are computed from in a local SQLite file.
+
+    Each issue is stored once, keyed by its Jira key, with only the fields the
+    metrics need: project, the values of the report dimensions, resolution date,
+    whether any of its fix versions is released and when it was last updated.
+    Every synced query scope remembers when it was last synced, so the next sync
+    only has to fetch the issues updated since then. The scope includes the
+    dimension fields, so adding a dimension to the reports triggers a full sync.
+
+    Attributes:
+        path (str): The path of the SQLite file.
+        issue_fields (dict): The Jira field of each report dimension, keyed by dimension.
+        full_sync_age (timedelta): How long a full sync is trusted before the next
+            sync fetches the whole scope again.
+        connection (sqlite3.Connection): The connection to the SQLite file.
+    """
+
+    def __init__(self, path, issue_fields, full_sync_hours=24):
+        """
+        Initialize IssueStore and create the SQLite file and its tables if needed.
+
+        Args:
+            path (str): The path of the SQLite file.
+            issue_fields (dict): The Jira field of each report dimension, keyed by dimension.
+            full_sync_hours (int, optional): How many hours a full sync is trusted for.
+                Releasing a fix version does not update its issues, so a periodic full
+                sync is what picks those changes up.
+        """
+        self.path = path
+        self.issue_fields = issue_fields
+        self.full_sync_age = timedelta(hours=full_sync_hours)
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            if self.connection.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+                self.connection.execute('DROP TABLE IF EXISTS issues')
+                self.connection.execute('DROP TABLE IF EXISTS syncs')
+                self.connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS issues ('
+                'key TEXT PRIMARY KEY, project TEXT, dimensions TEXT, '
+                'resolved TEXT, released INTEGER, updated TEXT)')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS syncs ('
+                'scope TEXT PRIMARY KEY, last_sync TEXT, last_full_sync TEXT)')
+
+    @property
+    def fields(self):
+        """
+        The Jira fields requested for the stored issues.
+
+        Returns:
+            list: The field names.
+        """
+        return [
+            'project',
+            *dict.fromkeys(self.issue_fields.values()),
+            'resolutiondate',
+            'fixVersions',
+            'updated'
+        ]
+
+    def get_last_sync(self, scope):
+        """
+        Retrieve when the scope was last synced.
+
+        Args:
+            scope (str): The synced query scope.
+
+        Returns:
+            datetime: The UTC start time of the last sync, or None if the scope needs
+            a full sync because it was never synced or its last full sync is too old.
+        """
+        with self._lock:
+            row = self.connection.execute(
+                'SELECT last_sync, last_full_sync FROM syncs WHERE scope = ?',
+                (self.__scope_key(scope),)).fetchone()
+        if row is None:
+            return None
+        last_sync, last_full_sync = (datetime.fromisoformat(value) for value in row)
+        if datetime.now(timezone.utc) - last_full_sync > self.full_sync_age:
+            return None
+        return last_sync
+
+    def set_last_sync(self, scope, synced_at, full_sync=False):
+        """
+        Record when the scope was synced.
+
+        Args:
+            scope (str): The synced query scope.
+            synced_at (datetime): The UTC time the sync started.
+            full_sync (bool, optional): Whether the whole scope was fetched.
+        """
+        with self._lock, self.connection:
+            self.connection.execute(
+                'INSERT INTO syncs (scope, last_sync, last_full_sync) VALUES (?, ?, ?) '
+                'ON CONFLICT(scope) DO UPDATE SET last_sync = excluded.last_sync, '
+                'last_full_sync = CASE WHEN ? THEN excluded.last_full_sync ELSE last_full_sync END',
+                (self.__scope_key(scope), synced_at.isoformat(), synced_at.isoformat(), full_sync))
+
+    def upsert_issues(self, issues, replace_projects=None):
+        """
+        Insert or update the projected fields of the issues.
+
+        Args:
+            issues (iterable): The raw issues of a search, requested with `fields`, e.g.
+                streamed by `JiraClient.iter_issues`. They are projected as they come,
+                and only written once all of them are, in one transaction.
+            replace_projects (list, optional): Projects whose stored issues are deleted
+                first, for a full sync of those projects.
+
+        Returns:
+            int: The number of issues written.
+        """
+        rows = [self.__project_issue(issue) for issue in issues]
+        with self._lock, self.connection:
+            if replace_projects:
+                self.connection.executemany(
+                    'DELETE FROM issues WHERE project = ?', [(key,) for key in replace_projects])
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO issues VALUES (?, ?, ?, ?, ?, ?)', rows)
+        return len(rows)
+
+    def get_issues(self, project_key, start, end):
+        """
+        Retrieve a project's issues with a released fix version resolved in a period.
+
+        Args:
+            project_key (str): The key of the Jira project.
+            start (datetime): The start of the period, inclusive.
+            end (datetime): The end of the period, exclusive.
+
+        Returns:
+            list: Tuples of the dimension values of each issue, in `issue_fields` order.
+        """
+        with self._lock:
+            rows = self.connection.execute(
+                'SELECT dimensions FROM issues '
+                'WHERE project = ? AND released = 1 AND resolved >= ? AND resolved < ?',
+                (project_key, to_utc(start), to_utc(end))).fetchall()
+        fields = list(self.issue_fields.values())
+        return [tuple(json.loads(values).get(field) for field in fields) for values, in rows]
+
+    def close(self):
+        """
+        Close the connection to the SQLite file.
+        """
+        self.connection.close()
+
+    def __scope_key(self, scope):
+        """
+        Qualify a synced query scope with the stored dimension fields.
+
+        Args:
+            scope (str): The synced query scope.
+
+        Returns:
+            str: The key of the scope in the `syncs` table.
+        """
+        return f"{scope} | {', '.join(self.fields)}"
+
+    def __project_issue(self, issue):
+        """
+        Project a raw issue onto the stored columns.
+
+        Args:
+            issue (dict): A raw issue of a search response.
+
+        Returns:
+            tuple: The values of the `issues` columns.
+        """
+        fields = issue['fields']
+        resolved = fields.get('resolutiondate')
+        return (
+            issue['key'],
+            fields['project']['key'],
+            json.dumps({field: field_value(fields.get(field)) for field in self.issue_fields.values()}),
+            to_utc(parse_jira_datetime(resolved)) if resolved else None,
+            int(any(version.get('released') for version in fields.get('fixVersions') or [])),
+            fields.get('updated')
+        )
+
+
+def parse_jira_datetime(value):
+    """
+    Parse a Jira timestamp such as '2024-05-01T10:15:30.000+1200'.
+
+    Args:
+        value (str): The Jira timestamp.
+
+    Returns:
+        datetime: The timezone-aware timestamp.
+    """
+    return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%f%z')
+
+
+def to_utc(value):
+    """
+    Format a timezone-aware timestamp as a sortable UTC string.
+
+    Args:
+        value (datetime): The timestamp.
+
+    Returns:
+        str: The UTC timestamp in ISO format without a fraction.
+    """
+    return value.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S')
+
+
+def month_bounds(year, month, time_zone):
+    """
+    Return the start and end of a month in a time zone.
+
+    Args:
+        year (int): The year.
+        month (int): The month, from 1 to 12.
+        time_zone (pytz.BaseTzInfo): The time zone the month is measured in.
+
+    Returns:
+        tuple: The timezone-aware start of the month and start of the next month.
+    """
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return (
+        time_zone.localize(datetime(year, month, 1)),
+        time_zone.localize(datetime(next_year, next_month, 1))
+    )
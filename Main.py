@@ -1,125 +1,177 @@
-import os
-import yaml
-import requests
-from Tables import Tables
-from AtlassianService.JiraService import JiraClient
-from AtlassianService.ConfluenceService import ConfluenceClient
-from ReleaseMetrics import ReleaseMetrics
-
-class Main:
+import argparse
+import asyncio
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import repeat
+from MetricsEngine import MetricsEngine
+from Sharding import parse_shard, shard_config
+
+class Main(MetricsEngine):
     """
     This class is the main class for the project.
     It initialises the config, table, and confluence client.
     It also generates the tables and posts them to confluence.
     It also contains the main method that is used to run the program.
+    The config is read from config.yaml unless one is given, e.g. by the benchmarks.
     """
-    def __init__(self):
+    def __init__(self, config=None):
         # --------------------
         # Load the config file
         # --------------------
-        with open('config.yaml', 'r', encoding='utf-8') as f:
-            config = yaml.safe_load(f)
-        # --------------------
-        # Initialise the config variables
-        # --------------------
-        self.project_keys = config['ProjectKeys']
-        self.issue_type = config['QueryFilters']['Issue_Type']
-        self.release_type = config['QueryFilters']['Release_Type']
-        self.release_window = config['QueryFilters']['Release_Window']
-        self.issue_fields = config['IssueFields']
+        if config is None:
+            config = load_config()
+        super().__init__(config)
 
-        # --------------------
-        # Initialise the table
-        # --------------------
-        self.final_table = {key: [] for key in self.project_keys}
-        for key in self.final_table:
-            self.final_table[key] = []
+def load_config(path='config.yaml'):
+    """
+    Read and parse the config file.
 
-        # --------------------
-        # Initialise the Confluence client and variables
-        # --------------------
-        self.confluence_report_page_id = config['Confluence']['Report_Page_Id']
-        self.confluence_report_space = config['Confluence']['Report_Space']
-        self.atlassian_url = config['Confluence']['Url']
-        self.atlassian_username = os.getenv(config['Confluence']['Username'])
-        self.atlassian_token = os.getenv(config['Confluence']['Password'])
-
-    def generate_tables(self):
-        """
-        #---------------------
-        # Authenticate the Jira Client
-        #---------------------
-        """
-
-        try:
-            jira_client = JiraClient(
-                self.atlassian_url,
-                self.atlassian_username,
-                self.atlassian_token)
-        except requests.exceptions.HTTPError as http_err:
-            print(f"Error authenticating the Jira client: {http_err}")
-            raise
-        except requests.exceptions.ConnectionError as conn_err:
-            print(f"Error connecting to Jira client {conn_err}")
-            raise
-        except requests.exceptions.Timeout as time_err:
-            print(f"Error: Connection timeout {time_err}")
-            raise
-
-        for key in self.project_keys.keys():
-            self.final_table[key] = {
-                'Release Type': {},
-                'Release Window': {},
-                'Issue Type': {}
-            }
-
-            # Get counts by release type (Major, Minor, Patch, Other)
-            for release in self.release_type:
-                release_type_count = ReleaseMetrics(jira_client, key, 'Release', self.issue_fields, release)
-                self.final_table[key]['Release Type'][release] = release_type_count.jira_issues_count
-            # Get planned vs unplanned counts for releases
-            for window in self.release_window:
-                planned_unplanned_count = ReleaseMetrics(jira_client, key, 'Release', self.issue_fields, None, window)
-                self.final_table[key]['Release Window'][window] = planned_unplanned_count.jira_issues_count
-            # Get story and bug counts
-            for i_type in self.issue_type:
-                issue_type_count = ReleaseMetrics(jira_client, key, i_type, self.issue_fields, None, None)
-                i_type = 'Other' if i_type == 'Empty' else i_type
-                self.final_table[key]['Issue Type'][i_type] = issue_type_count.jira_issues_count
+    Args:
+        path (str, optional): The path of the config file.
 
-        # --------------------
-        # Build the tables using the Chain of Responsibility pattern
-        # --------------------
-        confluence_content = Tables(self.project_keys, self.final_table).get_content
+    Returns:
+        dict: The parsed config.
+    """
+    import yaml  # loaded only when a config file is read
 
-        return confluence_content
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f)
 
-    def post_to_confluence(self, confluence_content):
-        """
-        This method posts to confluecne
-        """
-        # --------------------
-        # Authenticate the Confluence client
-        # --------------------
-        try:
-            confluence = ConfluenceClient(
-                self.atlassian_url,
-                self.atlassian_username,
-                self.atlassian_token)
-
-        except requests.exceptions.HTTPError as http_err:
-            print(f"Error authenticating the Confluence client: {http_err}")
-        except requests.exceptions.ConnectionError as conn_err:
-            print(f"Error connecting to Confluence client {conn_err}")
-        except requests.exceptions.Timeout as time_err:
-            print(f"Error: Connection timeout {time_err}")
+def print_plan(main):
+    """
+    Print the query plan of the run and its estimated cost, without sending any request.
+    """
+    plan = main.plan()
+    print(f"Query plan: {main.collection_mode} mode, {len(main.project_keys)} projects, "
+          f"{len(main.reports)} reports")
+    print(plan.explain())
 
-        # --------------------
-        # Post the tables to Confluence
-        # --------------------
-        confluence.post_confluence_page(self.confluence_report_page_id, self.confluence_report_space, confluence_content)
+def collect_shard(main, index, count, resume=False):
+    """
+    Collect the tables of a shard's projects and write them for the merge step.
+
+    Args:
+        main (Main): The instance created with the shard's config.
+        index (int): The 1-based shard index.
+        count (int): The number of shards.
+        resume (bool, optional): Resume the shard's last checkpoint.
+    """
+    if main.project_keys:
+        main.generate_tables(resume=resume)
+    main.write_shard_tables(index, count)
+    main.clear_checkpoint()
+
+def run_shard(config, index, count, resume=False):
+    """
+    Collect the tables of one shard in a worker process of `--shards`.
+
+    Args:
+        config (dict): The config of the whole run.
+        index (int): The 1-based shard index.
+        count (int): The number of shards.
+        resume (bool, optional): Resume the shard's last checkpoint.
+    """
+    main = Main(shard_config(config, index, count))
+    try:
+        collect_shard(main, index, count, resume)
+    finally:
+        main.write_run_report()
+
+def shard_argument(text):
+    """
+    Parse the --shard argument.
+    """
+    try:
+        return parse_shard(text)
+    except ValueError as value_error:
+        raise argparse.ArgumentTypeError(str(value_error))
+
+def month_argument(text):
+    """
+    Parse a --backfill month, returning it as 'YYYY-MM'.
+    """
+    try:
+        return datetime.strptime(text, '%Y-%m').strftime('%Y-%m')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid month '{text}', expected YYYY-MM")
 
 if __name__ == "__main__":
-    main = Main()
-    content = main.generate_tables()
-    main.post_to_confluence(content)
+    parser = argparse.ArgumentParser(description='Build the release metrics tables and post them to Confluence.')
+    runs = parser.add_mutually_exclusive_group()
+    runs.add_argument('--backfill', nargs=2, type=month_argument, metavar=('START_MONTH', 'END_MONTH'),
+                      help='rebuild the pages of every month from START_MONTH to END_MONTH (YYYY-MM)')
+    parser.add_argument('--profile', nargs='?', const='.cache/profile', metavar='DIR',
+                        help='profile building and posting the tables separately, writing sorted stats, '
+                             'collapsed stacks and a network/CPU breakdown to DIR (default: .cache/profile)')
+    parser.add_argument('--resume', action='store_true',
+                        help="resume the last run's checkpoint, only sending the queries that failed or did not complete")
+    parser.add_argument('--explain', action='store_true',
+                        help='print the query plan of the run, with its estimated requests and pages, before running it')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='print the query plan of the run without sending any request')
+    runs.add_argument('--async', dest='async_run', action='store_true',
+                      help='collect and publish the tables from one event loop, with the async Jira and '
+                           'Confluence clients on a shared connection pool')
+    runs.add_argument('--shard', type=shard_argument, metavar='I/N',
+                      help='collect the I-th of N shards of the projects and write its tables for --merge, '
+                           'without publishing')
+    runs.add_argument('--shards', type=int, metavar='N',
+                      help='collect N shards of the projects in a process pool, then merge and publish their tables')
+    runs.add_argument('--merge', type=int, metavar='N',
+                      help='merge the tables written by the N shards of --shard and publish them')
+    args = parser.parse_args()
+    if args.shards is not None and args.shards < 1 or args.merge is not None and args.merge < 1:
+        parser.error('the number of shards must be at least 1')
+    if args.backfill and args.backfill[0] > args.backfill[1]:
+        parser.error('the backfill END_MONTH must not be before its START_MONTH')
+
+    config = load_config()
+    main = Main(shard_config(config, *args.shard) if args.shard else config)
+    if args.explain or args.dry_run:
+        print_plan(main)
+    if args.dry_run:
+        raise SystemExit(0)
+
+    profiler = None
+    if args.profile:
+        from Profiler import PipelineProfiler
+
+        profiler = PipelineProfiler(args.profile)
+    stage = profiler.profile if profiler else lambda name: nullcontext()
+    try:
+        if args.backfill:
+            with stage('generate_history'):
+                history = main.generate_history(*args.backfill)
+            with stage('post_to_confluence'):
+                main.resolve_confluence_pages(list(history))
+            for (year, month), content in history.items():
+                with stage('post_to_confluence'):
+                    main.post_to_confluence(content, year, month)
+        elif args.shard:
+            with stage('generate_tables'):
+                collect_shard(main, *args.shard, resume=args.resume)
+        elif args.shards or args.merge:
+            if args.shards:
+                with stage('run_shards'):
+                    with ProcessPoolExecutor(args.shards) as pool:
+                        list(pool.map(run_shard, repeat(config), range(1, args.shards + 1), repeat(args.shards),
+                                      repeat(args.resume)))
+            with stage('merge_shards'):
+                content = main.merge_shard_tables(args.shards or args.merge)
+            with stage('post_to_confluence'):
+                main.post_to_confluence(content)
+        elif args.async_run:
+            with stage('run_async'):
+                asyncio.run(main.run_async(resume=args.resume))
+            main.clear_checkpoint()
+        else:
+            with stage('generate_tables'):
+                content = main.generate_tables(resume=args.resume)
+            with stage('post_to_confluence'):
+                main.post_to_confluence(content)
+            main.clear_checkpoint()
+    finally:
+        main.write_run_report()
+        if profiler:
+            profiler.write_summary()
@@ -1,59 +1,95 @@
 import os
 import calendar
 from datetime import datetime
-import yaml
 import requests
-import pandas as pd
-from atlassian import Jira, Confluence
+from AtlassianService.Session import create_session
+from AtlassianService.ConfluenceService import DEFAULT_HEADINGS
+from AtlassianService.StorageFormat import render_page
+from AtlassianService.JQLQuery import fixversion_clause
+from AtlassianService.JiraService import COUNT_PAGE_SIZE
 import pytz
 
+# Page the info banner at the top of the monthly page links to
+DATA_GATHERING_PAGE = '[EART] Release Metrics - Data Gathering Process'
+
 # Specify the Auckland time zone
 time_zone = pytz.timezone('Pacific/Auckland')
 
-# Get the current date
-current_datetime = datetime.now(time_zone)
-current_date = current_datetime.date()
-current_month = current_date.month
-current_year = current_date.year
-
-print("current date: ", current_date)
-print("current date & time: ", current_datetime)
-
-#------------------------------------------
-# Load config file and initialise config variables
-#------------------------------------------
-
-with open('config.yaml', 'r', encoding='utf-8') as file:
-    config = yaml.safe_load(file)
-
-project_keys = config['ProjectKeys']
-issue_type = config['QueryFilters']['Issue_Type']
-release_type = config['QueryFilters']['Release_Type']
-release_window = config['QueryFilters']['Release_Window']
-issue_fields = config['IssueFields']
-confluence_report_page_id = config['AtlassianVariables']['Report_Page_Id']
-confluence_report_space = config['AtlassianVariables']['Report_Space']
-
-# Atlassian config variables
-atlassian_url = config['AtlassianVariables']['Url']
-atlassian_username = os.getenv(config['AtlassianVariables']['Username'])
-atlassian_token = os.getenv(config['AtlassianVariables']['Password'])
-
-#--------------------------------------
-# Initialise Jira and Confluence client
-#--------------------------------------
-
-jira = Jira(
-    url = atlassian_url,
-    username = atlassian_username,
-    password = atlassian_token
-)
-
-confluence = Confluence(
-    url = atlassian_url,
-    username = atlassian_username,
-    password = atlassian_token
-)
+# Module state, set by initialise() rather than at import time, so that importing
+# this module reads no file and creates no client
+current_datetime = current_date = current_month = current_year = None
+config = project_keys = issue_type = release_type = release_window = issue_fields = None
+confluence_report_page_id = confluence_report_space = None
+atlassian_url = atlassian_username = atlassian_token = None
+session = jira = confluence = None
+released_versions = {}
+
+def initialise(parsed_config):
+    """
+    Initialise the current date, the config variables and the Jira and Confluence clients.
+
+    Args:
+        parsed_config (dict): The parsed config.yaml.
+    """
+    from atlassian import Jira, Confluence  # loaded only when the clients are created
+
+    global current_datetime, current_date, current_month, current_year
+    global config, project_keys, issue_type, release_type, release_window, issue_fields
+    global confluence_report_page_id, confluence_report_space
+    global atlassian_url, atlassian_username, atlassian_token
+    global session, jira, confluence
+
+    # Get the current date
+    current_datetime = datetime.now(time_zone)
+    current_date = current_datetime.date()
+    current_month = current_date.month
+    current_year = current_date.year
+
+    print("current date: ", current_date)
+    print("current date & time: ", current_datetime)
+
+    #------------------------------------------
+    # Initialise config variables
+    #------------------------------------------
+
+    config = parsed_config
+    project_keys = config['ProjectKeys']
+    issue_type = config['QueryFilters']['Issue_Type']
+    release_type = config['QueryFilters']['Release_Type']
+    release_window = config['QueryFilters']['Release_Window']
+    issue_fields = config['IssueFields']
+    confluence_report_page_id = config['AtlassianVariables']['Report_Page_Id']
+    confluence_report_space = config['AtlassianVariables']['Report_Space']
+
+    # Atlassian config variables
+    atlassian_url = config['AtlassianVariables']['Url']
+    atlassian_username = os.getenv(config['AtlassianVariables']['Username'])
+    atlassian_token = os.getenv(config['AtlassianVariables']['Password'])
+
+    #--------------------------------------
+    # Initialise Jira and Confluence client
+    #--------------------------------------
+
+    # One connection-pooled session with retries, shared by both clients
+    session = create_session(
+        config['Http']['Pool_Size'],
+        config['Http']['Max_Retries'],
+        config['Http']['Backoff_Factor'],
+        config['Http']['Backoff_Jitter'])
+
+    jira = Jira(
+        url = atlassian_url,
+        username = atlassian_username,
+        password = atlassian_token,
+        session = session
+    )
+
+    confluence = Confluence(
+        url = atlassian_url,
+        username = atlassian_username,
+        password = atlassian_token,
+        session = session
+    )
 
 #--------------
 # Functions
@@ -92,13 +128,28 @@ def create_metric_tables():
 
 def get_metric_count(project_key, i_type, r_type, r_window):
     query = update_jql_query(project_key, i_type, r_type, r_window)
-    issues = jira.jql(query, fields=['key'], limit=1)
-    return issues['total']
+    # The token-paginated search endpoint has no total: count the keys of its pages
+    url = jira.resource_url('search/jql', api_version=3)
+    params = {'jql': query, 'fields': 'key', 'maxResults': COUNT_PAGE_SIZE}
+    total = 0
+    while True:
+        page = jira.get(url, params=params)
+        total += len(page['issues'])
+        if not page['issues'] or not page.get('nextPageToken'):
+            return total
+        params = {**params, 'nextPageToken': page['nextPageToken']}
+
+def get_released_versions(project_key):
+    # Fetched once per project, so the queries name the released versions instead of calling releasedVersions()
+    if project_key not in released_versions:
+        released_versions[project_key] = [
+            str(version['id']) for version in jira.get_project_versions(project_key) if version.get('released')]
+    return released_versions[project_key]
 
 def update_jql_query(project_key, i_type, r_type, r_window):
     i_type = 'Empty' if i_type == 'Other' else i_type
     base_query = (
-    f'fixversion in releasedVersions("{project_key}") AND '
+    f'{fixversion_clause(project_key, get_released_versions(project_key))} AND '
     f'issuetype in ({i_type}) AND '
     f'(resolved > startOfMonth() AND resolved < endOfMonth()) AND '
     f'fixversion != EMPTY')
@@ -110,6 +161,8 @@ def update_jql_query(project_key, i_type, r_type, r_window):
     return base_query
 
 def format_table_content(tables):
+    import pandas as pd  # loaded only when the tables are formatted
+
     # Initialise Farmatted Table Dictionary
     formatted_dict = {}
     print(f'Unformatted Table:\n f{tables}')
@@ -144,28 +197,19 @@ def format_table_content(tables):
 def post_to_confluence(tables):
     month_name = calendar.month_name[current_month]
     month_page_name = f"{current_year} - {month_name} Release Metrics"
-    monthly_page_exists = confluence.page_exists(title=month_page_name, space=confluence_report_space)
-    data_gathering_banner = '<ac:structured-macro ac:name="info" ac:schema-version="1" ac:macro-id="904c012c-b588-4a92-95ca-ce5da83125a8"><ac:rich-text-body><p>If you wanted to learn more about the data gathering process for each table, you could check this page <ac:link ac:card-appearance="inline"><ri:page ri:content-title="[EART] Release Metrics - Data Gathering Process" ri:version-at-save="38" /><ac:link-body>[EART] Release Metrics - Data Gathering Process</ac:link-body></ac:link>.</p></ac:rich-text-body></ac:structured-macro>'
+    # One lookup by title, returning None when the page does not exist yet
+    monthly_page = confluence.get_page_by_title(
+        title=month_page_name,
+        space=confluence_report_space)
+
+    # Render the banner and all tables with headers, for both creating and updating the page
+    html = render_page(tables, DEFAULT_HEADINGS, DATA_GATHERING_PAGE)
 
-    if monthly_page_exists:
-        monthly_page = confluence.get_page_by_title(
-            title=month_page_name,
-            space=confluence_report_space)
+    if monthly_page:
         monthly_page_id = monthly_page['id']
         print(f"Monthly page already exists: {monthly_page_id}. Updating the data now...")
 
         try:
-            # Create HTML for all tables with headers
-            html = data_gathering_banner
-            html += '<h2>Release Metrics</h2>'
-            html += tables['Release Type'].to_html()
-
-            html += '<h2>Planned/Unplanned Releases</h2>'
-            html += tables['Planned/Unplanned'].to_html()
-
-            html += '<h2>Story/Bug Breakdown</h2>'
-            html += tables['Story/Bug'].to_html()
-
             # Update the Confluence page with the new content
             confluence.update_existing_page(
                 page_id=monthly_page_id,
@@ -179,17 +223,6 @@ def post_to_confluence(tables):
         print(f"Monthly page does not exist: {month_page_name}. Creating a new page now...")
 
         try:
-            # Create HTML for all tables with headers
-            html = data_gathering_banner
-            html += '<h2>Release Metrics</h2>'
-            html += tables['Release Type'].to_html()
-
-            html += '<h2>Planned/Unplanned Releases</h2>'
-            html += tables['Planned/Unplanned'].to_html()
-
-            html += '<h2>Story/Bug Breakdown</h2>'
-            html += tables['Story/Bug'].to_html()
-
             # Create the new page
             confluence.create_page(
                 space=confluence_report_space,
@@ -208,6 +241,10 @@ def post_to_confluence(tables):
 #-------------------
 
 if __name__ == '__main__':
+    import yaml
+
+    with open('config.yaml', 'r', encoding='utf-8') as file:
+        initialise(yaml.safe_load(file))
     unformatted_table = create_metric_tables()
     formatted_tables = format_table_content(unformatted_table)
     post_to_confluence(formatted_tables)
\ No newline at end of file
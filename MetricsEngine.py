@@ -0,0 +1,813 @@
+"""
+metrics_engine
+
+Collects the release metrics, builds the report tables and posts them to Confluence.
+
+Importing this module has no side effects and does not load pandas or the
+atlassian library; they are loaded when the tables are formatted and when the
+clients connect. The config is taken already parsed, e.g.:
+
+    engine = MetricsEngine(config)
+    engine.post_to_confluence(engine.generate_tables())
+"""
+import os
+import json
+import hashlib
+from datetime import datetime, timedelta
+from functools import partial
+import pytz
+import requests
+from Tables import Tables
+from AtlassianService.JiraService import JiraClient
+from AtlassianService.ConfluenceService import ConfluenceClient, month_page_title, APPROXIMATE_COUNTS_NOTE
+from AtlassianService.JQLQuery import JQLQuery
+from AtlassianService.Session import create_session
+from AtlassianService.RateLimiter import RateLimiter
+from AtlassianService.PublishCache import PublishCache
+from AtlassianService.ResultCache import ResultCache
+from AtlassianService.VersionIndex import VersionIndex
+from ProjectMetrics import RELEASE_ISSUE_TYPE
+from IssueDataset import IssueDataset, CountTable
+from CrossTab import CrossTab, count_crosstabs
+from IssueStore import IssueStore, month_bounds
+from HistoryMetrics import HistoryMetrics, month_range
+from QueryExecutor import QueryExecutor
+from QueryPlanner import QueryPlanner
+from ChangeDetection import ChangeDetection
+from AsyncRun import AsyncRun
+from ChangeProbe import ChangeProbe
+from Checkpoint import Checkpoint
+from Sharding import ShardTables
+from Instrumentation import Instrumentation
+
+class MetricsEngine(QueryPlanner, ChangeDetection, AsyncRun, ShardTables):
+    """
+    This class is the engine of the project, usable as a library.
+    It initialises the config, table, and confluence client from a parsed config.
+    It also generates the tables and posts them to confluence.
+    Creating it sends no request; the clients connect when they are first used.
+    The query planning, change probing, async run and sharded run are in their own modules.
+    """
+    def __init__(self, config):
+        # --------------------
+        # Initialise the config variables
+        # --------------------
+        self.project_keys = config['ProjectKeys']
+        self.issue_type = config['QueryFilters']['Issue_Type']
+        self.issue_fields = config['IssueFields']
+        self.dimensions = config['Dimensions']
+        self.reports = [CrossTab.from_config(name, report) for name, report in config['Reports'].items()]
+        self.dimension_fields = self.__dimension_fields()
+        self.collection_mode = config['Collection']['Mode']
+        self.page_size = config['Collection']['Page_Size']
+        self.max_workers = config['Collection']['Max_Workers']
+        self.time_zone = pytz.timezone(config['Collection']['Time_Zone'])
+        self.merge_queries = config['Collection']['Merge_Queries']
+        self.count_method = config['Collection']['Count_Method']
+        if self.count_method not in ('exact', 'approximate', 'auto'):
+            raise ValueError(f"Unknown Count_Method {self.count_method!r}: expected exact, approximate or auto")
+        if self.count_method != 'exact' and self.collection_mode != 'count':
+            print(f"Ignoring Count_Method {self.count_method!r}: only the count mode sends count queries, "
+                  f"the {self.collection_mode} mode counts the issues it collects")
+        self.approximate_counts = self.__approximate_counts()
+        self.query_plan = None
+        self.cell_reports = None
+        self.collection_errors = {}
+        self.failed_projects = set()
+        self.failed_pages = []
+
+        # --------------------
+        # Initialise the HTTP session shared by the Jira and Confluence clients
+        # --------------------
+        self.rate_limiter = RateLimiter(
+            config['RateLimit']['Rate'],
+            config['RateLimit']['Min_Rate'],
+            config['RateLimit']['Max_Rate'],
+            config['RateLimit']['Burst'],
+            config['RateLimit']['Increase'],
+            config['RateLimit']['Decrease'])
+        self.session = create_session(
+            config['Http']['Pool_Size'],
+            config['Http']['Max_Retries'],
+            config['Http']['Backoff_Factor'],
+            config['Http']['Backoff_Jitter'],
+            self.rate_limiter,
+            config['RateLimit']['Max_Throttle_Retries'])
+        self.max_retries = config['Http']['Max_Retries']
+        self.backoff_factor = config['Http']['Backoff_Factor']
+        self.backoff_jitter = config['Http']['Backoff_Jitter']
+        self.max_throttle_retries = config['RateLimit']['Max_Throttle_Retries']
+        self.async_max_connections = config['Async']['Max_Connections']
+
+        # --------------------
+        # Initialise the run instrumentation, observing every request of the session
+        # --------------------
+        self.instrumentation = Instrumentation()
+        self.instrumentation.attach(self.session)
+        self.report_path = config['Instrumentation']['Report_Path']
+        self.prometheus_path = config['Instrumentation']['Prometheus_Path']
+
+        # --------------------
+        # Initialise the local issue store variables
+        # --------------------
+        self.store_path = config['Store']['Path']
+        self.store_full_sync_hours = config['Store']['Full_Sync_Hours']
+
+        # --------------------
+        # Initialise the change probe, reusing the results of the projects unchanged since the last run
+        # --------------------
+        self.change_probe = None
+        if config['ChangeProbe']['Path']:
+            self.change_probe = ChangeProbe(config['ChangeProbe']['Path'], config['ChangeProbe']['Max_Age_Hours'])
+
+        # --------------------
+        # Initialise the checkpoint of the collection, to resume a failed run
+        # --------------------
+        self.checkpoint = Checkpoint(config['Checkpoint']['Path']) if config['Checkpoint']['Path'] else None
+        self.restored_results = {}
+
+        # --------------------
+        # Initialise the cache of the Jira query results, within the run and across runs
+        # --------------------
+        self.result_cache = ResultCache(
+            self.time_zone,
+            config['ResultCache']['Memory_Entries'],
+            config['ResultCache']['Path'] or None,
+            config['ResultCache']['Max_Age_Minutes'],
+            config['ResultCache']['Max_Size_MB'])
+
+        # --------------------
+        # Initialise the index of the released fix versions, named by id in the queries
+        # --------------------
+        self.version_index = None
+        if config['Versions']['Index']:
+            self.version_index = VersionIndex(config['Versions']['Path'] or None, config['Versions']['Max_Age_Minutes'])
+
+        # --------------------
+        # Initialise the table
+        # --------------------
+        self.final_table = {}
+
+        # --------------------
+        # Initialise the partial tables of a sharded run
+        # --------------------
+        self.partial_path = config['Sharding']['Partial_Path']
+
+        # --------------------
+        # Initialise the Confluence client and variables
+        # --------------------
+        self.confluence_report_page_id = config['AtlassianVariables']['Report_Page_Id']
+        self.confluence_report_space = config['AtlassianVariables']['Report_Space']
+        self.atlassian_url = config['AtlassianVariables']['Url']
+        self.atlassian_username = os.getenv(config['AtlassianVariables']['Username'])
+        self.atlassian_token = os.getenv(config['AtlassianVariables']['Password'])
+        self.publish_cache = PublishCache(config['Publish']['Cache_Path'] or None)
+        self.banner_page = config['Publish']['Banner_Page']
+        self.confluence = None
+
+    def generate_tables(self, resume=False):
+        """
+        Collect the counts of the current month and build the tables.
+
+        The results of the queries are written to the checkpoint, if configured, as
+        they complete, except in store mode, whose issue store already keeps them.
+
+        Args:
+            resume (bool, optional): Restore the results of the last run's checkpoint
+                of the same month and reports, and only send the queries that failed
+                or did not complete.
+        """
+        with self.instrumentation.span('generate_tables', mode=self.collection_mode):
+            jira_client = self.__authenticate_jira()
+            self.__load_versions(jira_client)
+
+            now = datetime.now(self.time_zone)
+            month = (now.year, now.month)
+            if self.collection_mode != 'store':
+                self._start_checkpoint(month, resume)
+            if self.collection_mode == 'count':
+                self.__collect_by_cell(jira_client, month)
+                self.approximate_counts = jira_client.approximate_counts
+            else:
+                if self.collection_mode == 'store':
+                    dataset = self.__collect_from_store(jira_client, month)
+                elif self.collection_mode == 'portfolio':
+                    dataset = self.__collect_portfolio(jira_client, month)
+                else:
+                    dataset = self.__collect_by_project(jira_client, month)
+                with self.instrumentation.span('count_tables'):
+                    self.final_table = self._count_tables(dataset)[month]
+            confluence_content = self._build_tables()
+        self._report_throttling()
+
+        return confluence_content
+
+    def __approximate_counts(self):
+        """
+        Whether the count queries of the run use Jira's approximate counts: always with
+        the "approximate" Count_Method, and with "auto" except on the last day of the
+        month in the Jira user's time zone, whose run publishes the month-end report.
+        """
+        if self.collection_mode != 'count' or self.count_method == 'exact':
+            return False
+        if self.count_method == 'approximate':
+            return True
+        today = datetime.now(self.time_zone).date()
+        return (today + timedelta(days=1)).month == today.month
+
+    def __load_versions(self, jira_client):
+        """
+        Fetch the versions of the projects missing from the version index, or older
+        than its maximum age, with one request per project, and index the released ones.
+        """
+        if self.version_index is None:
+            return
+        tasks = {
+            key: self.instrumentation.timed(
+                partial(jira_client.get_project_versions, key), 'version_index', project=key)
+            for key in self.version_index.stale(self.project_keys.keys())
+        }
+        self._index_versions(self._run_queries(tasks))
+
+    def _index_versions(self, versions):
+        """
+        Index the fetched versions of each project and save the version index.
+
+        The queries of a project whose versions could not be fetched call
+        releasedVersions() instead. The query plan is compiled again, e.g. after
+        an explain, with the released versions of the index.
+
+        Args:
+            versions (dict): The versions of each project, None for the failed ones.
+        """
+        for key, project_versions in versions.items():
+            self.version_index.update(key, project_versions)
+        if versions:
+            self.version_index.save()
+        self.query_plan = None
+
+    def _released_versions(self, project_keys):
+        """
+        The ids of the released fix versions of a project, or of a list of projects.
+
+        Returns:
+            list: The version ids, or None without the version index or when the
+            versions of a project are not indexed, for the queries to call releasedVersions().
+        """
+        if self.version_index is None:
+            return None
+        return self.version_index.released_ids(project_keys)
+
+    def _build_tables(self):
+        """
+        Build the Confluence content of the final table.
+
+        Returns:
+            dict: The confluence content.
+        """
+        # --------------------
+        # Build the tables using the Chain of Responsibility pattern
+        # --------------------
+        with self.instrumentation.span('tables'):
+            return Tables(self.project_keys, self.final_table, [report.name for report in self.reports]).get_content
+
+    def _start_checkpoint(self, month, resume):
+        """
+        Start the checkpoint of the month's collection, if configured, restoring the
+        results of the last run's checkpoint when resuming.
+        """
+        if self.checkpoint is None:
+            return
+        definition = self._cell_reports() if self.collection_mode == 'count' else self.dimension_fields
+        self.restored_results = self.checkpoint.start(self._result_scope(month, definition, 'checkpoint'), resume)
+
+    def _task_key(self, query):
+        """
+        The key of a planned query's task and checkpointed result: the kind and JQL of
+        a count-mode query, the project of a search, or the projects of a portfolio search.
+        """
+        if self.collection_mode == 'count':
+            return (query.kind, query.jql)
+        if query.project is None:
+            return tuple(self.project_keys.keys())
+        return query.project
+
+    def generate_history(self, start_month, end_month):
+        """
+        Collect the counts of a range of months in one sweep per project and build
+        the tables of every month.
+
+        Args:
+            start_month (str): The first month, as 'YYYY-MM'.
+            end_month (str): The last month, as 'YYYY-MM'.
+
+        Returns:
+            dict: The confluence content of each month, keyed by (year, month).
+        """
+        jira_client = self.__authenticate_jira()
+        self.__load_versions(jira_client)
+        months = month_range(start_month, end_month)
+        tasks = {
+            key: self.instrumentation.timed(
+                partial(
+                    HistoryMetrics,
+                    jira_client,
+                    key,
+                    self.issue_type,
+                    self.dimension_fields,
+                    months,
+                    self.time_zone,
+                    self.page_size,
+                    self._released_versions(key)),
+                'history_metrics',
+                project=key)
+            for key in self.project_keys.keys()
+        }
+
+        dataset = self.__create_dataset(months)
+        for key, history_metrics in self._run_queries(tasks).items():
+            if history_metrics is None:
+                self.failed_projects.add(key)
+                continue
+            for month, issues in history_metrics.issues.items():
+                dataset.add_issues(self.dimension_fields, issues, Project=key, Month=month)
+
+        self._report_throttling()
+        report_names = [report.name for report in self.reports]
+        with self.instrumentation.span('count_tables'):
+            final_tables = self._count_tables(dataset)
+        with self.instrumentation.span('tables'):
+            return {
+                month: Tables(self.project_keys, final_table, report_names).get_content
+                for month, final_table in final_tables.items()
+            }
+
+    def __authenticate_jira(self):
+        """
+        #---------------------
+        # Authenticate the Jira Client
+        #---------------------
+        """
+        try:
+            jira_client = JiraClient(
+                self.atlassian_url,
+                self.atlassian_username,
+                self.atlassian_token,
+                raise_errors=True,
+                session=self.session,
+                instrumentation=self.instrumentation,
+                result_cache=self.result_cache,
+                approximate_counts=self.approximate_counts)
+        except requests.exceptions.HTTPError as http_err:
+            print(f"Error authenticating the Jira client: {http_err}")
+            raise
+        except requests.exceptions.ConnectionError as conn_err:
+            print(f"Error connecting to Jira client {conn_err}")
+            raise
+        except requests.exceptions.Timeout as time_err:
+            print(f"Error: Connection timeout {time_err}")
+            raise
+
+        return jira_client
+
+    def __collect_by_cell(self, jira_client, month):
+        """
+        Fill the final table by running the count mode's query plan: one count query
+        per distinct table cell, or one shared search counted locally for the
+        projects whose cells were merged.
+
+        Only the reports counting one of the CELL_DIMENSIONS by Project, filtered
+        at most by issue type, can be counted this way; the others are skipped.
+        The counts of the projects unchanged since the last run are reused.
+        """
+        cell_reports = self._cell_reports()
+        plan = self.plan()
+        fingerprints, reused = self._probe_changes(jira_client, month, cell_reports)
+        tasks = {}
+        for query in plan.queries:
+            if query.project in reused:
+                continue
+            operation = 'release_metrics' if query.kind == 'count' else 'project_metrics'
+            tasks[(query.kind, query.jql)] = self.instrumentation.timed(
+                partial(query.run, jira_client), operation, project=query.project, cells=len(query.consumers))
+
+        self._fill_cells(month, plan, self._run_queries(tasks, checkpoint=True), reused, fingerprints)
+
+    def _fill_cells(self, month, plan, results, reused, fingerprints):
+        """
+        Fill the final table with the results of the count mode's query plan.
+
+        Args:
+            month (tuple): The (year, month) of the collected issues.
+            plan (QueryPlan): The count mode's query plan.
+            results (dict): The results of the queries sent, keyed by kind and JQL.
+            reused (dict): The saved counts of the projects unchanged since the last run.
+            fingerprints (dict): The fingerprints returned by `_probe_changes`, empty
+                when the changes were not probed.
+        """
+        cell_reports = self._cell_reports()
+        cell_counts = {}
+        for query in plan.queries:
+            if (query.kind, query.jql) not in results:
+                continue
+            result = results[(query.kind, query.jql)]
+            if query.kind == 'count':
+                cell_counts.update(dict.fromkeys(query.consumers, result))
+            else:
+                cell_counts.update(self.__count_cells(query.project, cell_reports, result))
+
+        project_counts = dict(reused)
+        collected = {}
+        for key in self.project_keys.keys():
+            if key in reused:
+                continue
+            project_counts[key] = {
+                name: {value: cell_counts[(key, name, value)] for value in values}
+                for name, (dimension, values, issue_type) in cell_reports.items()
+            }
+            complete = all(
+                count is not None for counts in project_counts[key].values() for count in counts.values())
+            collected[key] = project_counts[key] if complete else None
+        if fingerprints:
+            self._save_probe(month, cell_reports, fingerprints, collected)
+
+        self.final_table = {}
+        for name, (dimension, values, issue_type) in cell_reports.items():
+            labels = self.dimensions[dimension].get('Labels', {})
+            counts = [
+                [
+                    float('nan') if project_counts[key][name][value] is None
+                    else project_counts[key][name][value]
+                    for key in self.project_keys.keys()
+                ]
+                for value in values
+            ]
+            self.final_table[name] = CountTable(
+                [str(labels.get(value, value)) for value in values],
+                self.project_keys.values(),
+                counts)
+
+    def __count_cells(self, key, cell_reports, issues):
+        """
+        Count the table cells of a project locally from the issues of its shared search.
+
+        Args:
+            key (str): The project key.
+            cell_reports (dict): The dimension, values and issue types of each report.
+            issues (list): The issues projected on the cell fields, or None if the search failed.
+
+        Returns:
+            dict: The count of each (project, report, value) cell, None if the search failed.
+        """
+        fields = list(self._cell_fields(cell_reports))
+        issue_type_index = fields.index('Issue Type')
+        counts = {}
+        for name, (dimension, values, report_issue_type) in cell_reports.items():
+            index = fields.index(dimension)
+            for value in values:
+                cell_issue_type, _, _ = self._cell_filters(dimension, value, report_issue_type)
+                issue_types = cell_issue_type.split(', ')
+                counts[(key, name, value)] = None if issues is None else sum(
+                    1 for issue in issues if issue[issue_type_index] in issue_types and issue[index] == value)
+        return counts
+
+    def __collect_by_project(self, jira_client, month):
+        """
+        Collect the issues with one paginated search per project, so that they can
+        be counted locally instead of sending a count query per table cell.
+
+        Returns:
+            IssueDataset: The issues of every project.
+        """
+        fingerprints, reused = self._probe_changes(jira_client, month, self.dimension_fields)
+        tasks = {
+            query.project: self.instrumentation.timed(
+                partial(query.run, jira_client), 'project_metrics', project=query.project)
+            for query in self.plan().queries
+            if query.project not in reused
+        }
+
+        collected = self._run_queries(tasks, checkpoint=True)
+        self._save_probe(month, self.dimension_fields, fingerprints, collected)
+        return self._project_dataset(month, {**reused, **collected})
+
+    def __collect_portfolio(self, jira_client, month):
+        """
+        Collect the issues with one paginated search covering every project,
+        split locally by project.
+
+        Returns:
+            IssueDataset: The issues of every project.
+        """
+        fingerprints, reused = self._probe_changes(
+            jira_client, month, self.dimension_fields, per_project=False)
+        project_issues = reused
+        if len(reused) < len(self.project_keys):
+            query = self.plan().queries[0]
+            tasks = {
+                tuple(self.project_keys.keys()): self.instrumentation.timed(
+                    partial(query.run, jira_client), 'portfolio_metrics')
+            }
+            project_issues = next(iter(self._run_queries(tasks, checkpoint=True).values()))
+            if project_issues is None:
+                project_issues = dict.fromkeys(self.project_keys.keys())
+            self._save_probe(month, self.dimension_fields, fingerprints, project_issues)
+        return self._project_dataset(month, project_issues)
+
+    def _project_dataset(self, month, project_issues):
+        """
+        Create the dataset of the month's issues collected for each project.
+
+        Args:
+            month (tuple): The (year, month) of the issues.
+            project_issues (dict): The projected issues keyed by project, None for
+                the projects that failed.
+
+        Returns:
+            IssueDataset: The issues of every project.
+        """
+        dataset = self.__create_dataset([month])
+        for key in self.project_keys.keys():
+            issues = project_issues.get(key)
+            if issues is None:
+                self.failed_projects.add(key)
+            else:
+                dataset.add_issues(self.dimension_fields, issues, Project=key, Month=month)
+        return dataset
+
+    def __collect_from_store(self, jira_client, month):
+        """
+        Sync the local issue store with the issues updated since the last run and
+        collect the month's issues from the store.
+
+        Returns:
+            IssueDataset: The issues of every project.
+        """
+        issue_store = IssueStore(self.store_path, self.dimension_fields, self.store_full_sync_hours)
+        project_keys = list(self.project_keys.keys())
+        query = JQLQuery(
+            project_keys, ', '.join([RELEASE_ISSUE_TYPE, *self.issue_type]), self.issue_fields,
+            released_versions=self._released_versions(project_keys))
+        tasks = {
+            tuple(project_keys): self.instrumentation.timed(
+                partial(
+                    jira_client.sync_issues,
+                    issue_store,
+                    project_keys,
+                    query.get_sync_query(),
+                    query.get_jql_query(),
+                    self.time_zone,
+                    self.page_size),
+                'store_sync')
+        }
+        self._run_queries(tasks)
+
+        dataset = self.__create_dataset([month])
+        start, end = month_bounds(*month, self.time_zone)
+        for key in project_keys:
+            dataset.add_issues(
+                self.dimension_fields, issue_store.get_issues(key, start, end), Project=key, Month=month)
+        issue_store.close()
+        return dataset
+
+    def _result_scope(self, month, definition, key):
+        """
+        The scope of a project's results, of all the projects for '*', or of the
+        run's checkpoint for 'checkpoint'.
+
+        Returns:
+            str: A digest of the collection mode, the month, the result definition,
+            the issue types and the project, and whether the counts are approximate.
+        """
+        scope = [self.collection_mode, month, definition, self.issue_type, key]
+        if self.approximate_counts:
+            scope.append('approximate')
+        scope = json.dumps(scope, sort_keys=True)
+        return hashlib.sha1(scope.encode('utf-8')).hexdigest()
+
+    def __dimension_fields(self):
+        """
+        The Jira field of every dimension used by the reports, besides the project.
+
+        Returns:
+            dict: The fields keyed by dimension, in the order of the projected issue tuples.
+
+        Raises:
+            ValueError: If a report uses a dimension that is not configured.
+        """
+        dimension_fields = {}
+        for report in self.reports:
+            for dimension in report.dimensions:
+                if dimension == 'Project':
+                    continue
+                if dimension not in self.dimensions:
+                    raise ValueError(f"Report {report.name} uses the unknown dimension {dimension}")
+                dimension_fields[dimension] = self.dimensions[dimension]['Field']
+        return dimension_fields
+
+    def __create_dataset(self, months):
+        """
+        Create an empty issue dataset with the configured values as vocabularies.
+
+        The values of a Released dimension are the names of the versions released
+        since the first month, from the version index, so the fix versions not
+        released yet are not counted. Dimensions without values collect every
+        value they see.
+
+        Args:
+            months (list): The (year, month) tuples the issues are resolved in.
+
+        Returns:
+            IssueDataset: The empty dataset.
+        """
+        vocabularies = {'Project': self.project_keys.keys(), 'Month': months}
+        open_dimensions = []
+        for dimension in self.dimension_fields:
+            if self.dimensions[dimension].get('Released') and self.version_index is not None:
+                year, month = months[0]
+                vocabularies[dimension] = self.version_index.released_names(
+                    self.project_keys.keys(), since=f'{year:04d}-{month:02d}-01')
+                continue
+            vocabularies[dimension] = self.dimensions[dimension].get('Values') or []
+            if not vocabularies[dimension]:
+                open_dimensions.append(dimension)
+        return IssueDataset(
+            vocabularies,
+            open_dimensions=open_dimensions,
+            multi_valued=[
+                dimension for dimension in self.dimension_fields
+                if self.dimensions[dimension].get('Multiple')
+            ])
+
+    def _count_tables(self, dataset):
+        """
+        Count every report of every month of the dataset.
+
+        The columns of the projects that could not be collected are left empty.
+
+        Args:
+            dataset (IssueDataset): The collected issues.
+
+        Returns:
+            dict: The tables of each month, keyed by (year, month) and then by report name.
+        """
+        labels = {'Project': self.project_keys}
+        for dimension in self.dimension_fields:
+            labels[dimension] = self.dimensions[dimension].get('Labels', {})
+        return count_crosstabs(
+            dataset, self.reports, 'Month', labels, missing={'Project': self.failed_projects})
+
+    def _run_queries(self, tasks, checkpoint=False):
+        """
+        Run the query tasks concurrently and record the errors of the failed ones.
+
+        Args:
+            tasks (dict): Callables sending the Jira requests, keyed by table cell or project.
+            checkpoint (bool, optional): Restore the results of the tasks from the run's
+                checkpoint, if any, and record the others in it as they complete.
+
+        Returns:
+            dict: The task results in the same key order as `tasks`, with None for failed tasks.
+        """
+        restored = self._restored(tasks) if checkpoint else {}
+        executor = QueryExecutor(self.max_workers)
+        results = executor.run(
+            {key: task for key, task in tasks.items() if key not in restored},
+            on_result=self.checkpoint.record if checkpoint and self.checkpoint is not None else None)
+        for key, error in executor.errors.items():
+            print(f"Failed to collect {key}: {error}")
+        self.collection_errors.update(executor.errors)
+        results.update(restored)
+        return {key: results[key] for key in tasks}
+
+    def _restored(self, tasks):
+        """
+        The results of the tasks restored from the run's checkpoint, if any.
+
+        Returns:
+            dict: The restored results, keyed by task key.
+        """
+        if self.checkpoint is None or self.checkpoint.scope is None:
+            return {}
+        return {key: self.restored_results[str(key)] for key in tasks if str(key) in self.restored_results}
+
+    def _report_throttling(self):
+        """
+        Print how long the requests waited for the rate limiter, and how many results were cached.
+        """
+        print(f"Throttled for {self.rate_limiter.throttled_seconds:.1f}s of request time, "
+              f"{self.rate_limiter.throttled_responses} rate-limited responses, "
+              f"final rate {self.rate_limiter.rate:.1f} requests/s")
+        stats = self.result_cache.stats()
+        print(f"Result cache: {stats['hits']} memory hits, {stats['disk_hits']} disk hits, "
+              f"{stats['misses']} misses, {stats['evictions']} evictions")
+
+    def write_run_report(self):
+        """
+        Write the JSON run report and the Prometheus textfile of the run, where configured.
+        """
+        if self.report_path:
+            self.instrumentation.write_json(
+                self.report_path,
+                mode=self.collection_mode,
+                failed_projects=sorted(self.failed_projects),
+                errors={str(key): str(error) for key, error in self.collection_errors.items()},
+                failed_pages=self.failed_pages,
+                throttled_seconds=self.rate_limiter.throttled_seconds,
+                throttled_responses=self.rate_limiter.throttled_responses,
+                result_cache=self.result_cache.stats(),
+                counts='approximate' if self.approximate_counts else 'exact')
+            print(f"Run report written to {self.report_path}")
+        if self.prometheus_path:
+            self.instrumentation.write_prometheus(self.prometheus_path, mode=self.collection_mode)
+
+    def clear_checkpoint(self):
+        """
+        Remove the checkpoint once the tables are published, unless some queries
+        failed, so that the run can still be resumed to fill their cells, or a
+        page could not be written, so that it can be published again from the
+        checkpoint without querying Jira.
+        """
+        if self.checkpoint is None or self.checkpoint.scope is None:
+            return
+        if self.collection_errors or self.failed_projects:
+            print(f"Keeping the checkpoint {self.checkpoint.path}: rerun with --resume to collect the failed queries")
+            return
+        if self.failed_pages:
+            print(f"Keeping the checkpoint {self.checkpoint.path}: rerun with --resume to publish the tables again")
+            return
+        self.checkpoint.clear()
+
+    def post_to_confluence(self, confluence_content, year=None, month=None):
+        """
+        This method posts to confluecne, on the page of the current month in the
+        Jira user's time zone or on the page of the given year and month.
+
+        Returns:
+            bool: Whether the page was written, or was already up to date. The title
+                of a page that could not be written is added to `failed_pages`.
+        """
+        confluence = self.__authenticate_confluence()
+
+        # The current page is of the month the issues are collected in, in the Jira user's time zone
+        current = year is None
+        if current:
+            now = datetime.now(self.time_zone)
+            year, month = now.year, now.month
+
+        # --------------------
+        # Post the tables to Confluence
+        # --------------------
+        page = confluence.post_confluence_page(
+            self.confluence_report_page_id,
+            self.confluence_report_space,
+            confluence_content,
+            year,
+            month,
+            {report.name: report.heading for report in self.reports},
+            APPROXIMATE_COUNTS_NOTE if self.approximate_counts and current else None)
+        if page is None:
+            self.failed_pages.append(month_page_title(year, month))
+        return page is not None
+
+    def resolve_confluence_pages(self, months):
+        """
+        Look up the pages of several months with one search before posting them, e.g. for a backfill.
+
+        Args:
+            months (list): The (year, month) tuples of the pages.
+        """
+        confluence = self.__authenticate_confluence()
+        titles = [month_page_title(year, month) for year, month in months]
+        found = confluence.resolve_pages(self.confluence_report_space, titles)
+        print(f"Resolved {found} existing Confluence pages of {len(titles)} months")
+
+    def __authenticate_confluence(self):
+        """
+        #---------------------
+        # Authenticate the Confluence Client, once per run
+        #---------------------
+        """
+        if self.confluence is not None:
+            return self.confluence
+        try:
+            self.confluence = ConfluenceClient(
+                self.atlassian_url,
+                self.atlassian_username,
+                self.atlassian_token,
+                session=self.session,
+                instrumentation=self.instrumentation,
+                publish_cache=self.publish_cache,
+                banner_page=self.banner_page)
+
+        except requests.exceptions.HTTPError as http_err:
+            print(f"Error authenticating the Confluence client: {http_err}")
+            raise
+        except requests.exceptions.ConnectionError as conn_err:
+            print(f"Error connecting to Confluence client {conn_err}")
+            raise
+        except requests.exceptions.Timeout as time_err:
+            print(f"Error: Connection timeout {time_err}")
+            raise
+
+        return self.confluence
@@ -0,0 +1,203 @@
+"""
+profiler
+
+Profiles the stages of a report run, separating network waits from local work.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# Source files whose frames mean the thread is waiting on the network
+NETWORK_FILES = ('socket.py', 'ssl.py', os.path.join('http', 'client.py'), os.path.join('urllib3', 'connection.py'))
+
+# Functions whose frames mean the thread is blocked on another thread, a lock or a sleep
+WAITING_FUNCTIONS = {'wait', 'acquire', 'get', 'result', 'join', 'sleep', '_wait_for_tstate_lock'}
+
+# Number of functions listed in the sorted stats
+STATS_LIMIT = 40
+
+
+class PipelineProfiler:
+    """
+    A class for profiling the stages of a run, e.g. generate_tables and post_to_confluence.
+
+    Each stage is profiled in two ways at once:
+    - cProfile traces every function call of the thread running the stage, for
+      exact call counts and times, written as sorted stats and a .pstats dump
+      (e.g. for snakeviz).
+    - A sampling thread records the stack of every thread, the query worker
+      threads included, every `interval` seconds. The samples are written as
+      collapsed stacks, ready for flamegraph.pl or speedscope, and classified
+      as network I/O, waiting (locks, queues, rate limiting) or local CPU.
+
+    The summary of each stage compares its wall time with the CPU time of the
+    process, and gives the sampled thread time spent on the network and in
+    local work.
+
+    Attributes:
+        output_dir (str): The directory the profiles are written to.
+        interval (float): The number of seconds between stack samples.
+        summary (dict): The time breakdown of each profiled stage.
+    """
+
+    def __init__(self, output_dir, interval=0.005):
+        """
+        Initialize PipelineProfiler.
+
+        Args:
+            output_dir (str): The directory the profiles are written to.
+            interval (float, optional): The number of seconds between stack samples.
+        """
+        self.output_dir = output_dir
+        self.interval = interval
+        self.summary = {}
+        self._samples = {}
+        os.makedirs(output_dir, exist_ok=True)
+
+    @contextmanager
+    def profile(self, stage):
+        """
+        Profile a stage and write its profiles when it ends.
+
+        A stage profiled more than once, e.g. posting every month of a backfill,
+        is written with its runs combined.
+
+        Args:
+            stage (str): The name of the stage, used for the file names.
+        """
+        profiler = cProfile.Profile()
+        samples = Counter()
+        categories = Counter()
+        stop = threading.Event()
+        sampler = threading.Thread(
+            target=self.__sample, args=(stop, samples, categories), name='profiler-sampler', daemon=True)
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        sampler.start()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            stop.set()
+            sampler.join()
+            self.__write(
+                stage,
+                profiler,
+                samples,
+                categories,
+                time.perf_counter() - wall_start,
+                time.process_time() - cpu_start)
+
+    def write_summary(self):
+        """
+        Write the time breakdown of every stage as JSON and print it.
+
+        Returns:
+            str: The path of the summary.
+        """
+        path = os.path.join(self.output_dir, 'profile_summary.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary, f, indent=2)
+        for stage, breakdown in self.summary.items():
+            print(f"{stage}: {breakdown['wall_seconds']:.2f}s wall, "
+                  f"{breakdown['process_cpu_seconds']:.2f}s CPU, "
+                  f"{breakdown['network_thread_seconds']:.2f}s network I/O, "
+                  f"{breakdown['waiting_thread_seconds']:.2f}s waiting, "
+                  f"{breakdown['local_thread_seconds']:.2f}s local work (sampled thread time)")
+        print(f"Profiles written to {self.output_dir}")
+        return path
+
+    def __sample(self, stop, samples, categories):
+        """
+        Record the stacks of every other thread until stopped.
+
+        Args:
+            stop (threading.Event): Set when the stage ends.
+            samples (collections.Counter): The number of samples of each collapsed stack.
+            categories (collections.Counter): The number of samples of each category.
+        """
+        own_id = threading.get_ident()
+        while not stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame)
+                    frame = frame.f_back
+                stack.reverse()
+                thread_name = re.sub(r'[-_]?\d+', '', names.get(thread_id, 'thread')) or 'thread'
+                folded = ';'.join([thread_name, *(_frame_label(frame) for frame in stack)])
+                samples[folded] += 1
+                categories[_categorize(stack)] += 1
+
+    def __write(self, stage, profiler, samples, categories, wall_seconds, cpu_seconds):
+        """
+        Write the profiles of a stage and add it to the summary.
+        """
+        base = os.path.join(self.output_dir, stage)
+        stats_path = f'{base}.pstats'
+        stats = pstats.Stats(profiler)
+        if stage in self.summary:
+            stats.add(stats_path)
+        stats.dump_stats(stats_path)
+
+        text = io.StringIO()
+        stats.stream = text
+        stats.sort_stats('cumulative').print_stats(STATS_LIMIT)
+        stats.sort_stats('tottime').print_stats(STATS_LIMIT)
+        with open(f'{base}.txt', 'w', encoding='utf-8') as f:
+            f.write(text.getvalue())
+
+        previous = self.summary.get(stage)
+        if previous:
+            previous_samples, previous_categories = self._samples[stage]
+            samples = samples + previous_samples
+            categories = categories + previous_categories
+            wall_seconds += previous['wall_seconds']
+            cpu_seconds += previous['process_cpu_seconds']
+        self._samples[stage] = (samples, categories)
+        with open(f'{base}.collapsed', 'w', encoding='utf-8') as f:
+            for folded, count in samples.most_common():
+                f.write(f'{folded} {count}\n')
+
+        self.summary[stage] = {
+            'wall_seconds': wall_seconds,
+            'process_cpu_seconds': cpu_seconds,
+            'network_thread_seconds': categories['network'] * self.interval,
+            'waiting_thread_seconds': categories['waiting'] * self.interval,
+            'local_thread_seconds': categories['local'] * self.interval,
+            'samples': sum(categories.values())
+        }
+
+
+def _frame_label(frame):
+    """
+    The label of a frame in a collapsed stack, e.g. 'JiraService.py:get_jira_issues'.
+    """
+    return f'{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}'
+
+
+def _categorize(stack):
+    """
+    Classify a sampled stack as 'network', 'waiting' or 'local' work.
+    """
+    for frame in reversed(stack):
+        filename = frame.f_code.co_filename
+        if filename.endswith(NETWORK_FILES):
+            return 'network'
+    leaf = stack[-1].f_code if stack else None
+    if leaf is not None and leaf.co_name in WAITING_FUNCTIONS:
+        return 'waiting'
+    return 'local'
@@ -0,0 +1,207 @@
+"""
+project_metrics
+
+Collects every release metric for a project, or for several projects, from a single Jira search.
+"""
+from AtlassianService.JQLQuery import JQLQuery
+
+# Issue type that carries the Release Type and Release Window dropdowns
+RELEASE_ISSUE_TYPE = 'Release'
+
+
+class ProjectMetrics:
+    """
+    A class for collecting all the release metrics of a project in one pass.
+
+    Instead of sending one count query per table cell, this class fetches the
+    project's issues for the month once, with only the fields of the report
+    dimensions, so that the counts `ReleaseMetrics` returns one at a time can be
+    grouped locally from an `IssueDataset`.
+
+    Attributes:
+        jira_client (object): Instance to interact with Jira.
+        project_key (str): The key of the Jira project.
+        issue_types (list): The issue types fetched besides the Release issues.
+        issue_fields (dict): The Jira field of each report dimension, keyed by dimension.
+        page_size (int): The number of issues requested per page.
+        released_versions (list): The ids of the project's released fix versions, or None
+            to select them with releasedVersions().
+        issues (list): The projected issues as tuples of their dimension values, in
+            `issue_fields` order, or None if the search failed. Each page of the search
+            is projected as it arrives, so the raw issues are never all held at once.
+    """
+
+    def __init__(self,
+                jira_client,
+                project_key,
+                issue_types,
+                issue_fields,
+                page_size=100,
+                released_versions=None):
+        """
+        Initialize ProjectMetrics and collect the issues of the project.
+
+        Args:
+            jira_client (object): Instance to interact with Jira.
+            project_key (str): The key of the Jira project.
+            issue_types (list): The issue types fetched besides the Release issues.
+            issue_fields (dict): The Jira field of each report dimension, keyed by dimension.
+            page_size (int, optional): The number of issues requested per page.
+            released_versions (list, optional): The ids of the project's released fix versions.
+        """
+        self.jira_client = jira_client
+        self.project_key = project_key
+        self.issue_types = issue_types
+        self.issue_fields = issue_fields
+        self.page_size = page_size
+        self.released_versions = released_versions
+        self.issues = self.__get_jira_issues()
+
+    def __get_jira_issues(self):
+        """
+        Fetch the project's issues for the month and project the metric fields.
+
+        Returns:
+            list: Tuples of the dimension values of each issue, or None if the
+            search failed.
+        """
+        query = JQLQuery(
+            self.project_key,
+            ', '.join([RELEASE_ISSUE_TYPE, *self.issue_types]),
+            self.issue_fields,
+            released_versions=self.released_versions
+        ).get_jql_query()
+        fields = list(self.issue_fields.values())
+        return self.jira_client.get_jira_issues(query, fields, self.page_size, projection=issue_values)
+
+
+class PortfolioMetrics:
+    """
+    A class for collecting the release metrics of several projects from one search.
+
+    The issues of every project are fetched with a single paginated query covering
+    all of them, together with the `project` field, and split locally by project,
+    so the number of requests does not grow with the number of projects.
+
+    Attributes:
+        jira_client (object): Instance to interact with Jira.
+        project_keys (list): The keys of the Jira projects.
+        issue_types (list): The issue types fetched besides the Release issues.
+        issue_fields (dict): The Jira field of each report dimension, keyed by dimension.
+        page_size (int): The number of issues requested per page.
+        released_versions (list): The ids of the projects' released fix versions, or None
+            to select them with releasedVersions().
+        issues (dict): The projected issues of each project as tuples of their dimension
+            values, in `issue_fields` order, or None if the search failed.
+    """
+
+    def __init__(self,
+                jira_client,
+                project_keys,
+                issue_types,
+                issue_fields,
+                page_size=100,
+                released_versions=None):
+        """
+        Initialize PortfolioMetrics and collect the issues of every project.
+
+        Args:
+            jira_client (object): Instance to interact with Jira.
+            project_keys (list): The keys of the Jira projects.
+            issue_types (list): The issue types fetched besides the Release issues.
+            issue_fields (dict): The Jira field of each report dimension, keyed by dimension.
+            page_size (int, optional): The number of issues requested per page.
+            released_versions (list, optional): The ids of the project's released fix versions.
+        """
+        self.jira_client = jira_client
+        self.project_keys = list(project_keys)
+        self.issue_types = issue_types
+        self.issue_fields = issue_fields
+        self.page_size = page_size
+        self.released_versions = released_versions
+        self.issues = self.__get_jira_issues()
+
+    def __get_jira_issues(self):
+        """
+        Fetch the issues of all the projects for the month and split them by project.
+
+        Returns:
+            dict: Tuples of the dimension values of each issue keyed by project,
+            or None if the search failed.
+        """
+        query = JQLQuery(
+            self.project_keys,
+            ', '.join([RELEASE_ISSUE_TYPE, *self.issue_types]),
+            self.issue_fields,
+            released_versions=self.released_versions
+        ).get_jql_query()
+        issues = self.jira_client.get_jira_issues(
+            query, ['project', *self.issue_fields.values()], self.page_size, projection=project_issue_values)
+        if issues is None:
+            return None
+        return split_by_project(issues, self.project_keys)
+
+
+def issue_values(issue, fields):
+    """
+    Project a raw Jira issue on the values of some fields.
+
+    Args:
+        issue (dict): A raw issue of a search response.
+        fields (list): The Jira fields to keep.
+
+    Returns:
+        tuple: The field values of the issue, in `fields` order.
+    """
+    return tuple(field_value(issue['fields'].get(field)) for field in fields)
+
+
+def project_issue_values(issue, fields):
+    """
+    Project a raw Jira issue on its project key and the values of some fields.
+
+    Args:
+        issue (dict): A raw issue of a search response, with its `project` field.
+        fields (list): The Jira fields to keep, starting with 'project'.
+
+    Returns:
+        tuple: The project key, followed by the values of the other fields in `fields` order.
+    """
+    return (issue['fields']['project']['key'], *issue_values(issue, fields[1:]))
+
+
+def split_by_project(issues, project_keys):
+    """
+    Split issues projected by `project_issue_values` by project.
+
+    Args:
+        issues (list): The projected issues, each starting with its project key.
+        project_keys (list): The keys of the projects to keep.
+
+    Returns:
+        dict: Tuples of the field values of each issue, without the project key, keyed by project.
+    """
+    projects = {key: [] for key in project_keys}
+    for issue in issues:
+        if issue[0] in projects:
+            projects[issue[0]].append(tuple(issue[1:]))
+    return projects
+
+
+def field_value(field):
+    """
+    Return the display value of a Jira field from a search response.
+
+    Args:
+        field (Any): The raw field value, e.g. {'name': 'Story'} for the issue type,
+            {'value': 'Major'} for a dropdown or a list of them for the components.
+
+    Returns:
+        str: The name or value of the field, or None if it is empty. A list of them
+        for a multi-valued field.
+    """
+    if isinstance(field, list):
+        return [field_value(value) for value in field]
+    if isinstance(field, dict):
+        return field.get('value', field.get('name'))
+    return field
@@ -0,0 +1,61 @@
+"""
+query_executor
+
+Runs the Jira query work of a report concurrently.
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+
+
+class QueryExecutor:
+    """
+    A class for running Jira query tasks in parallel with a bounded worker pool.
+
+    Each task is a callable that sends its own Jira requests, e.g. building a
+    `ReleaseMetrics` or `ProjectMetrics` instance. At most `max_workers` tasks
+    run at the same time, so that is also the maximum number of in-flight
+    requests. Results are returned keyed and ordered like the submitted tasks,
+    whatever order they complete in, and request errors are collected per task
+    instead of stopping the run.
+
+    Attributes:
+        max_workers (int): The maximum number of tasks running at the same time.
+        errors (dict): The request errors raised by failed tasks, keyed like the tasks.
+    """
+
+    def __init__(self, max_workers=8):
+        """
+        Initialize QueryExecutor.
+
+        Args:
+            max_workers (int, optional): The maximum number of tasks running at the same time.
+        """
+        self.max_workers = max_workers
+        self.errors = {}
+
+    def run(self, tasks, on_result=None):
+        """
+        Run the tasks and collect their results.
+
+        Args:
+            tasks (dict): Callables taking no arguments, keyed by a task key.
+            on_result (callable, optional): Called with the key and result of each
+                successful task as soon as it completes, e.g. to checkpoint it.
+
+        Returns:
+            dict: The task results in the same key order as `tasks`. A task that
+            failed with a request error has a None result and its error is
+            recorded in `errors`.
+        """
+        results = dict.fromkeys(tasks)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(task): key for key, task in tasks.items()}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    results[key] = future.result()
+                    if on_result is not None:
+                        on_result(key, results[key])
+                except requests.exceptions.RequestException as request_error:
+                    self.errors[key] = request_error
+        return results
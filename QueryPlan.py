@@ -0,0 +1,220 @@
+"""
+query_plan
+
+The explicit plan of the Jira queries of a run, with its estimated cost.
+"""
+import math
+
+
+class PlannedQuery:
+    """
+    A class for one distinct Jira query of a query plan.
+
+    Attributes:
+        kind (str): 'count' for a count query, paging through the keys of the issues
+            when it is exact, or 'search' for a paginated search.
+        jql (str): The JQL query.
+        project (str): The key of the project the results belong to, or None when
+            they cover several projects.
+        collector (type): The class collecting the results, e.g. ReleaseMetrics, called
+            with the Jira client and `arguments`, or None when the query is sent by
+            the issue store sync.
+        arguments (tuple): The arguments of the collector after the Jira client.
+        consumers (list): What the results are used for, e.g. the table cells of a
+            count query or the project of a search.
+        estimated_issues (int): The number of issues the query matched in the last
+            run, or None if unknown.
+        replaces (int): The number of count queries a shared search replaces.
+        fields (list): The Jira fields the issues of a search are projected on, or None.
+    """
+
+    def __init__(self, kind, jql, project, collector, arguments, estimated_issues=None, replaces=0, fields=None):
+        """
+        Initialize PlannedQuery without any consumer.
+
+        Args:
+            kind (str): 'count' or 'search'.
+            jql (str): The JQL query.
+            project (str): The key of the project the results belong to, or None.
+            collector (type): The class collecting the results, or None.
+            arguments (tuple): The arguments of the collector after the Jira client.
+            estimated_issues (int, optional): The number of issues the query matched in the last run.
+            replaces (int, optional): The number of count queries a shared search replaces.
+            fields (list, optional): The Jira fields the issues of a search are projected on.
+        """
+        self.kind = kind
+        self.jql = jql
+        self.project = project
+        self.collector = collector
+        self.arguments = arguments
+        self.consumers = []
+        self.estimated_issues = estimated_issues
+        self.replaces = replaces
+        self.fields = fields
+
+    def estimated_requests(self, page_size, count_page_size=None):
+        """
+        Estimate the number of requests of the query.
+
+        Args:
+            page_size (int): The number of issues requested per page of a search.
+            count_page_size (int, optional): The number of keys per page of an exact
+                count, or None when a count takes a single request.
+
+        Returns:
+            int: The number of pages of the search or exact count, or one for a query
+            of unknown size or a single-request count.
+        """
+        return estimated_requests(self.kind, self.estimated_issues, page_size, count_page_size)
+
+    def run(self, jira_client):
+        """
+        Send the query.
+
+        Args:
+            jira_client (JiraClient): The authenticated Jira client.
+
+        Returns:
+            Any: The count of a count query, or the projected issues of a search,
+            as collected by the collector.
+        """
+        result = self.collector(jira_client, *self.arguments)
+        return result.jira_issues_count if self.kind == 'count' else result.issues
+
+
+class QueryPlan:
+    """
+    A class for the distinct Jira queries of a run and what each of them is used for.
+
+    Queries are keyed by kind and JQL, so a query needed by several table cells or
+    reports is planned, and sent, only once.
+
+    Attributes:
+        mode (str): The collection mode the plan was compiled for.
+        page_size (int): The number of issues requested per page of a search.
+        count_page_size (int): The number of keys per page of an exact count, or None
+            when the counts take a single request each, e.g. approximate counts.
+        queries (list): The PlannedQuery of each distinct query, in planning order.
+    """
+
+    def __init__(self, mode, page_size, count_page_size=None):
+        """
+        Initialize an empty QueryPlan.
+
+        Args:
+            mode (str): The collection mode the plan is compiled for.
+            page_size (int): The number of issues requested per page of a search.
+            count_page_size (int, optional): The number of keys per page of an exact count.
+        """
+        self.mode = mode
+        self.page_size = page_size
+        self.count_page_size = count_page_size
+        self.queries = []
+        self._index = {}
+
+    def add(self, kind, jql, consumer, collector=None, arguments=(), project=None,
+            estimated_issues=None, replaces=0, fields=None):
+        """
+        Plan a query for a consumer, reusing the planned query if it is identical.
+
+        Args:
+            kind (str): 'count' or 'search'.
+            jql (str): The JQL query.
+            consumer (Any): What the results are used for, e.g. a (project, report, value) table cell.
+            collector (type, optional): The class collecting the results.
+            arguments (tuple, optional): The arguments of the collector after the Jira client.
+            project (str, optional): The key of the project the results belong to.
+            estimated_issues (int, optional): The number of issues the query matched in the last run.
+            replaces (int, optional): The number of count queries a shared search replaces.
+            fields (list, optional): The Jira fields the issues of a search are projected on.
+
+        Returns:
+            PlannedQuery: The planned query.
+        """
+        query = self._index.get((kind, jql))
+        if query is None:
+            query = PlannedQuery(kind, jql, project, collector, arguments, estimated_issues, replaces, fields)
+            self._index[(kind, jql)] = query
+            self.queries.append(query)
+        query.consumers.append(consumer)
+        return query
+
+    @property
+    def duplicates(self):
+        """
+        The number of consumers served by a query planned for another one.
+        """
+        return sum(len(query.consumers) - 1 for query in self.queries)
+
+    @property
+    def estimated_requests(self):
+        """
+        The estimated number of requests of the plan.
+        """
+        return sum(query.estimated_requests(self.page_size, self.count_page_size) for query in self.queries)
+
+    def explain(self):
+        """
+        Describe the plan: its queries, what they are used for and their estimated cost.
+
+        The estimates come from the result sizes of the last run, so searches and
+        exact counts that were not sent then are counted as a single page.
+
+        Returns:
+            str: The description, one line per query after the totals.
+        """
+        counts = [query for query in self.queries if query.kind == 'count']
+        searches = [query for query in self.queries if query.kind == 'search']
+        merged = sum(query.replaces for query in searches)
+        pages = sum(query.estimated_requests(self.page_size) for query in searches)
+        known = [query.estimated_issues for query in searches if query.estimated_issues is not None]
+        lines = [
+            f"{len(self.queries)} distinct queries: {len(counts)} count queries, {len(searches)} searches",
+            f"{self.duplicates} duplicate consumers share a query, "
+            f"{merged} count queries merged into {sum(1 for query in searches if query.replaces)} shared searches",
+            f"Estimated cost: {self.estimated_requests} requests, {pages} search pages of {self.page_size} issues"
+            + (f" (~{sum(known)} issues in the last run)" if known else ''),
+            '',
+            f"{'Kind':<7}{'Requests':>9}{'Issues':>8}  {'Used by':<36}Query"
+        ]
+        for query in self.queries:
+            used_by = _describe(query.consumers[0])
+            if len(query.consumers) > 1:
+                used_by += f' (+{len(query.consumers) - 1})'
+            if query.replaces:
+                used_by += f' [{query.replaces} counts]'
+            issues = '?' if query.estimated_issues is None else query.estimated_issues
+            requests = query.estimated_requests(self.page_size, self.count_page_size)
+            lines.append(f"{query.kind:<7}{requests:>9}{issues:>8}  "
+                         f"{used_by:<36}{query.jql}")
+        return '\n'.join(lines)
+
+
+def estimated_requests(kind, estimated_issues, page_size, count_page_size=None):
+    """
+    Estimate the number of requests of a query from the number of issues it matched in the last run.
+
+    Args:
+        kind (str): 'count' or 'search'.
+        estimated_issues (int): The number of issues the query matched, or None if unknown.
+        page_size (int): The number of issues requested per page of a search.
+        count_page_size (int, optional): The number of keys per page of an exact count,
+            or None when a count takes a single request.
+
+    Returns:
+        int: The number of pages, at least one.
+    """
+    if kind == 'count':
+        page_size = count_page_size
+    if not page_size or not estimated_issues:
+        return 1
+    return math.ceil(estimated_issues / page_size)
+
+
+def _describe(consumer):
+    """
+    Describe a consumer, joining the parts of a table cell with slashes.
+    """
+    if isinstance(consumer, tuple):
+        return ' / '.join(str(part) for part in consumer)
+    return str(consumer)
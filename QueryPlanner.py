@@ -0,0 +1,223 @@
+"""
+query_planner
+
+Compiles the reports of a run into the plan of its Jira queries.
+"""
+import os
+import json
+from AtlassianService.JiraService import COUNT_PAGE_SIZE
+from AtlassianService.JQLQuery import JQLQuery
+from ReleaseMetrics import ReleaseMetrics
+from ProjectMetrics import ProjectMetrics, PortfolioMetrics, RELEASE_ISSUE_TYPE
+from QueryPlan import QueryPlan, estimated_requests
+
+# Dimensions the count mode can count by, with one count query per value
+CELL_DIMENSIONS = ('Issue Type', 'Release Type', 'Release Window')
+
+
+class QueryPlanner:
+    """
+    The query planning of MetricsEngine: which Jira queries generate the tables of
+    the configured reports, and which table cells the count mode's queries fill.
+
+    It uses the engine's config attributes, its `query_plan` and `cell_reports`,
+    compiled once per run, and its `_released_versions`.
+    """
+
+    def plan(self):
+        """
+        Compile the reports into the plan of the Jira queries generating the tables,
+        without sending any request. The plan is compiled once per run.
+
+        Identical queries are planned once, whatever the number of table cells or
+        reports using them. In count mode, with Merge_Queries, the count queries of a
+        project are merged into one shared search of its issues, counted locally,
+        when the result sizes of the last run show that the search takes fewer
+        requests. The store mode's sync depends on the state of the store, so it is
+        only planned to be explained.
+
+        Returns:
+            QueryPlan: The distinct queries, what they are used for and their estimated cost.
+        """
+        if self.query_plan is not None:
+            return self.query_plan
+        result_sizes = self.__last_result_sizes()
+        plan = QueryPlan(self.collection_mode, self.page_size, None if self.approximate_counts else COUNT_PAGE_SIZE)
+        project_keys = list(self.project_keys.keys())
+        issue_type = ', '.join([RELEASE_ISSUE_TYPE, *self.issue_type])
+        if self.collection_mode == 'count':
+            self._plan_cells(plan, result_sizes)
+        elif self.collection_mode == 'portfolio':
+            released_versions = self._released_versions(project_keys)
+            jql_query = JQLQuery(
+                project_keys, issue_type, self.issue_fields, released_versions=released_versions).get_jql_query()
+            plan.add(
+                'search', jql_query, 'all projects', PortfolioMetrics,
+                (project_keys, self.issue_type, self.dimension_fields, self.page_size, released_versions),
+                estimated_issues=result_sizes.get(jql_query), fields=list(self.dimension_fields.values()))
+        elif self.collection_mode == 'store':
+            query = JQLQuery(project_keys, issue_type, self.issue_fields)
+            plan.add('search', f'{query.get_sync_query()} AND updated >= "<last sync>"', 'store sync')
+        else:
+            for key in project_keys:
+                released_versions = self._released_versions(key)
+                jql_query = JQLQuery(
+                    key, issue_type, self.issue_fields, released_versions=released_versions).get_jql_query()
+                plan.add(
+                    'search', jql_query, key, ProjectMetrics,
+                    (key, self.issue_type, self.dimension_fields, self.page_size, released_versions),
+                    project=key, estimated_issues=result_sizes.get(jql_query),
+                    fields=list(self.dimension_fields.values()))
+        self.query_plan = plan
+        return plan
+
+    def _plan_cells(self, plan, result_sizes):
+        """
+        Plan the count queries of the table cells, or a shared search per project.
+
+        Args:
+            plan (QueryPlan): The plan the queries are added to.
+            result_sizes (dict): The number of issues each JQL query matched in the last run.
+        """
+        cell_reports = self._cell_reports()
+        cell_fields = self._cell_fields(cell_reports)
+        for key in self.project_keys.keys():
+            released_versions = self._released_versions(key)
+            cells = []
+            issue_types = {}
+            for name, (dimension, values, report_issue_type) in cell_reports.items():
+                for value in values:
+                    cell_issue_type, release_type, release_window = self._cell_filters(
+                        dimension, value, report_issue_type)
+                    issue_types.update(dict.fromkeys(cell_issue_type.split(', ')))
+                    arguments = (key, cell_issue_type, self.issue_fields, release_type, release_window)
+                    jql_query = JQLQuery(*arguments, released_versions=released_versions).get_jql_query()
+                    cells.append(((key, name, value), jql_query, (*arguments, released_versions)))
+
+            # The shared search fetches every issue the cells count, with only the cell fields
+            issue_types.pop(RELEASE_ISSUE_TYPE, None)
+            shared_query = JQLQuery(
+                key, ', '.join([RELEASE_ISSUE_TYPE, *issue_types]), self.issue_fields,
+                released_versions=released_versions).get_jql_query()
+            shared_issues = result_sizes.get(shared_query)
+            distinct_queries = list(dict.fromkeys(jql_query for _, jql_query, _ in cells))
+            if shared_issues is None and all(jql_query in result_sizes for jql_query in distinct_queries):
+                shared_issues = self.__estimate_shared_issues(cell_reports, cells, result_sizes)
+            count_requests = sum(
+                estimated_requests('count', result_sizes.get(jql_query), self.page_size, plan.count_page_size)
+                for jql_query in distinct_queries)
+            if (self.merge_queries and shared_issues is not None
+                    and estimated_requests('search', shared_issues, self.page_size) < count_requests):
+                plan.add(
+                    'search', shared_query, key, ProjectMetrics,
+                    (key, list(issue_types), cell_fields, self.page_size, released_versions),
+                    project=key, estimated_issues=shared_issues, replaces=len(distinct_queries),
+                    fields=list(cell_fields.values()))
+                continue
+            for cell, jql_query, arguments in cells:
+                plan.add(
+                    'count', jql_query, cell, ReleaseMetrics, arguments,
+                    project=key, estimated_issues=result_sizes.get(jql_query))
+
+    @staticmethod
+    def __estimate_shared_issues(cell_reports, cells, result_sizes):
+        """
+        Estimate the number of issues of a project's shared search from the counts of its cells.
+
+        The reports filtering the same issue types count the same issues, so the
+        largest of their totals is taken for each issue type filter.
+
+        Args:
+            cell_reports (dict): The dimension, values and issue types of each report.
+            cells (list): The (project, report, value) cell, JQL query and arguments of each count query.
+            result_sizes (dict): The number of issues each JQL query matched in the last run.
+
+        Returns:
+            int: The estimated number of issues.
+        """
+        report_totals = {}
+        for (_, name, _), jql_query, _ in cells:
+            report_totals[name] = report_totals.get(name, 0) + result_sizes[jql_query]
+        largest = {}
+        for name, total in report_totals.items():
+            issue_type = cell_reports[name][2]
+            largest[issue_type] = max(largest.get(issue_type, 0), total)
+        return sum(largest.values())
+
+    def _cell_fields(self, cell_reports):
+        """
+        The Jira field of the issue type and of every dimension counted in count mode.
+
+        Returns:
+            dict: The fields keyed by dimension, in the order of the projected issue tuples.
+        """
+        return {
+            dimension: self.dimensions[dimension]['Field'] for dimension in CELL_DIMENSIONS
+            if dimension == 'Issue Type' or any(
+                dimension == cell_dimension for cell_dimension, _, _ in cell_reports.values())
+        }
+
+    def __last_result_sizes(self):
+        """
+        The number of issues each Jira query matched in the last run, from its run report.
+
+        Returns:
+            dict: The result sizes keyed by JQL query, empty without a readable run report.
+        """
+        if not self.report_path or not os.path.exists(self.report_path):
+            return {}
+        try:
+            with open(self.report_path, 'r', encoding='utf-8') as f:
+                spans = json.load(f)['spans']
+        except (OSError, ValueError, KeyError) as error:
+            print(f"Ignoring the unreadable run report {self.report_path}: {error}")
+            return {}
+        return {
+            span['labels']['query']: span['result_size'] for span in spans
+            if span['name'] in ('jira_count', 'jira_search') and span['result_size'] is not None
+            and not span['error']
+        }
+
+    def _cell_reports(self):
+        """
+        The reports the count mode can count, with one count query per table cell.
+
+        Only the reports counting one of the CELL_DIMENSIONS by Project, filtered
+        at most by issue type, can be counted this way; the others are skipped.
+        They are found once per run.
+
+        Returns:
+            dict: The dimension, values and issue types of each report, keyed by report name.
+        """
+        if self.cell_reports is not None:
+            return self.cell_reports
+        cell_reports = {}
+        for report in self.reports:
+            dimension = report.rows[0] if len(report.rows) == 1 else None
+            values = report.filters.get(dimension, self.dimensions.get(dimension, {}).get('Values'))
+            if (dimension not in CELL_DIMENSIONS or report.columns != ['Project']
+                    or set(report.filters) - {'Issue Type'} or values is None):
+                print(f"Skipping report {report.name}: the count mode only counts one of "
+                      f"{', '.join(CELL_DIMENSIONS)} with configured values by Project")
+                continue
+            issue_type = ', '.join(report.filters.get('Issue Type', [RELEASE_ISSUE_TYPE]))
+            cell_reports[report.name] = (dimension, values, issue_type)
+        self.cell_reports = cell_reports
+        return cell_reports
+
+    @staticmethod
+    def _cell_filters(dimension, value, issue_type):
+        """
+        The issue type, release type and release window filters of a table cell.
+
+        Returns:
+            tuple: The issue type, release type and release window filters.
+        """
+        if dimension == 'Issue Type':
+            # Get story and bug counts
+            return value, None, None
+        if dimension == 'Release Type':
+            # Get counts by release type (Major, Minor, Patch, Other)
+            return issue_type, value, None
+        # Get planned vs unplanned counts for releases
+        return issue_type, None, value
@@ -1,5 +1,3 @@
-import requests
-
 """
 release_metrics
 
@@ -23,6 +21,8 @@ class ReleaseMetrics:
         issue_fields (list or dict): Fields to include in the Jira query.
         release_type (optional): Filter for the specific release type.
         release_window (optional): Filter for a specific release window.
+        released_versions (list): The ids of the project's released fix versions, or None
+            to select them with releasedVersions().
     """
 
     def __init__(self,
@@ -31,7 +31,8 @@ class ReleaseMetrics:
                 issue_type,
                 issue_fields,
                 release_type=None,
-                release_window=None):
+                release_window=None,
+                released_versions=None):
         """
         Initialize ReleaseMetrics with Jira client and filter parameters.
 
@@ -42,6 +43,7 @@ class ReleaseMetrics:
             issue_fields (list or dict): Fields to include in the Jira query.
             release_type (optional): Optional filter for the specific release type.
             release_window (optional): Optional filter for the release window.
+            released_versions (list, optional): The ids of the project's released fix versions.
         """
         self.jira_client = jira_client
         self.project_key = project_key
@@ -49,6 +51,7 @@ class ReleaseMetrics:
         self.issue_fields = issue_fields
         self.release_type = release_type
         self.release_window = release_window
+        self.released_versions = released_versions
         self.jira_issues_count = self.__get_jira_issues_count()
 
     def __get_jira_issues_count(self):
@@ -58,18 +61,18 @@ class ReleaseMetrics:
         This method constructs a JQL query using the provided parameters and returns the count
         of Jira issues that match the criteria based on the release window.
 
+        Request errors are reported by the Jira client, which returns None for the
+        count or re-raises them when it was created with `raise_errors`.
+
         Returns:
             int: The count of Jira issues filtered by release window.
         """
-        try:
-            query = JQLQuery(
-                self.project_key,
-                self.issue_type,
-                self.issue_fields,
-                self.release_type,
-                self.release_window
-            ).get_jql_query()
-            return self.jira_client.get_jira_issues_count(query)
-        except requests.exceptions.HTTPError as http_error:
-            print(f"Error getting Jira issues count: {http_error}")
-            return None
+        query = JQLQuery(
+            self.project_key,
+            self.issue_type,
+            self.issue_fields,
+            self.release_type,
+            self.release_window,
+            released_versions=self.released_versions
+        ).get_jql_query()
+        return self.jira_client.get_jira_issues_count(query)
@@ -0,0 +1,204 @@
+"""
+sharding
+
+Splits the projects of a run into shards collected separately, and merges their partial tables.
+"""
+import os
+import copy
+import json
+from datetime import datetime, timezone
+from IssueDataset import CountTable, merge_count_tables
+
+# Version of the partial table files; files of another version are not merged
+PARTIAL_VERSION = 1
+
+
+def parse_shard(text):
+    """
+    Parse a shard given as 'i/N', e.g. '2/4' for the second of four shards.
+
+    Args:
+        text (str): The shard.
+
+    Returns:
+        tuple: The 1-based shard index and the number of shards.
+
+    Raises:
+        ValueError: If the shard is not of the form i/N with 1 <= i <= N.
+    """
+    index, _, count = text.partition('/')
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise ValueError(f"invalid shard {text!r}: expected i/N, e.g. 1/4") from None
+    if not 1 <= index <= count:
+        raise ValueError(f"invalid shard {text!r}: the index must be between 1 and {count}")
+    return index, count
+
+
+def shard_keys(project_keys, index, count):
+    """
+    The projects of a shard: the index-th of `count` contiguous slices of the projects,
+    so that the merged tables keep the configured project order.
+
+    Args:
+        project_keys (dict): The project names keyed by project key, in config order.
+        index (int): The 1-based shard index.
+        count (int): The number of shards.
+
+    Returns:
+        dict: The project names of the shard, keyed by project key.
+    """
+    keys = list(project_keys)
+    start, end = len(keys) * (index - 1) // count, len(keys) * index // count
+    return {key: project_keys[key] for key in keys[start:end]}
+
+
+def shard_config(config, index, count):
+    """
+    Derive the config of a shard from the config of the whole run.
+
+    The shard collects its projects only. Its checkpoint, change probe, issue store,
+    result cache, version index and run report get their own files, so that the
+    shards of one node do not write the same ones, and it gets 1/count of the rate
+    limit, as the shards share the Jira user's limit.
+
+    Args:
+        config (dict): The config of the whole run.
+        index (int): The 1-based shard index.
+        count (int): The number of shards.
+
+    Returns:
+        dict: The config of the shard.
+    """
+    config = copy.deepcopy(config)
+    config['ProjectKeys'] = shard_keys(config['ProjectKeys'], index, count)
+    for section, key in [('Checkpoint', 'Path'), ('ChangeProbe', 'Path'), ('Store', 'Path'), ('ResultCache', 'Path'),
+                         ('Versions', 'Path'), ('Instrumentation', 'Report_Path'),
+                         ('Instrumentation', 'Prometheus_Path')]:
+        if config[section][key]:
+            config[section][key] = shard_path(config[section][key], index, count)
+    for key in ['Rate', 'Min_Rate', 'Max_Rate']:
+        config['RateLimit'][key] = config['RateLimit'][key] / count
+    config['RateLimit']['Burst'] = max(1, config['RateLimit']['Burst'] // count)
+    return config
+
+
+def shard_path(path, index, count):
+    """
+    The path of a shard's own file, e.g. '.cache/checkpoint.2-of-4.jsonl'.
+
+    Args:
+        path (str): The path of the file of the whole run.
+        index (int): The 1-based shard index.
+        count (int): The number of shards.
+
+    Returns:
+        str: The path of the shard's file.
+    """
+    root, extension = os.path.splitext(path)
+    return f'{root}.{index}-of-{count}{extension}'
+
+
+def write_partial(path, month, index, count, project_keys, tables, failed_projects):
+    """
+    Write the count tables of a shard, replacing its file at once so that a merge
+    never reads a partial file being written.
+
+    Args:
+        path (str): The path of the partial file.
+        month (tuple): The (year, month) of the tables.
+        index (int): The 1-based shard index.
+        count (int): The number of shards.
+        project_keys (list): The keys of the shard's projects.
+        tables (dict): The CountTable of each report, keyed by report name.
+        failed_projects (set): The keys of the projects that could not be collected.
+    """
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = {
+        'version': PARTIAL_VERSION,
+        'month': list(month),
+        'shard': [index, count],
+        'projects': list(project_keys),
+        'failed_projects': sorted(failed_projects),
+        'written': datetime.now(timezone.utc).isoformat(),
+        'tables': {name: table.to_dict() for name, table in tables.items()}
+    }
+    with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+        json.dump(partial, f)
+    os.replace(f'{path}.tmp', path)
+
+
+def merge_partials(paths, month):
+    """
+    Merge the count tables of every shard of a run.
+
+    Args:
+        paths (list): The paths of the partial files, in shard order.
+        month (tuple): The (year, month) the tables must be of.
+
+    Returns:
+        tuple: The merged CountTable of each report keyed by report name, and the
+        keys of the projects that could not be collected.
+
+    Raises:
+        ValueError: If a partial file is missing, of another version or of another month.
+    """
+    tables = {}
+    failed_projects = set()
+    for path in paths:
+        if not os.path.exists(path):
+            raise ValueError(f"Missing shard tables {path}: run that shard before merging")
+        with open(path, 'r', encoding='utf-8') as f:
+            partial = json.load(f)
+        if partial.get('version') != PARTIAL_VERSION or tuple(partial.get('month') or ()) != tuple(month):
+            raise ValueError(f"Shard tables {path} are not of this month's run: run that shard again")
+        for name, table in partial['tables'].items():
+            tables.setdefault(name, []).append(CountTable.from_dict(table))
+        failed_projects.update(partial['failed_projects'])
+    return {name: merge_count_tables(shards) for name, shards in tables.items()}, failed_projects
+
+
+class ShardTables:
+    """
+    The sharded run of MetricsEngine: each shard writes its count tables with
+    `write_shard_tables`, and the merge step builds the tables of every shard
+    with `merge_shard_tables`. It uses the engine's `partial_path` and `_build_tables`.
+    """
+
+    def write_shard_tables(self, index, count):
+        """
+        Write the count tables of a shard's run, for the merge step to publish them
+        with the tables of the other shards.
+
+        Args:
+            index (int): The 1-based shard index.
+            count (int): The number of shards.
+        """
+        now = datetime.now(self.time_zone)
+        path = self.partial_path.format(index=index, count=count)
+        write_partial(
+            path, (now.year, now.month), index, count, self.project_keys.keys(), self.final_table, self.failed_projects)
+        print(f"Shard {index}/{count} tables of {len(self.project_keys)} projects written to {path}")
+
+    def merge_shard_tables(self, count):
+        """
+        Merge the count tables written by every shard of the current month's run and build the tables.
+
+        Args:
+            count (int): The number of shards.
+
+        Returns:
+            dict: The confluence content, like `generate_tables`.
+
+        Raises:
+            ValueError: If the tables of a shard are missing or of another month.
+        """
+        with self.instrumentation.span('merge_shards', shards=count):
+            now = datetime.now(self.time_zone)
+            paths = [self.partial_path.format(index=index, count=count) for index in range(1, count + 1)]
+            self.final_table, self.failed_projects = merge_partials(paths, (now.year, now.month))
+            if self.failed_projects:
+                print(f"Projects the shards could not collect: {', '.join(sorted(self.failed_projects))}")
+            return self._build_tables()
@@ -1,35 +1,35 @@
-from ChainOfResponsibility.BuildReleaseType import BuildReleaseTypeHandler
-from ChainOfResponsibility.BuildPlannedUnplanned import BuildPlannedUnplannedHandler
-from ChainOfResponsibility.BuildStoryBug import BuildStoryBugHandler
+from ChainOfResponsibility.BuildCrossTab import BuildCrossTabHandler
 
 class Tables:
     """
     Build the release metrics table using the Chain of Responsibility pattern.
 
-    The method initializes the handlers for different segments of the metrics and links them
-    together. It then starts the processing chain, updating the provided table_data with
-    computed counts.
+    The method initializes one handler per report table and links them together, in
+    the order of the reports. It then starts the processing chain, formatting the
+    aggregated counts of each report.
 
     Args:
-        table_data (dict): A dictionary representing the table structure where keys represent
-                            different segments of the metrics and their associated counts.
+        project_keys (dict): The project names keyed by project key.
+        tables (dict): The CountTable of each report, keyed by report name.
+        reports (list, optional): The names of the reports, in page order. Defaults to
+                       every table in `tables`.
 
     Returns:
         dict: The updated table_data with computed metrics.
     """
-    def __init__(self, project_keys, tables):
+    def __init__(self, project_keys, tables, reports=None):
         self.project_keys = project_keys
         self.tables = tables
+        self.reports = list(tables) if reports is None else list(reports)
         self.get_content = self.__build()
 
     def __build(self):
-        build_releasetype_df = BuildReleaseTypeHandler()
-        build_plannedunplanned_df = BuildPlannedUnplannedHandler()
-        build_storybug_df = BuildStoryBugHandler()
+        if not self.reports:
+            return {}
+        handlers = [BuildCrossTabHandler(name) for name in self.reports]
+        for handler, successor in zip(handlers, handlers[1:]):
+            handler.set_successor(successor)
 
-        build_releasetype_df.set_successor(build_plannedunplanned_df)
-        build_plannedunplanned_df.set_successor(build_storybug_df)
-
-        final_table = build_releasetype_df.handle(self.project_keys, self.tables)
+        final_table = handlers[0].handle(self.project_keys, self.tables)
 
         return final_table
@@ -0,0 +1,67 @@
+"""
+test_checkpoint
+
+Unit tests of the checkpoint of a collection and its resume.
+"""
+import os
+from Checkpoint import Checkpoint
+
+
+def test_resume_restores_the_results_of_the_same_scope(tmp_path):
+    path = str(tmp_path / 'checkpoint.jsonl')
+    checkpoint = Checkpoint(path)
+    assert checkpoint.start('search 2024-05') == {}
+    checkpoint.record('AAA', [['Story', 'Major']])
+    checkpoint.record(('count', 'project = BBB'), 3)
+
+    restored = Checkpoint(path).start('search 2024-05', resume=True)
+    assert restored == {'AAA': [['Story', 'Major']], "('count', 'project = BBB')": 3}
+
+
+def test_failed_results_are_not_recorded(tmp_path):
+    path = str(tmp_path / 'checkpoint.jsonl')
+    checkpoint = Checkpoint(path)
+    checkpoint.start('search 2024-05')
+    checkpoint.record('AAA', None)
+    assert Checkpoint(path).start('search 2024-05', resume=True) == {}
+
+
+def test_a_checkpoint_of_another_scope_is_not_resumed(tmp_path):
+    path = str(tmp_path / 'checkpoint.jsonl')
+    checkpoint = Checkpoint(path)
+    checkpoint.start('search 2024-05')
+    checkpoint.record('AAA', 1)
+    assert Checkpoint(path).start('search 2024-06', resume=True) == {}
+
+
+def test_a_line_cut_short_is_ignored_and_overwritten(tmp_path):
+    path = str(tmp_path / 'checkpoint.jsonl')
+    checkpoint = Checkpoint(path)
+    checkpoint.start('count 2024-05')
+    checkpoint.record('AAA', 1)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"key": "BBB", "res')
+
+    resumed = Checkpoint(path)
+    assert resumed.start('count 2024-05', resume=True) == {'AAA': 1}
+    resumed.record('CCC', 2)
+    assert Checkpoint(path).start('count 2024-05', resume=True) == {'AAA': 1, 'CCC': 2}
+
+
+def test_starting_without_resume_discards_the_last_checkpoint(tmp_path):
+    path = str(tmp_path / 'checkpoint.jsonl')
+    checkpoint = Checkpoint(path)
+    checkpoint.start('count 2024-05')
+    checkpoint.record('AAA', 1)
+    Checkpoint(path).start('count 2024-05')
+    assert Checkpoint(path).start('count 2024-05', resume=True) == {}
+
+
+def test_clear_removes_the_file_and_stops_recording(tmp_path):
+    path = str(tmp_path / 'checkpoint.jsonl')
+    checkpoint = Checkpoint(path)
+    checkpoint.start('count 2024-05')
+    checkpoint.clear()
+    assert not os.path.exists(path)
+    checkpoint.record('AAA', 1)
+    assert not os.path.exists(path)
@@ -0,0 +1,89 @@
+"""
+test_cross_tab
+
+Unit tests of the configured cross-tab counts.
+"""
+import numpy as np
+from IssueDataset import IssueDataset
+from CrossTab import CrossTab, count_crosstabs
+
+
+def sample_dataset():
+    """
+    A dataset of the issues of two projects over two months, with multi-valued components.
+    """
+    dataset = IssueDataset(
+        {
+            'Month': ['2024-01', '2024-02'],
+            'Project': [],
+            'Issue Type': ['Release', 'Story', 'Bug'],
+            'Release Type': ['Major', 'Minor'],
+            'Component': [],
+        },
+        open_dimensions=['Project', 'Component'],
+        multi_valued=['Component'])
+    dataset.add_issues(
+        ['Issue Type', 'Release Type', 'Component'],
+        [('Release', 'Major', ['UI']), ('Release', 'Minor', []), ('Story', None, ['UI', 'API'])],
+        Month='2024-01', Project='BBB')
+    dataset.add_issues(
+        ['Issue Type', 'Release Type', 'Component'],
+        [('Release', 'Minor', ['API']), ('Bug', None, ['API'])],
+        Month='2024-01', Project='AAA')
+    dataset.add_issues(
+        ['Issue Type', 'Release Type', 'Component'],
+        [('Release', 'Major', [])],
+        Month='2024-02', Project='AAA')
+    return dataset
+
+
+def test_from_config_reads_a_report_entry():
+    crosstab = CrossTab.from_config('Release Type', {
+        'Heading': 'Release Metrics',
+        'Rows': ['Project'],
+        'Columns': ['Release Type'],
+        'Filter': {'Issue Type': 'Release'},
+    })
+    assert crosstab.heading == 'Release Metrics'
+    assert crosstab.filters == {'Issue Type': ['Release']}
+    assert crosstab.dimensions == ['Project', 'Release Type', 'Issue Type']
+
+
+def test_counts_are_split_by_month_with_open_rows_sorted():
+    crosstab = CrossTab('Release Type', 'Release Metrics', ['Project'], ['Release Type'], {'Issue Type': 'Release'})
+    results = count_crosstabs(sample_dataset(), [crosstab], 'Month')
+    january = results['2024-01']['Release Type']
+    assert january.rows == ['AAA', 'BBB']
+    assert january.columns == ['Major', 'Minor']
+    assert january.values.tolist() == [[0, 1], [1, 1]]
+    assert results['2024-02']['Release Type'].values.tolist() == [[1, 0], [0, 0]]
+
+
+def test_a_filtered_axis_only_shows_its_filtered_values():
+    crosstab = CrossTab('Story/Bug', 'Story/Bug', ['Project'], ['Issue Type'], {'Issue Type': ['Story', 'Bug']})
+    table = count_crosstabs(sample_dataset(), [crosstab], 'Month')['2024-01']['Story/Bug']
+    assert table.columns == ['Story', 'Bug']
+    assert table.values.tolist() == [[0, 1], [1, 0]]
+
+
+def test_multi_valued_crosstabs_count_each_value():
+    crosstab = CrossTab('Components', 'Components', ['Component'], ['Project'])
+    table = count_crosstabs(sample_dataset(), [crosstab], 'Month')['2024-01']['Components']
+    assert table.rows == ['API', 'UI']
+    assert table.values.tolist() == [[2, 1], [0, 2]]
+
+
+def test_labels_and_combined_columns():
+    crosstab = CrossTab('Types', 'Types', ['Project'], ['Issue Type', 'Release Type'], {'Issue Type': 'Release'})
+    table = count_crosstabs(
+        sample_dataset(), [crosstab], 'Month', labels={'Project': {'AAA': 'Project A'}})['2024-01']['Types']
+    assert table.rows == ['Project A', 'BBB']
+    assert table.columns == ['Release / Major', 'Release / Minor']
+
+
+def test_missing_values_leave_their_cells_empty():
+    crosstab = CrossTab('Release Type', 'Release Metrics', ['Project'], ['Release Type'], {'Issue Type': 'Release'})
+    table = count_crosstabs(
+        sample_dataset(), [crosstab], 'Month', missing={'Project': ['BBB']})['2024-01']['Release Type']
+    assert table.values[0].tolist() == [0, 1]
+    assert np.isnan(table.values[1]).all()
@@ -0,0 +1,31 @@
+"""
+test_history_metrics
+
+Unit tests of the month ranges of a backfill.
+"""
+import pytest
+from HistoryMetrics import month_range
+
+
+def test_month_range_is_inclusive_across_years():
+    assert month_range('2024-11', '2025-02') == [(2024, 11), (2024, 12), (2025, 1), (2025, 2)]
+
+
+def test_month_range_of_a_single_month():
+    assert month_range('2024-05', '2024-05') == [(2024, 5)]
+
+
+@pytest.mark.parametrize('start_month, end_month', [
+    ('2024-13', '2025-01'),
+    ('2024-00', '2024-02'),
+    ('2024-1x', '2024-02'),
+    ('2024', '2024-02'),
+])
+def test_month_range_rejects_invalid_months(start_month, end_month):
+    with pytest.raises(ValueError):
+        month_range(start_month, end_month)
+
+
+def test_month_range_rejects_a_reversed_range():
+    with pytest.raises(ValueError):
+        month_range('2025-02', '2025-01')
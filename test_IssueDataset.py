@@ -0,0 +1,108 @@
+"""
+test_issue_dataset
+
+Unit tests of the columnar issue dataset and its count tables.
+"""
+import numpy as np
+from IssueDataset import IssueDataset, CountTable, merge_count_tables
+
+
+def sample_dataset():
+    """
+    A dataset of five issues of two projects, with an open Project dimension.
+    """
+    dataset = IssueDataset(
+        {'Project': [], 'Issue Type': ['Story', 'Bug'], 'Release Type': ['Major', 'Minor']},
+        open_dimensions=['Project'])
+    dataset.add_issues(
+        ['Issue Type', 'Release Type'],
+        [('Story', 'Major'), ('Bug', 'Minor'), ('Story', None)],
+        Project='AAA')
+    dataset.add_issues(['Issue Type', 'Release Type'], [('Story', 'Minor'), ('Epic', 'Major')], Project='BBB')
+    return dataset
+
+
+def test_open_dimensions_grow_and_fixed_ones_do_not():
+    dataset = sample_dataset()
+    assert len(dataset) == 5
+    assert dataset.vocabularies['Project'] == ['AAA', 'BBB']
+    assert dataset.vocabularies['Issue Type'] == ['Story', 'Bug']
+    assert dataset.column('Issue Type').tolist() == [0, 1, 0, 0, -1]
+    assert dataset.lookup('Issue Type', 'Epic') == -1
+
+
+def test_count_skips_values_outside_the_vocabulary():
+    counts = sample_dataset().count(['Project', 'Issue Type'])
+    assert counts.tolist() == [[2, 1], [1, 0]]
+
+
+def test_count_with_others_keeps_every_issue():
+    counts = sample_dataset().count(['Project', 'Release Type'], others=True)
+    assert counts.tolist() == [[1, 1, 1], [1, 1, 0], [0, 0, 0]]
+    assert counts.sum() == 5
+
+
+def test_count_where_filters_the_issues():
+    counts = sample_dataset().count(['Project'], where={'Issue Type': 'Story'})
+    assert counts.tolist() == [2, 1]
+    counts = sample_dataset().count(['Project'], where={'Issue Type': ['Story', 'Bug']})
+    assert counts.tolist() == [3, 1]
+
+
+def test_multi_valued_dimensions_count_an_issue_once_per_value():
+    dataset = IssueDataset(
+        {'Issue Type': ['Story', 'Bug'], 'Component': []},
+        open_dimensions=['Component'],
+        multi_valued=['Component'])
+    dataset.add_issues(
+        ['Issue Type', 'Component'],
+        [('Story', ['UI', 'API']), ('Bug', ['API']), ('Story', None)])
+    assert dataset.count(['Component']).tolist() == [1, 2]
+    assert dataset.count(['Issue Type', 'Component']).tolist() == [[1, 1], [0, 1]]
+    assert dataset.count(['Issue Type'], where={'Component': 'API'}).tolist() == [1, 1]
+
+
+def test_extend_translates_the_codes_of_another_dataset():
+    dataset = sample_dataset()
+    other = IssueDataset(
+        {'Project': ['CCC', 'AAA'], 'Issue Type': ['Bug', 'Story'], 'Release Type': ['Minor', 'Major']},
+        open_dimensions=['Project'])
+    other.add_issues(['Project', 'Issue Type', 'Release Type'], [('CCC', 'Bug', 'Major'), ('AAA', 'Story', 'Minor')])
+    dataset.extend(other)
+    assert len(dataset) == 7
+    assert dataset.vocabularies['Project'] == ['AAA', 'BBB', 'CCC']
+    assert dataset.count(['Project', 'Issue Type']).tolist() == [[3, 1], [1, 0], [0, 1]]
+
+
+def test_codes_do_not_overflow_a_short():
+    dataset = IssueDataset({'Label': []}, open_dimensions=['Label'])
+    dataset.add_issues(['Label'], [(f'label-{index}',) for index in range(40000)])
+    assert dataset.column('Label')[-1] == 39999
+    assert dataset.count(['Label'])[-1] == 1
+
+
+def test_count_table_totals_leave_out_missing_cells():
+    table = CountTable(['AAA', 'BBB'], ['Major', 'Minor'], [[1, 2], [np.nan, 4]])
+    frame = table.to_frame()
+    assert frame.loc['Total', 'Major'] == 1
+    assert frame.loc['BBB', 'Total'] == 4
+    assert frame.loc['Total', 'Total'] == 7
+
+
+def test_count_table_round_trips_through_a_dict():
+    table = CountTable(['AAA'], ['Major', 'Minor'], [[1, np.nan]])
+    data = table.to_dict()
+    assert data['values'] == [[1.0, None]]
+    restored = CountTable.from_dict(data)
+    assert restored.rows == ['AAA'] and restored.columns == ['Major', 'Minor']
+    assert restored.values[0, 0] == 1 and np.isnan(restored.values[0, 1])
+
+
+def test_merge_count_tables_sums_shared_cells():
+    merged = merge_count_tables([
+        CountTable(['AAA'], ['Major', 'Minor'], [[1, 2]]),
+        CountTable(['BBB', 'AAA'], ['Minor'], [[3], [4]]),
+    ])
+    assert merged.rows == ['AAA', 'BBB']
+    assert merged.columns == ['Major', 'Minor']
+    assert merged.values.tolist() == [[1, 6], [0, 3]]
@@ -0,0 +1,58 @@
+"""
+test_query_plan
+
+Unit tests of the query plan and its cost estimates.
+"""
+from types import SimpleNamespace
+from QueryPlan import QueryPlan, estimated_requests
+
+
+def test_identical_queries_are_planned_once():
+    plan = QueryPlan('count', 100)
+    first = plan.add('count', 'project = A', ('A', 'Release Type', 'Major'))
+    second = plan.add('count', 'project = A', ('A', 'Totals', 'Major'))
+    plan.add('search', 'project = A', 'A')
+    assert first is second
+    assert len(plan.queries) == 2
+    assert plan.duplicates == 1
+    assert first.consumers == [('A', 'Release Type', 'Major'), ('A', 'Totals', 'Major')]
+
+
+def test_searches_cost_one_request_per_page():
+    assert estimated_requests('search', 250, 100) == 3
+    assert estimated_requests('search', 100, 100) == 1
+    assert estimated_requests('search', None, 100) == 1
+    assert estimated_requests('search', 0, 100) == 1
+
+
+def test_exact_counts_cost_one_request_per_page_of_keys():
+    assert estimated_requests('count', 12000, 100, 5000) == 3
+    assert estimated_requests('count', 4999, 100, 5000) == 1
+    assert estimated_requests('count', None, 100, 5000) == 1
+
+
+def test_single_request_counts_cost_one_request():
+    assert estimated_requests('count', 12000, 100) == 1
+
+
+def test_plan_cost_sums_its_queries():
+    plan = QueryPlan('count', 100, 5000)
+    plan.add('count', 'a', ('A', 'Release Type', 'Major'), estimated_issues=12000)
+    plan.add('count', 'b', ('A', 'Release Type', 'Minor'))
+    plan.add('search', 'c', 'A', estimated_issues=250, replaces=2)
+    assert plan.estimated_requests == 7
+    explanation = plan.explain()
+    assert 'Estimated cost: 7 requests, 3 search pages of 100 issues (~250 issues in the last run)' in explanation
+    assert '2 count queries merged into 1 shared searches' in explanation
+    assert 'A / Release Type / Major' in explanation
+
+
+def test_run_returns_what_the_collector_collected():
+    def collector(jira_client, *arguments):
+        return SimpleNamespace(jira_issues_count=len(arguments), issues=[jira_client, *arguments])
+
+    plan = QueryPlan('search', 100)
+    count = plan.add('count', 'a', 'cell', collector, ('x', 'y'))
+    search = plan.add('search', 'b', 'A', collector, ('x',))
+    assert count.run('client') == 2
+    assert search.run('client') == ['client', 'x']